@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Episode Assembly
+Stitches each shot's selected frame and line audio into a timed animatic:
+every frame is held for its audio's duration (ffprobe) plus the manifest's
+padding. Frames are streamed to ffmpeg's stdin as raw RGB, one hold at a
+time, and each distinct image is decoded and scaled once however often and
+however long it is held.
+
+Reads renders/timeline.json from episode_build.py when present, otherwise
+shots/selected/<id>.png and audio/<id>.mp3. When audio_post.py has built
+audio/episode_track.wav, holds use its trimmed line lengths and the audio is
+cut from that track, so the preview matches episode_track.json.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+import episode_manifest
+
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+FFPROBE = os.environ.get("FFPROBE", "ffprobe")
+PREVIEW_NAME = "preview.mp4"
+CUES_NAME = "preview.json"
+FPS = 24
+SIZE = (540, 540)            # preview frame (selected shots are 1024x1024)
+BACKGROUND = (236, 226, 208)  # cream studio backdrop for letterboxing
+AUDIO_FORMAT = "aformat=sample_fmts=fltp:channel_layouts=stereo"  # concat needs matching segments
+DEFAULT_PADDING = 0.5        # seconds after each line when the manifest has no "padding"
+TRACK_NAME = "episode_track.wav"     # trimmed, normalized lines from audio_post.py
+TRACK_OFFSETS = "episode_track.json"
+
+
+def episode_dir(episode_id):
+    return episode_manifest.EPISODES_DIR / episode_id
+
+
+def padding(episode, shot):
+    """Seconds after a shot's line: the shot's "padding", else the episode's, else DEFAULT_PADDING."""
+    return shot.get("padding", episode.get("padding", DEFAULT_PADDING))
+
+
+def require(tool):
+    if shutil.which(tool) is None:
+        raise RuntimeError(f"{tool} not found on PATH (install ffmpeg, or set FFMPEG/FFPROBE)")
+
+
+# =============================================================================
+# TIMING
+# =============================================================================
+
+def probe_duration(path):
+    """Audio duration in seconds via ffprobe (None if it can't be read)."""
+    out = subprocess.run(
+        [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(out.stdout.strip())
+    except ValueError:
+        return None
+
+
+def probe_durations(paths, workers=8):
+    """{path: seconds} for every existing path, probed concurrently."""
+    paths = [p for p in paths if p and Path(p).exists()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(probe_duration, paths)))
+
+
+def shot_sources(episode_id):
+    """[(shot, image path, audio path)] from renders/timeline.json or the default layout."""
+    base = episode_dir(episode_id)
+    episode = episode_manifest.load_episode(episode_id)
+    timeline_file = base / "renders" / "timeline.json"
+    built = {}
+    if timeline_file.exists():
+        with open(timeline_file) as f:
+            built = {entry["id"]: entry for entry in json.load(f)["shots"]}
+
+    sources = []
+    for shot in episode["shots"]:
+        entry = built.get(shot["id"], {})
+        image = base / entry["image"] if entry.get("image") else base / "shots" / "selected" / f"{shot['id']}.png"
+        audio = base / entry["audio"] if entry.get("audio") else base / "audio" / f"{shot['id']}.mp3"
+        sources.append((shot, image, audio if audio.exists() else None))
+    return sources
+
+
+def load_track(episode_id, sources=None):
+    """(track path, {shot id: episode_track.json entry}), or None if there is no current track.
+
+    A track older than any line's audio is ignored (the lines were regenerated).
+    """
+    audio = episode_dir(episode_id) / "audio"
+    track, record_file = audio / TRACK_NAME, audio / TRACK_OFFSETS
+    if not (track.exists() and record_file.exists()):
+        return None
+    sources = sources if sources is not None else shot_sources(episode_id)
+    newest = max((Path(a).stat().st_mtime for _, _, a in sources if a), default=0)
+    if min(track.stat().st_mtime, record_file.stat().st_mtime) < newest:
+        print(f"({TRACK_NAME} is older than the line audio: rerun audio_post.py track; using raw MP3s)")
+        return None
+    with open(record_file) as f:
+        return track, {s["id"]: s for s in json.load(f)["shots"]}
+
+
+def plan(episode_id, durations=None, use_track=True):
+    """Timed cue list: [{"id", "image", "audio", "audio_start", "start", "audio_duration", "hold", "frames"}].
+
+    hold = audio duration + padding(). With a current episode_track.wav the
+    duration is the trimmed line's and the audio is the track from
+    audio_start; otherwise the raw MP3's duration (ffprobe, or `durations`).
+    Shots without audio hold for the manifest duration.
+    Frame counts come from rounded cumulative times, so the video never
+    drifts from the audio.
+    """
+    episode = episode_manifest.load_episode(episode_id)
+    sources = shot_sources(episode_id)
+    track = load_track(episode_id, sources) if use_track else None
+    processed = track[1] if track else {}
+    if durations is None:
+        durations = probe_durations([audio for shot, _, audio in sources if shot["id"] not in processed])
+
+    cues, start = [], 0.0
+    for shot, image, audio in sources:
+        audio_start = None
+        if shot["id"] in processed:
+            entry = processed[shot["id"]]
+            audio, audio_start, audio_duration = track[0], entry["offset"], entry["duration"]
+        else:
+            audio_duration = durations.get(audio) if audio else None
+        if audio_duration is None:
+            hold = float(shot.get("duration") or 0)
+        else:
+            hold = audio_duration + padding(episode, shot)
+        cues.append({
+            "id": shot["id"],
+            "image": image,
+            "audio": audio if audio_duration is not None else None,
+            "audio_start": audio_start,
+            "start": round(start, 3),
+            "audio_duration": audio_duration,
+            "hold": round(hold, 3),
+            "frames": round((start + hold) * FPS) - round(start * FPS),
+        })
+        start += hold
+    return cues
+
+
+# =============================================================================
+# FRAMES
+# =============================================================================
+
+class FrameCache:
+    """Decoded, scaled RGB frames keyed by file content, so repeated holds reuse one decode."""
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.frames = {}
+        self.decodes = 0
+
+    def _key(self, path):
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def get(self, path):
+        if path is None or not Path(path).exists():
+            return self.blank()
+        key = self._key(path)
+        if key not in self.frames:
+            self.frames[key] = self.decode(path)
+            self.decodes += 1
+        return self.frames[key]
+
+    def decode(self, path):
+        img = Image.open(path).convert("RGB")
+        img.thumbnail(self.size, Image.LANCZOS)
+        canvas = Image.new("RGB", self.size, BACKGROUND)
+        canvas.paste(img, ((self.size[0] - img.width) // 2, (self.size[1] - img.height) // 2))
+        return canvas.tobytes()
+
+    def blank(self):
+        if "blank" not in self.frames:
+            self.frames["blank"] = Image.new("RGB", self.size, BACKGROUND).tobytes()
+        return self.frames["blank"]
+
+
+def write_frames(cues, sink, cache):
+    """Write every cue's frame to a binary sink `frames` times. Returns frames written."""
+    written = 0
+    for cue in cues:
+        frame = cache.get(cue["image"])
+        for _ in range(cue["frames"]):
+            sink.write(frame)
+        written += cue["frames"]
+    return written
+
+
+# =============================================================================
+# ENCODE
+# =============================================================================
+
+def ffmpeg_command(cues, output, size=SIZE, fps=FPS):
+    """ffmpeg reading raw frames on stdin plus each line's audio, padded to its hold and concatenated.
+
+    Lines cut from episode_track.wav are trimmed to [audio_start, audio_start + audio_duration].
+    """
+    cmd = [
+        FFMPEG, "-y", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-",
+    ]
+    voiced = [cue for cue in cues if cue["audio"]]
+    for cue in voiced:
+        cmd += ["-i", str(cue["audio"])]
+
+    # Every cue contributes exactly its hold: padded audio, or silence when it has none
+    filters, labels, n = [], [], 1
+    for i, cue in enumerate(cues):
+        hold = cue["frames"] / fps
+        if cue["audio"]:
+            cut = ""
+            if cue.get("audio_start") is not None:
+                cut = (f"atrim=start={cue['audio_start']:.3f}:duration={cue['audio_duration']:.3f},"
+                       "asetpts=PTS-STARTPTS,")
+            filters.append(f"[{n}:a]{cut}aresample=44100,{AUDIO_FORMAT},"
+                           f"apad=whole_dur={hold:.3f},atrim=0:{hold:.3f}[a{i}]")
+            n += 1
+        else:
+            filters.append(f"anullsrc=r=44100:cl=stereo,{AUDIO_FORMAT},atrim=0:{hold:.3f}[a{i}]")
+        labels.append(f"[a{i}]")
+    filters.append(f"{''.join(labels)}concat=n={len(cues)}:v=0:a=1[aout]")
+
+    cmd += [
+        "-filter_complex", ";".join(filters),
+        "-map", "0:v", "-map", "[aout]",
+        "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-crf", "23", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k",
+        "-movflags", "+faststart", "-shortest",
+        str(output),
+    ]
+    return cmd
+
+
+def write_cues(cues, path):
+    base = path.parent.parent
+    data = [
+        {**cue,
+         "image": os.path.relpath(cue["image"], base) if cue["image"] else None,
+         "audio": os.path.relpath(cue["audio"], base) if cue["audio"] else None}
+        for cue in cues
+    ]
+    path.write_text(json.dumps({"fps": FPS, "size": list(SIZE), "cues": data}, indent=2) + "\n")
+
+
+def assemble(episode_id=episode_manifest.DEFAULT_EPISODE, output=None):
+    """Encode renders/preview.mp4 and write renders/preview.json. Returns the video path."""
+    require(FFMPEG)
+    require(FFPROBE)
+    start = time.perf_counter()
+
+    cues = plan(episode_id)
+    renders = episode_dir(episode_id) / "renders"
+    renders.mkdir(parents=True, exist_ok=True)
+    output = Path(output) if output else renders / PREVIEW_NAME
+
+    cache = FrameCache()
+    proc = subprocess.Popen(ffmpeg_command(cues, output), stdin=subprocess.PIPE)
+    try:
+        frames = write_frames(cues, proc.stdin, cache)
+    except BrokenPipeError:
+        frames = 0  # ffmpeg exited early; its error is reported below
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {proc.returncode}")
+
+    write_cues(cues, renders / CUES_NAME)
+    elapsed = time.perf_counter() - start
+    print_cues(cues)
+    if any(cue["audio_start"] is not None for cue in cues):
+        print(f"\nAudio: trimmed, normalized lines from audio/{TRACK_NAME}")
+    print(f"\n{frames} frames ({frames / FPS:.1f}s) from {cache.decodes} decoded images "
+          f"in {elapsed:.1f}s -> {output}")
+    return output
+
+
+def print_cues(cues):
+    print(f"\n{'Shot':<24} {'Start':>7} {'Audio':>7} {'Hold':>7} {'Frames':>7}  Image")
+    print("-" * 80)
+    for cue in cues:
+        audio = f"{cue['audio_duration']:7.2f}" if cue["audio_duration"] is not None else f"{'-':>7}"
+        image = Path(cue["image"]).name if cue["image"] and Path(cue["image"]).exists() else "(missing)"
+        print(f"{cue['id']:<24} {cue['start']:7.2f} {audio} {cue['hold']:7.2f} {cue['frames']:>7}  {image}")
+
+
+def benchmark(episode_id=episode_manifest.DEFAULT_EPISODE, repeats=1):
+    """Frame pipeline throughput into a null sink: decode per frame vs. the frame cache.
+
+    Uses manifest durations, so it runs without ffmpeg.
+    """
+    cues = plan(episode_id, durations={})
+    frames = sum(c["frames"] for c in cues)
+
+    class Null:
+        def write(self, data):
+            pass
+
+    cache = FrameCache()
+    start = time.perf_counter()
+    for cue in cues[:repeats]:
+        for _ in range(cue["frames"]):
+            cache.decode(cue["image"])
+    sample = sum(c["frames"] for c in cues[:repeats])
+    per_frame = (time.perf_counter() - start) / sample
+
+    start = time.perf_counter()
+    write_frames(cues, Null(), cache)
+    cached = time.perf_counter() - start
+
+    # The pipe itself: the same bytes through a real OS pipe into a child process
+    sink = subprocess.Popen([sys.executable, "-c", "import sys\nwhile sys.stdin.buffer.read(1 << 20): pass"],
+                            stdin=subprocess.PIPE)
+    start = time.perf_counter()
+    write_frames(cues, sink.stdin, FrameCache())
+    sink.stdin.close()
+    sink.wait()
+    piped = time.perf_counter() - start
+
+    mb = frames * SIZE[0] * SIZE[1] * 3 / 1e6
+    print(f"\n{episode_id}: {len(cues)} shots, {frames} frames at {FPS} fps, {SIZE[0]}x{SIZE[1]} ({mb:.0f} MB raw)")
+    print("-" * 60)
+    print(f"  decode every frame:     ~{per_frame * frames:6.2f}s (extrapolated from {sample} frames)")
+    print(f"  frame cache, null sink:  {cached:6.2f}s ({cache.decodes} decodes)")
+    print(f"  frame cache, OS pipe:    {piped:6.2f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python assemble.py preview [episode] [output.mp4]  - Encode renders/preview.mp4 (needs ffmpeg)")
+        print("  python assemble.py plan [episode]                  - Print the cue list (audio durations via ffprobe)")
+        print("  python assemble.py bench [episode]                 - Frame pipeline throughput, no ffmpeg needed")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+    episode_id = sys.argv[2] if len(sys.argv) > 2 else episode_manifest.DEFAULT_EPISODE
+
+    if cmd == "preview":
+        assemble(episode_id, sys.argv[3] if len(sys.argv) > 3 else None)
+    elif cmd == "plan":
+        durations = probe_durations([a for _, _, a in shot_sources(episode_id)]) if shutil.which(FFPROBE) else {}
+        if not durations and not load_track(episode_id):
+            print("(ffprobe not found: using manifest durations)")
+        print_cues(plan(episode_id, durations))
+    elif cmd == "bench":
+        benchmark(episode_id)
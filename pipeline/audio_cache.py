@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Audio Cache
+Content-addressed cache for ElevenLabs output. Lines are keyed on voice_id,
+model_id, voice settings and the exact text, so re-running a script only
+synthesizes (and bills) the lines that changed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = PIPELINE_DIR / "cache" / "audio"
+MANIFEST_NAME = "manifest.json"
+
+# Set to False (e.g. via --no-cache) to always synthesize
+ENABLED = True
+
+_manifest_lock = threading.Lock()
+
+
+def settings_dict(voice_settings):
+    """Plain dict of a VoiceSettings object (or None)."""
+    if voice_settings is None:
+        return None
+    if hasattr(voice_settings, "model_dump"):
+        return voice_settings.model_dump(exclude_none=True)
+    return dict(voice_settings)
+
+
+def tts_key(voice_id, model_id, voice_settings, text):
+    """Cache key for one text-to-speech line."""
+    return _hash({
+        "kind": "tts",
+        "voice_id": voice_id,
+        "model_id": model_id,
+        "voice_settings": settings_dict(voice_settings),
+        "text": text,
+    })
+
+
+def design_key(description, text):
+    """Cache key for a voice-design preview set."""
+    return _hash({"kind": "design", "description": description, "text": text})
+
+
+def _hash(fields):
+    blob = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _place(src, dest):
+    """Copy src to dest (never hardlinked, so overwriting dest can't corrupt the cache)."""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(src, dest)
+
+
+# =============================================================================
+# TEXT-TO-SPEECH LINES
+# =============================================================================
+
+def get(key, dest):
+    """Place the cached audio for key at dest. Returns True on a hit."""
+    if not ENABLED:
+        return False
+    cached = CACHE_DIR / f"{key}.mp3"
+    if not cached.exists():
+        return False
+    _place(cached, dest)
+    return True
+
+
+def put(key, src):
+    """Store a finished audio file under key."""
+    if not ENABLED:
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_DIR / f"{key}.mp3.tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, CACHE_DIR / f"{key}.mp3")
+
+
+def record(output_dir, filename, key, hit, **fields):
+    """Note in output_dir/manifest.json which cache entry a file came from."""
+    manifest_file = Path(output_dir) / MANIFEST_NAME
+    with _manifest_lock:
+        manifest = {}
+        if manifest_file.exists():
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+
+        manifest[filename] = {
+            "cache_key": key,
+            "cache_hit": hit,
+            "generated_at": datetime.now().isoformat(),
+            **fields,
+        }
+
+        tmp = manifest_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, manifest_file)
+
+
+# =============================================================================
+# VOICE DESIGN PREVIEWS
+# =============================================================================
+
+def get_design(key):
+    """Return [(audio_path, generated_voice_id), ...] for cached previews, or None."""
+    if not ENABLED:
+        return None
+    index_file = CACHE_DIR / f"design_{key}.json"
+    if not index_file.exists():
+        return None
+    with open(index_file) as f:
+        voice_ids = json.load(f)
+    previews = [(CACHE_DIR / f"design_{key}_{i}.mp3", voice_id) for i, voice_id in enumerate(voice_ids)]
+    if not all(path.exists() for path, _ in previews):
+        return None
+    return previews
+
+
+def put_design(key, previews):
+    """Store [(audio_bytes, generated_voice_id), ...] for a preview set."""
+    if not ENABLED:
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for i, (audio, _) in enumerate(previews):
+        (CACHE_DIR / f"design_{key}_{i}.mp3").write_bytes(audio)
+    tmp = CACHE_DIR / f"design_{key}.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump([voice_id for _, voice_id in previews], f)
+    os.replace(tmp, CACHE_DIR / f"design_{key}.json")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Audio Post-Processing
+Decodes each line's {shot_key}.mp3, trims leading/trailing silence and
+normalizes it to TARGET_LUFS (ITU-R BS.1770 integrated loudness, K-weighting
+applied in the frequency domain with NumPy), then concatenates the lines into
+one episode track with the manifest's padding between them. Lines are
+processed in a process pool; per-shot offsets go to audio/episode_track.json.
+"""
+
+import json
+import os
+import subprocess
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import assemble
+import episode_manifest
+
+RATE = 48000                 # BS.1770 K-weighting coefficients are for 48 kHz
+TARGET_LUFS = -16.0          # dialogue for web/streaming (-23 for broadcast)
+PEAK_CEILING_DB = -1.0       # gain is capped so sample peaks stay below this
+SILENCE_DB = -45.0           # 10 ms windows quieter than this (dBFS RMS) count as silence
+SILENCE_WINDOW = 0.010
+KEEP_SILENCE = 0.050         # seconds of room tone kept at each end of a trimmed line
+TRACK_NAME = assemble.TRACK_NAME    # assemble.py reads these back to time the preview
+OFFSETS_NAME = assemble.TRACK_OFFSETS
+
+# K-weighting at 48 kHz: high-shelf (head effects) then RLB high-pass
+K_SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585])
+K_HIGHPASS = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+BLOCK = 0.400                # gating block (s), 75% overlap
+HOP = 0.100
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+
+# =============================================================================
+# DECODE / ENCODE
+# =============================================================================
+
+def read_wav(path):
+    """Mono float32 samples and rate from a 16-bit PCM WAV."""
+    with wave.open(str(path), "rb") as w:
+        channels, rate = w.getnchannels(), w.getframerate()
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2").astype(np.float32) / 32768
+    return data.reshape(-1, channels).mean(axis=1), rate
+
+
+def decode(path):
+    """Mono float32 samples at RATE. WAVs at RATE are read directly, anything else via ffmpeg."""
+    path = Path(path)
+    if path.suffix.lower() == ".wav":
+        samples, rate = read_wav(path)
+        if rate == RATE:
+            return samples
+    out = subprocess.run(
+        [assemble.FFMPEG, "-v", "error", "-i", str(path), "-f", "f32le", "-ac", "1", "-ar", str(RATE), "-"],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(out.stdout, dtype="<f4")
+
+
+def write_wav(path, samples, rate=RATE):
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+
+
+# =============================================================================
+# ANALYSIS
+# =============================================================================
+
+def _response(coeffs, n_fft):
+    """Frequency response of a biquad on the rfft grid."""
+    b, a = coeffs
+    z = np.exp(-1j * np.pi * np.arange(n_fft // 2 + 1) / (n_fft // 2))  # z^-1
+    return np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+
+
+def k_weight(samples):
+    """K-weighted signal: both biquads applied as one FFT multiply (zero-padded past the filter tail)."""
+    n_fft = 1 << int(np.ceil(np.log2(len(samples) + RATE // 2)))
+    spectrum = np.fft.rfft(samples, n_fft) * _response(K_SHELF, n_fft) * _response(K_HIGHPASS, n_fft)
+    return np.fft.irfft(spectrum, n_fft)[:len(samples)]
+
+
+def loudness(samples):
+    """Integrated loudness (LUFS) of mono samples at RATE; -inf for silence or < 400 ms."""
+    block, hop = int(BLOCK * RATE), int(HOP * RATE)
+    if len(samples) < block:
+        return float("-inf")
+    energy = np.concatenate([[0.0], np.cumsum(k_weight(samples).astype(np.float64) ** 2)])
+    starts = np.arange(0, len(samples) - block + 1, hop)
+    power = (energy[starts + block] - energy[starts]) / block
+    block_lufs = -0.691 + 10 * np.log10(np.maximum(power, 1e-20))
+
+    gated = power[block_lufs > ABSOLUTE_GATE]
+    if not len(gated):
+        return float("-inf")
+    relative = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = power[block_lufs > max(relative, ABSOLUTE_GATE)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def trim_silence(samples):
+    """(trimmed samples, seconds cut at start, seconds cut at end)."""
+    window = int(SILENCE_WINDOW * RATE)
+    n = len(samples) // window
+    if not n:
+        return samples, 0.0, 0.0
+    rms = np.sqrt((samples[:n * window].reshape(n, window) ** 2).mean(axis=1))
+    loud = np.flatnonzero(20 * np.log10(np.maximum(rms, 1e-10)) > SILENCE_DB)
+    if not len(loud):
+        return samples[:0], len(samples) / RATE, 0.0
+    keep = int(KEEP_SILENCE * RATE)
+    start = max(0, loud[0] * window - keep)
+    end = min(len(samples), (loud[-1] + 1) * window + keep)
+    return samples[start:end], start / RATE, (len(samples) - end) / RATE
+
+
+def normalize(samples, target=TARGET_LUFS):
+    """(scaled samples, measured LUFS, applied gain dB); gain is capped at the peak ceiling."""
+    measured = loudness(samples)
+    if not np.isfinite(measured):
+        return samples, measured, 0.0
+    gain_db = target - measured
+    peak = float(np.abs(samples).max())
+    if peak > 0:
+        gain_db = min(gain_db, PEAK_CEILING_DB - 20 * np.log10(peak))
+    return samples * np.float32(10 ** (gain_db / 20)), measured, gain_db
+
+
+def process_line(path, target=TARGET_LUFS):
+    """Decode, trim and normalize one line -> (samples, stats). Runs in a worker process."""
+    raw = decode(path)
+    trimmed, cut_start, cut_end = trim_silence(raw)
+    out, measured, gain_db = normalize(trimmed, target)
+    return out.astype(np.float32), {
+        "source": Path(path).name,
+        "raw_duration": round(len(raw) / RATE, 3),
+        "duration": round(len(out) / RATE, 3),
+        "trimmed_start": round(cut_start, 3),
+        "trimmed_end": round(cut_end, 3),
+        "lufs_in": round(measured, 2),
+        "gain_db": round(gain_db, 2),
+        "lufs_out": round(loudness(out), 2),
+    }
+
+
+def process_all(paths, target=TARGET_LUFS, workers=None):
+    """process_line over every path in a process pool (in order)."""
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(process_line, paths, [target] * len(paths)))
+
+
+# =============================================================================
+# EPISODE TRACK
+# =============================================================================
+
+def concatenate(lines, gaps):
+    """Join processed lines with gaps[i] seconds of silence after line i -> (track, offsets)."""
+    offsets, pieces, position = [], [], 0
+    for samples, gap in zip(lines, gaps):
+        offsets.append(position / RATE)
+        silence = np.zeros(int(round(gap * RATE)), dtype=np.float32)
+        pieces += [samples, silence]
+        position += len(samples) + len(silence)
+    return (np.concatenate(pieces) if pieces else np.zeros(0, np.float32)), offsets
+
+
+def build_track(episode_id=episode_manifest.DEFAULT_EPISODE, target=TARGET_LUFS, workers=None):
+    """Write audio/episode_track.wav and audio/episode_track.json. Returns the offsets record."""
+    episode = episode_manifest.load_episode(episode_id)
+    audio = assemble.episode_dir(episode_id) / "audio"
+    shots = [s for s in episode["shots"] if (audio / f"{s['id']}.mp3").exists()]
+    missing = [s["id"] for s in episode["shots"] if s not in shots]
+    if missing:
+        print(f"No audio for: {', '.join(missing)}")
+
+    start = time.perf_counter()
+    results = process_all([audio / f"{s['id']}.mp3" for s in shots], target, workers)
+    track, offsets = concatenate([r[0] for r in results], [assemble.padding(episode, s) for s in shots])
+    write_wav(audio / TRACK_NAME, track)
+
+    record = {
+        "episode_id": episode_id,
+        "rate": RATE,
+        "target_lufs": target,
+        "duration": round(len(track) / RATE, 3),
+        "lufs": round(loudness(track), 2),
+        "shots": [{"id": s["id"], "offset": round(o, 3), **stats}
+                  for s, o, (_, stats) in zip(shots, offsets, results)],
+    }
+    (audio / OFFSETS_NAME).write_text(json.dumps(record, indent=2) + "\n")
+    print_record(record)
+    print(f"\n{len(shots)} lines in {time.perf_counter() - start:.1f}s -> {audio / TRACK_NAME}")
+    return record
+
+
+def print_record(record):
+    print(f"\n{'Shot':<24} {'Offset':>7} {'Length':>7} {'Trim':>11} {'LUFS in':>8} {'Gain':>7} {'LUFS out':>9}")
+    print("-" * 80)
+    for s in record["shots"]:
+        trim = f"{s['trimmed_start']:.2f}/{s['trimmed_end']:.2f}"
+        print(f"{s['id']:<24} {s['offset']:7.2f} {s['duration']:7.2f} {trim:>11} {s['lufs_in']:8.1f} "
+              f"{s['gain_db']:+7.1f} {s['lufs_out']:9.1f}")
+    print(f"\nTrack: {record['duration']:.1f}s at {record['lufs']:.1f} LUFS (target {record['target_lufs']:.0f})")
+
+
+def benchmark(lines=100, workers=None):
+    """Synthetic 100-line script: serial vs process pool, and loudness spread before/after."""
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(lines):
+            # Speech-like: a harmonic "voice" (100-250 Hz fundamental) in syllable-rate bursts at a
+            # random level, padded with 0.2-1.0 s of near-silence at each end
+            seconds = rng.uniform(1.5, 8.0)
+            t = np.arange(int(seconds * RATE)) / RATE
+            envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 6) * t), 0, None)
+            f0 = rng.uniform(100, 250)
+            voice = sum(np.sin(2 * np.pi * k * f0 * t + rng.uniform(0, 6.3)) / k for k in range(1, 11)) * envelope
+            voice *= 10 ** (rng.uniform(-30, -6) / 20) / max(np.abs(voice).max(), 1e-9)
+            pad = [np.full(int(rng.uniform(0.2, 1.0) * RATE), 1e-4, np.float32) for _ in range(2)]
+            path = Path(tmp) / f"line{i:03d}.wav"
+            write_wav(path, np.concatenate([pad[0], voice.astype(np.float32), pad[1]]))
+            paths.append(path)
+
+        start = time.perf_counter()
+        serial = [process_line(p) for p in paths]
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pooled = process_all(paths, workers=workers)
+        pool_time = time.perf_counter() - start
+
+    stats = [s for _, s in pooled]
+    audio_seconds = sum(s["raw_duration"] for s in stats)
+    spread_in = np.ptp([s["lufs_in"] for s in stats])
+    spread_out = np.ptp([s["lufs_out"] for s in stats])
+    trimmed = sum(s["trimmed_start"] + s["trimmed_end"] for s in stats)
+    print(f"\n{lines} synthetic lines, {audio_seconds:.0f}s of audio, {workers or os.cpu_count()} worker(s)")
+    print("-" * 60)
+    print(f"  serial:        {serial_time:6.2f}s ({audio_seconds / serial_time:.0f}x realtime)")
+    print(f"  process pool:  {pool_time:6.2f}s ({audio_seconds / pool_time:.0f}x realtime)")
+    capped = sum(s["lufs_out"] < TARGET_LUFS - 0.5 for s in stats)
+    print(f"  loudness spread: {spread_in:.1f} LU in -> {spread_out:.1f} LU out "
+          f"({capped} lines held below target by the {PEAK_CEILING_DB:g} dBFS peak ceiling)")
+    print(f"  silence trimmed: {trimmed:.0f}s")
+    assert len(serial) == len(pooled)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python audio_post.py track [episode] [target_lufs]  - Trim, normalize, concatenate -> audio/episode_track.wav")
+        print("  python audio_post.py measure <file> [file ...]      - Integrated loudness and silence of files")
+        print("  python audio_post.py bench [lines] [workers]        - Synthetic script: serial vs process pool")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "track":
+        episode_id = sys.argv[2] if len(sys.argv) > 2 else episode_manifest.DEFAULT_EPISODE
+        build_track(episode_id, float(sys.argv[3]) if len(sys.argv) > 3 else TARGET_LUFS)
+    elif cmd == "measure":
+        for path in sys.argv[2:]:
+            samples = decode(path)
+            _, cut_start, cut_end = trim_silence(samples)
+            print(f"  {loudness(samples):6.1f} LUFS  {len(samples) / RATE:5.2f}s  "
+                  f"silence {cut_start:.2f}s / {cut_end:.2f}s  {Path(path).name}")
+    elif cmd == "bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100, int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Character Registry
+Loads every prompts/*.json once and serves prompts from memory. A
+character's reference sheet prompts (every pose x expression) are compiled
+together on first use; episode shot prompts are memoized per (character,
+framing, pose, expression, action). Used by generate_assets.py and
+generate_shot.py.
+"""
+
+import json
+import time
+from functools import lru_cache
+from pathlib import Path
+
+PROMPTS_DIR = Path(__file__).resolve().parent / "prompts"
+
+# Medium-shot style for episode shots (generate_shot.py / Runway)
+SHOT_STYLE_BASE = "3D animated character, Pixar Disney style, stylized proportions, soft 3D render, smooth skin texture, warm studio lighting, clean solid cream beige background"
+SHOT_STYLE_QUALITY = "high quality, detailed, professional 3D animation style, Pixar aesthetic, DreamWorks style, soft diffused lighting, clean render"
+
+
+@lru_cache(maxsize=None)
+def load():
+    """{character: prompt data} from prompts/*.json (read once per process)."""
+    characters = {}
+    for path in sorted(PROMPTS_DIR.glob("*.json")):
+        with open(path) as f:
+            data = json.load(f)
+        characters[data.get("character", path.stem)] = data
+    return characters
+
+
+def names():
+    return list(load())
+
+
+def character(name):
+    """Prompt data for a character; KeyError names the known characters."""
+    try:
+        return load()[name]
+    except KeyError:
+        raise KeyError(f"No prompts/{name}.json (known: {', '.join(names())})") from None
+
+
+def reload():
+    """Drop cached data and prompts after editing prompts/*.json."""
+    load.cache_clear()
+    _reference_prompts.cache_clear()
+    shot_prompt.cache_clear()
+
+
+def _tag(table, key, default):
+    """Look key up in a pose/expression table; free text (or an unknown key) is used as-is."""
+    if key in table:
+        return table[key]
+    if not key:
+        return default
+    return key.replace("_", " ")
+
+
+def _compile_reference(data, pose, expression):
+    parts = [
+        data.get("base_prompt", ""),
+        data.get("identity_tags", ""),
+        data.get("outfit_tags", ""),
+        _tag(data.get("poses", {}), pose, "standing naturally"),
+        _tag(data.get("expressions", {}), expression, "neutral expression"),
+        data.get("style_tags", ""),
+    ]
+    return ", ".join(filter(None, parts))
+
+
+@lru_cache(maxsize=None)
+def _reference_prompts(name):
+    """Every (pose, expression) reference prompt for a character, compiled up front."""
+    data = character(name)
+    return {
+        (pose, expression): _compile_reference(data, pose, expression)
+        for pose in data.get("poses", {})
+        for expression in data.get("expressions", {})
+    }
+
+
+def reference_prompt(name, pose="standing_neutral", expression="neutral"):
+    """Full-body reference sheet prompt (generate_assets.py)."""
+    compiled = _reference_prompts(name)
+    prompt = compiled.get((pose, expression))
+    if prompt is None:
+        prompt = compiled[(pose, expression)] = _compile_reference(character(name), pose, expression)
+    return prompt
+
+
+def shot_segments(name, framing, pose, expression, action):
+    """Labelled parts of a medium-shot episode prompt, in prompt order.
+
+    Uses the character's "medium_shot" identity/outfit tags when present,
+    since full-body outfit tags (shoes, jeans) fight a waist-up framing.
+    """
+    data = character(name)
+    medium = {**data, **data.get("medium_shot", {})}
+    return [
+        ("style", SHOT_STYLE_BASE),
+        ("framing", framing),
+        ("identity", medium.get("identity_tags", "")),
+        ("outfit", medium.get("outfit_tags", "")),
+        ("pose", pose),
+        ("expression", expression),
+        ("action", action),
+        ("quality", SHOT_STYLE_QUALITY),
+    ]
+
+
+@lru_cache(maxsize=None)
+def shot_prompt(name, framing, pose, expression, action):
+    """Medium-shot episode prompt (generate_shot.py)."""
+    return ", ".join(text for _, text in shot_segments(name, framing, pose, expression, action))
+
+
+def negative_prompt(name, default=None):
+    return character(name).get("negative_prompt_default", default)
+
+
+def benchmark(calls=10000):
+    """Prompt construction: re-reading the JSON per call vs. the registry."""
+    name = names()[0]
+    data = character(name)
+    pose, expression = next(iter(data["poses"])), next(iter(data["expressions"]))
+    path = PROMPTS_DIR / f"{name}.json"
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        with open(path) as f:
+            _compile_reference(json.load(f), pose, expression)
+    per_read = (time.perf_counter() - start) / calls
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        reference_prompt(name, pose, expression)
+    per_lookup = (time.perf_counter() - start) / calls
+
+    print(f"{calls} prompts for {name}: read JSON each call {per_read * 1e6:.1f} us, "
+          f"registry {per_lookup * 1e6:.2f} us ({per_read / per_lookup:.0f}x)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python character_registry.py list                                - Characters, poses, expressions")
+        print("  python character_registry.py show <character> [pose] [expression] - Print a reference prompt")
+        print("  python character_registry.py bench                               - Lookup vs. JSON re-read")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "list":
+        for name, data in load().items():
+            print(f"\n{name}: {data.get('description', '')}")
+            print(f"  poses:       {', '.join(data.get('poses', {}))}")
+            print(f"  expressions: {', '.join(data.get('expressions', {}))}")
+    elif cmd == "show":
+        pose = sys.argv[3] if len(sys.argv) > 3 else "standing_neutral"
+        expression = sys.argv[4] if len(sys.argv) > 4 else "neutral"
+        print(reference_prompt(sys.argv[2], pose, expression))
+    elif cmd == "bench":
+        benchmark()
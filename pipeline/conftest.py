@@ -0,0 +1,48 @@
+"""
+Shared pytest fixtures: fake servers (no GPU or API key needed) with the
+module globals they touch restored after each test.
+"""
+
+import pytest
+
+import fake_webui
+import generate_shot
+import render_cache
+
+
+@pytest.fixture
+def fake_webuis(monkeypatch):
+    """fake_webuis(count, **serve_kwargs) -> [(url, state)], with the render cache and generation log off."""
+    monkeypatch.setattr(render_cache, "ENABLED", False)
+    monkeypatch.setattr(generate_shot, "LOG_GENERATIONS", False)
+    servers = []
+
+    def start(count, **kwargs):
+        started = [fake_webui.serve(**kwargs) for _ in range(count)]
+        servers.extend(server for server, _, _ in started)
+        return [(url, state) for _, url, state in started]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def fake_tts_server(monkeypatch, tmp_path):
+    """fake_tts_server(max_concurrent=CONCURRENCY) -> (url, state), with an empty audio cache under tmp_path."""
+    import audio_cache
+    import fake_tts
+    import generate_audio
+
+    monkeypatch.setattr(audio_cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(audio_cache, "ENABLED", True)
+    servers = []
+
+    def start(max_concurrent=generate_audio.CONCURRENCY):
+        server, url, state = fake_tts.serve(latency=0.05, seconds_per_char=0.001, max_concurrent=max_concurrent)
+        servers.append(server)
+        return url, state
+
+    yield start
+    for server in servers:
+        server.shutdown()
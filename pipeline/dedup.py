@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Duplicate Render Finder
+Perceptual hashes for every PNG under episodes/*/shots/ and
+characters/*/poses/, kept in a SQLite index that only re-hashes files whose
+mtime or size changed. Near-duplicates (same seed rerun, tiny prompt edit)
+are found with multi-index hashing over Hamming distance, so lookups stay
+sublinear at 100k images. Byte-identical copies can be replaced with
+hardlinks and near-duplicates pruned.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import shot_ranker
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DB_PATH = Path(__file__).resolve().parent / "cache" / "phash.db"
+ROOTS = ["episodes/*/shots", "characters/*/poses"]
+
+THRESHOLD = 4          # max differing hash bits (of 64) to count as a near-duplicate
+HASH_BATCH = 64        # files per worker task
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    phash    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_phash ON images (phash);
+"""
+
+
+def connect(db_path=None):
+    """Open the hash index (created on first use)."""
+    db_path = Path(db_path or DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# SQLite integers are signed 64-bit
+def _to_db(h):
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def _from_db(h):
+    return h + (1 << 64) if h < 0 else h
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+def scan(roots=None, base=None):
+    """{path: (mtime_ns, size)} for every PNG under the root globs."""
+    base = Path(base or REPO_ROOT)
+    files = {}
+    stack = [str(d) for pattern in (roots or ROOTS) for d in base.glob(pattern) if d.is_dir()]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(".png"):
+                    st = entry.stat()
+                    files[entry.path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def _hash_batch(paths):
+    """pHashes for a batch of files (runs in a worker process). Unreadable files are skipped."""
+    grays, ok = [], []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                img.draft("L", (shot_ranker.SIZE, shot_ranker.SIZE))
+                grays.append(np.asarray(img.convert("L").resize((shot_ranker.SIZE, shot_ranker.SIZE),
+                                                                 Image.BILINEAR), dtype=np.float32))
+            ok.append(path)
+        except (OSError, ValueError):
+            continue
+    if not ok:
+        return []
+    bits = shot_ranker.phashes(np.stack(grays))
+    packed = np.packbits(bits, axis=1).view(">u8")[:, 0]
+    return list(zip(ok, (int(h) for h in packed)))
+
+
+def hash_files(paths, workers=None):
+    """[(path, phash)] computed in a process pool."""
+    batches = [paths[i:i + HASH_BATCH] for i in range(0, len(paths), HASH_BATCH)]
+    if len(batches) <= 1:
+        return [r for batch in batches for r in _hash_batch(batch)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [r for result in pool.map(_hash_batch, batches) for r in result]
+
+
+def update(conn, roots=None, base=None, workers=None):
+    """Bring the index up to date. Returns (hashed, removed, total)."""
+    files = scan(roots, base)
+    known = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime_ns, size FROM images")}
+
+    changed = [path for path, stat in files.items() if known.get(path) != stat]
+    removed = [path for path in known if path not in files]
+
+    results = hash_files(changed, workers)
+    conn.executemany(
+        "INSERT OR REPLACE INTO images (path, mtime_ns, size, phash) VALUES (?, ?, ?, ?)",
+        [(path, *files[path], _to_db(h)) for path, h in results],
+    )
+    conn.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in removed])
+    conn.commit()
+    return len(results), len(removed), len(files)
+
+
+# =============================================================================
+# NEAR-DUPLICATE SEARCH
+# =============================================================================
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming(a, b):
+    """Bitwise distance between uint64 arrays."""
+    return _POPCOUNT[(a ^ b).view(np.uint8)].reshape(-1, 8).sum(1)
+
+
+def _chunks(threshold):
+    """(shift, mask) splitting 64 bits into threshold + 1 chunks.
+
+    Two hashes within threshold bits agree exactly on at least one chunk
+    (pigeonhole), so only hashes that share a chunk value need comparing.
+    """
+    count = threshold + 1
+    bounds = [round(i * 64 / count) for i in range(count + 1)]
+    return [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def near_pairs(values, threshold=THRESHOLD):
+    """Index pairs (i, j) of distinct uint64 hashes within threshold bits.
+
+    Multi-index hashing: per chunk, sort by the chunk value and compare each
+    hash only with neighbours in the same run, all vectorized.
+    """
+    pairs = set()
+    for shift, mask in _chunks(threshold):
+        keys = (values >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys, sorted_values = keys[order], values[order]
+        for k in range(1, len(values)):
+            same = np.flatnonzero(sorted_keys[:-k] == sorted_keys[k:])
+            if not len(same):
+                break
+            close = same[hamming(sorted_values[same], sorted_values[same + k]) <= threshold]
+            pairs.update(zip(order[close].tolist(), order[close + k].tolist()))
+    return pairs
+
+
+def near_duplicate_groups(hashes, threshold=THRESHOLD):
+    """Group keys whose hashes are within threshold bits: {key: hash} -> [[keys]]."""
+    keys = list(hashes)
+    unique, inverse = np.unique(np.array([hashes[k] for k in keys], dtype=np.uint64), return_inverse=True)
+
+    parent = list(range(len(unique)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if threshold > 0:
+        for i, j in near_pairs(unique, threshold):
+            a, b = find(i), find(j)
+            if a != b:
+                parent[a] = b
+
+    groups = {}
+    for key, i in zip(keys, inverse.tolist()):
+        groups.setdefault(find(i), []).append(key)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def _protected(path):
+    """Files the pipeline points at: shots/selected/ copies and selection picks."""
+    path = Path(path)
+    if path.parent.name == "selected":
+        return True
+    shots_dir = path.parent
+    for name in ("SELECTED.md", "selection.json"):
+        ref = shots_dir / name
+        if ref.exists() and path.name in ref.read_text():
+            return True
+    return False
+
+
+def keeper(group):
+    """The copy to keep: a protected file if any, else the oldest."""
+    return min(group, key=lambda p: (not _protected(p), os.stat(p).st_mtime_ns, p))
+
+
+def duplicate_groups(conn, threshold=THRESHOLD):
+    hashes = {path: _from_db(h) for path, h in conn.execute("SELECT path, phash FROM images")}
+    return near_duplicate_groups(hashes, threshold)
+
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_duplicates(conn, groups, apply=False):
+    """Replace byte-identical copies with hardlinks to the keeper. Returns bytes saved."""
+    saved = 0
+    for group in groups:
+        keep = keeper(group)
+        keep_stat, keep_digest = os.stat(keep), None
+        for path in group:
+            st = os.stat(path)
+            if path == keep or (st.st_dev, st.st_ino) == (keep_stat.st_dev, keep_stat.st_ino):
+                continue
+            if st.st_size != keep_stat.st_size:
+                continue
+            keep_digest = keep_digest or _digest(keep)
+            if _digest(path) != keep_digest:
+                continue
+            print(f"  link {Path(path).relative_to(REPO_ROOT)} -> {Path(keep).name}")
+            saved += st.st_size
+            if apply:
+                tmp = f"{path}.link.tmp"
+                os.link(keep, tmp)
+                os.replace(tmp, path)
+                conn.execute("UPDATE images SET mtime_ns = ?, size = ? WHERE path = ?",
+                             (keep_stat.st_mtime_ns, keep_stat.st_size, path))
+    conn.commit()
+    return saved
+
+
+def prune_duplicates(conn, groups, apply=False):
+    """Delete near-duplicates, keeping one file per group and every protected file. Returns bytes freed."""
+    freed = 0
+    for group in groups:
+        keep = keeper(group)
+        for path in group:
+            if path == keep or _protected(path):
+                continue
+            st = os.stat(path)
+            print(f"  prune {Path(path).relative_to(REPO_ROOT)}  (dup of {Path(keep).name})")
+            freed += st.st_size if st.st_nlink == 1 else 0
+            if apply:
+                os.remove(path)
+                conn.execute("DELETE FROM images WHERE path = ?", (path,))
+    conn.commit()
+    return freed
+
+
+def print_groups(groups):
+    if not groups:
+        print("No near-duplicates found")
+        return
+    for group in groups:
+        keep = keeper(group)
+        print(f"\n{len(group)} copies, keeping {Path(keep).relative_to(REPO_ROOT)}")
+        for path in group:
+            if path != keep:
+                print(f"    {Path(path).relative_to(REPO_ROOT)}")
+    print(f"\n{len(groups)} groups, {sum(len(g) - 1 for g in groups)} duplicates")
+
+
+def benchmark(count=100000, threshold=THRESHOLD):
+    """Time grouping synthetic hashes (10% near-duplicates) vs. a brute-force scan."""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 1 << 63, size=int(count * 0.9), dtype=np.int64).astype(np.uint64) * 2
+    base |= rng.integers(0, 2, size=len(base), dtype=np.uint64)
+    dupes = base[rng.integers(0, len(base), size=count - len(base))].copy()
+    for _ in range(2):  # flip up to 2 random bits
+        dupes ^= np.uint64(1) << rng.integers(0, 64, size=len(dupes)).astype(np.uint64)
+    hashes = {i: int(h) for i, h in enumerate(np.concatenate([base, dupes]))}
+
+    start = time.perf_counter()
+    groups = near_duplicate_groups(hashes, threshold)
+    elapsed = time.perf_counter() - start
+    print(f"{count} hashes: {len(groups)} groups in {elapsed:.2f}s (multi-index, radius {threshold})")
+
+    sample = 2000
+    values = np.array(list(hashes.values())[:sample], dtype=np.uint64)
+    start = time.perf_counter()
+    for h in values:
+        hamming(values, h)
+    brute = (time.perf_counter() - start) * (count / sample) ** 2
+    print(f"Brute force all-pairs (extrapolated from {sample}): ~{brute:.0f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python dedup.py scan                       - Update the hash index (changed files only)")
+        print("  python dedup.py groups [threshold]         - List near-duplicate groups")
+        print("  python dedup.py link [--apply]             - Hardlink byte-identical copies")
+        print("  python dedup.py prune [threshold] [--apply] - Delete near-duplicates (keeps picks)")
+        print("  python dedup.py bench [count]              - Grouping speed on synthetic hashes")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    apply = "--apply" in sys.argv
+
+    if cmd == "bench":
+        benchmark(int(args[0]) if args else 100000)
+        sys.exit(0)
+
+    conn = connect()
+    start = time.perf_counter()
+    hashed, removed, total = update(conn)
+    print(f"Index: {total} images ({hashed} hashed, {removed} removed) in {time.perf_counter() - start:.2f}s")
+
+    if cmd == "groups":
+        print_groups(duplicate_groups(conn, int(args[0]) if args else THRESHOLD))
+    elif cmd == "link":
+        saved = link_duplicates(conn, duplicate_groups(conn, 0), apply)
+        print(f"\n{'Saved' if apply else 'Would save'} {saved / 1e6:.1f} MB" + ("" if apply else " (run with --apply)"))
+    elif cmd == "prune":
+        freed = prune_duplicates(conn, duplicate_groups(conn, int(args[0]) if args else THRESHOLD), apply)
+        print(f"\n{'Freed' if apply else 'Would free'} {freed / 1e6:.1f} MB" + ("" if apply else " (run with --apply)"))
@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 """Design custom voices using ElevenLabs Voice Design API"""
 
+import asyncio
 import os
 import base64
+import json
+import time
+from datetime import datetime
 from pathlib import Path
-from elevenlabs import ElevenLabs
+from elevenlabs.core.api_error import ApiError
+
+import audio_cache
+import generate_audio
+import stream_writer
+import tracing
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,6 +28,14 @@ def load_api_key():
 
 API_KEY = load_api_key()
 
+DESIGNS_DIR = BASE_DIR / "episodes" / "001-kevin-identity" / "audio" / "voice_designs"
+INDEX_NAME = "index.json"  # character -> previews -> generated_voice_id, duration, file
+
+# Preview requests in flight for `all` (match your ElevenLabs tier's concurrency limit)
+CONCURRENCY = 7
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 1.0  # seconds, doubled after each 429
+
 # Character voice descriptions
 VOICE_DESIGNS = {
     "casey": {
@@ -74,8 +91,95 @@ VOICE_DESIGNS = {
 }
 
 
-def design_voice(character_name):
-    """Generate voice previews for a character."""
+# =============================================================================
+# INDEX
+# =============================================================================
+
+def design_hash(character_name):
+    """Hash of a character's description + preview text (same key as the audio cache)."""
+    design = VOICE_DESIGNS[character_name]
+    return audio_cache.design_key(design["description"], design["preview_text"])
+
+
+def load_index(designs_dir=None):
+    index_file = Path(designs_dir or DESIGNS_DIR) / INDEX_NAME
+    if index_file.exists():
+        with open(index_file) as f:
+            return json.load(f)
+    return {}
+
+
+def save_index(index, designs_dir=None):
+    designs_dir = Path(designs_dir or DESIGNS_DIR)
+    designs_dir.mkdir(parents=True, exist_ok=True)
+    tmp = designs_dir / f"{INDEX_NAME}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, designs_dir / INDEX_NAME)
+
+
+def is_designed(character_name, index, designs_dir=None):
+    """True if the index has previews on disk for the character's current description + text."""
+    entry = index.get(character_name)
+    if not entry or entry.get("hash") != design_hash(character_name) or not entry.get("previews"):
+        return False
+    designs_dir = Path(designs_dir or DESIGNS_DIR)
+    return all((designs_dir / p["file"]).exists() for p in entry["previews"])
+
+
+@tracing.traced()
+def save_previews(character_name, previews, designs_dir=None):
+    """Write [(audio_bytes, generated_voice_id, duration)] as MP3s. Returns the index entry."""
+    designs_dir = Path(designs_dir or DESIGNS_DIR)
+    output_dir = designs_dir / character_name
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = []
+    for i, (audio_data, voice_id, duration) in enumerate(previews):
+        filepath = output_dir / f"{character_name}_design_{i}.mp3"
+        filepath.write_bytes(audio_data)
+        if duration is None:
+            # Cached previews only keep the audio, so estimate from the MP3 bitrate
+            duration = round(len(audio_data) * 8 / stream_writer.AUDIO_BITRATE, 2)
+        entries.append({
+            "generated_voice_id": voice_id,
+            "duration": duration,
+            "file": filepath.relative_to(designs_dir).as_posix(),
+        })
+
+    design = VOICE_DESIGNS[character_name]
+    return {
+        "hash": design_hash(character_name),
+        "description": " ".join(design["description"].split()),
+        "preview_text": design["preview_text"],
+        "designed_at": datetime.now().isoformat(timespec="seconds"),
+        "previews": entries,
+    }
+
+
+def cached_previews(character_name):
+    """[(audio_bytes, generated_voice_id, None)] from the audio cache, or None."""
+    cached = audio_cache.get_design(design_hash(character_name))
+    if not cached:
+        return None
+    return [(path.read_bytes(), voice_id, None) for path, voice_id in cached]
+
+
+@tracing.traced("b64decode")
+def decode_previews(response):
+    return [
+        (base64.b64decode(preview.audio_base_64), preview.generated_voice_id, preview.duration_secs)
+        for preview in response.previews
+    ]
+
+
+# =============================================================================
+# SINGLE CHARACTER
+# =============================================================================
+
+@tracing.traced()
+def design_voice(character_name, designs_dir=None, client=None, force=False):
+    """Generate voice previews for a character (force=True skips the audio cache)."""
     if character_name not in VOICE_DESIGNS:
         print(f"Unknown character: {character_name}")
         print(f"Available: {', '.join(VOICE_DESIGNS.keys())}")
@@ -86,46 +190,163 @@ def design_voice(character_name):
     print(f"\nDesigning voice for: {character_name}")
     print(f"Description: {design['description'][:100]}...")
 
-    client = ElevenLabs(api_key=API_KEY)
+    # Generate voice previews (reused from the audio cache if this
+    # description + preview text was designed before, unless forced)
+    previews = None if force else cached_previews(character_name)
+    if previews:
+        print("  (cached previews)")
+    else:
+        client = client or generate_audio.make_client(API_KEY)
+        with tracing.span("http.create_previews"):
+            response = client.text_to_voice.create_previews(
+                voice_description=design["description"],
+                text=design["preview_text"],
+            )
+        previews = decode_previews(response)
+        audio_cache.put_design(design_hash(character_name), [(audio, voice_id) for audio, voice_id, _ in previews])
+
+    index = load_index(designs_dir)
+    index[character_name] = entry = save_previews(character_name, previews, designs_dir)
+    save_index(index, designs_dir)
+
+    print(f"\nGenerated {len(previews)} previews:")
+    for i, preview in enumerate(entry["previews"]):
+        print(f"  Preview {i}: {preview['file']} ({preview['duration']:.1f}s)")
+        print(f"    Voice ID: {preview['generated_voice_id']}")
+
+    print(f"\nListen to the previews and pick your favorite!")
+    print(f"Voice IDs are in {Path(designs_dir or DESIGNS_DIR) / INDEX_NAME}")
+
+
+# =============================================================================
+# BATCH
+# =============================================================================
+
+async def request_previews_async(client, character_name, semaphore):
+    """One create_previews call, retried with backoff on 429. Returns (previews, seconds)."""
+    design = VOICE_DESIGNS[character_name]
+    async with semaphore:
+        start = time.monotonic()
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                with tracing.span("http.create_previews", attempt=attempt):
+                    response = await client.text_to_voice.create_previews(
+                        voice_description=design["description"],
+                        text=design["preview_text"],
+                    )
+                break
+            except ApiError as e:
+                if e.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                await asyncio.sleep(RATE_LIMIT_BACKOFF * 2**attempt)
+        return decode_previews(response), time.monotonic() - start
+
+
+@tracing.traced()
+async def design_all_async(characters=None, concurrency=CONCURRENCY, force=False, designs_dir=None,
+                           client=None):
+    """Design every character's previews concurrently, writing one index at the end.
+
+    Characters whose description + preview text already have previews on disk
+    are skipped (force=True redesigns them). Returns the index.
+    """
+    characters = list(characters or VOICE_DESIGNS)
+    index = load_index(designs_dir)
+    client = client or generate_audio.make_client(API_KEY, use_async=True)
+    semaphore = asyncio.Semaphore(concurrency)
 
-    # Generate voice previews
-    response = client.text_to_voice.create_previews(
-        voice_description=design["description"],
-        text=design["preview_text"],
+    todo, status = [], {}
+    for name in characters:
+        if not force and is_designed(name, index, designs_dir):
+            status[name] = "up to date"
+            continue
+        previews = None if force else cached_previews(name)
+        if previews:
+            index[name] = save_previews(name, previews, designs_dir)
+            status[name] = "from cache"
+        else:
+            todo.append(name)
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(request_previews_async(client, name, semaphore) for name in todo), return_exceptions=True
     )
+    for name, result in zip(todo, results):
+        if isinstance(result, Exception):
+            status[name] = f"FAILED ({result})"
+            continue
+        previews, seconds = result
+        audio_cache.put_design(design_hash(name), [(audio, voice_id) for audio, voice_id, _ in previews])
+        index[name] = save_previews(name, previews, designs_dir)
+        status[name] = f"designed in {seconds:.1f}s"
+    total = time.monotonic() - start
 
-    # Save previews
-    output_dir = BASE_DIR / "episodes" / "001-kevin-identity" / "audio" / "voice_designs" / character_name
-    output_dir.mkdir(parents=True, exist_ok=True)
+    save_index(index, designs_dir)
+    for name in characters:
+        count = len(index.get(name, {}).get("previews", []))
+        print(f"  {name:<10} {count} previews  {status[name]}")
+    print(f"\n{len(todo)} requested, {len(characters) - len(todo)} skipped, {total:.1f}s wall time "
+          f"(concurrency {concurrency}) -> {Path(designs_dir or DESIGNS_DIR) / INDEX_NAME}")
+    return index
 
-    print(f"\nGenerated {len(response.previews)} previews:")
 
-    for i, preview in enumerate(response.previews):
-        filepath = output_dir / f"{character_name}_design_{i}.mp3"
+def design_all(concurrency=CONCURRENCY, force=False):
+    if not API_KEY:
+        print("ERROR: ELEVENLABS_API_KEY not set")
+        return None
+    print(f"\nDesigning voices for {len(VOICE_DESIGNS)} characters")
+    return asyncio.run(design_all_async(concurrency=concurrency, force=force))
 
-        # Decode base64 audio and save
-        audio_data = base64.b64decode(preview.audio_base_64)
-        with open(filepath, "wb") as f:
-            f.write(audio_data)
 
-        print(f"  Preview {i}: {filepath}")
-        print(f"    Voice ID: {preview.generated_voice_id}")
+def benchmark(latency=2.0):
+    """Sequential design_voice() for every character vs. the batch mode, on fake_tts.py."""
+    import contextlib
+    import io
+    import tempfile
 
-        # Save voice ID to file for later use
-        id_file = output_dir / f"{character_name}_design_{i}_voice_id.txt"
-        with open(id_file, "w") as f:
-            f.write(preview.generated_voice_id)
+    import fake_tts
 
-    print(f"\nListen to the previews and pick your favorite!")
-    print(f"Voice IDs saved alongside audio files for later use.")
+    server, url, _ = fake_tts.serve(design_latency=latency, max_concurrent=len(VOICE_DESIGNS))
+    cache_enabled, audio_cache.ENABLED = audio_cache.ENABLED, False
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = generate_audio.make_client("fake", url)
+            start = time.monotonic()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for name in VOICE_DESIGNS:
+                    design_voice(name, designs_dir=tmp, client=client)
+            sequential = time.monotonic() - start
+
+            client = generate_audio.make_client("fake", url, use_async=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.monotonic()
+                asyncio.run(design_all_async(force=True, designs_dir=tmp, client=client))
+                batch = time.monotonic() - start
+
+                start = time.monotonic()
+                asyncio.run(design_all_async(designs_dir=tmp, client=client))
+                rerun = time.monotonic() - start
+    finally:
+        audio_cache.ENABLED = cache_enabled
+        server.shutdown()
+
+    print(f"\n{len(VOICE_DESIGNS)} characters, {latency}s per preview request")
+    print("-" * 50)
+    print(f"  sequential:            {sequential:6.2f}s")
+    print(f"  batch ({CONCURRENCY} in flight):   {batch:6.2f}s")
+    print(f"  batch, nothing changed: {rerun:5.2f}s")
 
 
 def list_characters():
-    """List available characters."""
+    """List available characters and whether their previews are up to date."""
+    index = load_index()
     print("\nAvailable characters:")
     print("-" * 60)
     for name, design in VOICE_DESIGNS.items():
-        print(f"{name}: {design['description'][:60]}...")
+        mark = "*" if is_designed(name, index) else " "
+        print(f"{mark} {name}: {design['description'][:60]}...")
+    print("\n* previews on disk for the current description")
 
 
 if __name__ == "__main__":
@@ -134,18 +355,23 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python design_voice.py list           - List characters")
-        print("  python design_voice.py <character>    - Design voice for character")
-        print("  python design_voice.py all            - Design voices for all characters")
+        print("  python design_voice.py <character>    - Design voice for character (--force for new previews)")
+        print("  python design_voice.py all [N]        - Design all characters, N requests at a time;")
+        print("                                          skips characters already designed (--force to redo)")
+        print("  python design_voice.py bench          - Sequential vs batch on a fake TTS server")
         print("\nExample:")
         print("  python design_voice.py casey")
         sys.exit(0)
 
-    cmd = sys.argv[1]
+    force = "--force" in sys.argv
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    cmd = args[0]
 
     if cmd == "list":
         list_characters()
     elif cmd == "all":
-        for character in VOICE_DESIGNS:
-            design_voice(character)
+        design_all(int(args[1]) if len(args) > 1 else CONCURRENCY, force)
+    elif cmd == "bench":
+        benchmark()
     else:
-        design_voice(cmd)
+        design_voice(cmd, force=force)
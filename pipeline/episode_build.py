@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Incremental Episode Build
+Models an episode as a DAG of per-shot nodes
+
+    prompt -> images -> selection -+
+                                   +-> assembly
+                          audio ---+
+
+Every node fingerprints its inputs (plus its dependencies' fingerprints) and
+is only re-executed when that fingerprint changes or its outputs are missing.
+Build state lives in episodes/<episode_id>/.build_state.json.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+import episode_manifest
+import storage
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+EPISODES_DIR = BASE_DIR / "episodes"
+STATE_NAME = ".build_state.json"
+SELECTION_NAME = "selection.json"
+
+STAGES = ("prompt", "images", "selection", "audio", "assembly")
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serializable inputs."""
+    blob = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class Node:
+    """One build step: inputs() feeds the fingerprint, run() returns output paths."""
+
+    def __init__(self, name, deps, inputs, run):
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.run = run
+
+    @property
+    def stage(self):
+        return self.name.split(":", 1)[0]
+
+
+class EpisodeBuild:
+    """Build graph and persisted state for one episode."""
+
+    def __init__(self, episode_id=episode_manifest.DEFAULT_EPISODE):
+        self.episode_id = episode_id
+        self.episode = episode_manifest.load_episode(episode_id)
+        self.episode_dir = EPISODES_DIR / episode_id
+        self.state_file = self.episode_dir / STATE_NAME
+        self.state = self._load_state()
+        self.nodes = self._build_graph()
+
+    # -------------------------------------------------------------------------
+    # State
+    # -------------------------------------------------------------------------
+
+    def _load_state(self):
+        if self.state_file.exists():
+            with open(self.state_file) as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def outputs(self, name):
+        """Output paths (relative to the episode dir) recorded for a node."""
+        return self.state.get(name, {}).get("outputs", [])
+
+    # -------------------------------------------------------------------------
+    # Graph
+    # -------------------------------------------------------------------------
+
+    def _build_graph(self):
+        nodes = {}
+        shot_ids = [shot["id"] for shot in self.episode["shots"]]
+
+        for shot_id in shot_ids:
+            image_key = f"shot{shot_id}"
+            nodes[f"prompt:{shot_id}"] = Node(
+                f"prompt:{shot_id}", [],
+                lambda k=image_key: self._payload(k),
+                lambda k=image_key: [],
+            )
+            nodes[f"images:{shot_id}"] = Node(
+                f"images:{shot_id}", [f"prompt:{shot_id}"],
+                lambda: None,
+                lambda k=image_key: self._render_images(k),
+            )
+            nodes[f"selection:{shot_id}"] = Node(
+                f"selection:{shot_id}", [f"images:{shot_id}"],
+                lambda s=shot_id: (self.outputs(f"images:{s}"), self._manual_selection().get(s), self._hand_pick(s)),
+                lambda s=shot_id: self._select(s),
+            )
+            nodes[f"audio:{shot_id}"] = Node(
+                f"audio:{shot_id}", [],
+                lambda s=shot_id: self._tts_key(s),
+                lambda s=shot_id: self._render_audio(s),
+            )
+
+        nodes["assembly"] = Node(
+            "assembly",
+            [f"{stage}:{s}" for s in shot_ids for stage in ("selection", "audio")],
+            lambda: [(s.get("id"), s.get("duration")) for s in self.episode["shots"]],
+            self._assemble,
+        )
+        return nodes
+
+    def _payload(self, image_key):
+        import generate_shot
+        return (
+            generate_shot.build_payload(image_key, episode_id=self.episode_id),
+            generate_shot.shot_requirement(image_key, self.episode_id),
+        )
+
+    def _tts_key(self, shot_id):
+        import generate_audio
+        return generate_audio.cache_key(generate_audio.tts_request(shot_id, self.episode_id))
+
+    def order(self, targets=None):
+        """Topologically sorted node names needed for targets (default: all)."""
+        targets = targets or list(self.nodes)
+        seen, ordered = set(), []
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep)
+            ordered.append(name)
+
+        for name in targets:
+            visit(name)
+        return ordered
+
+    def node_fingerprint(self, name, fingerprints):
+        node = self.nodes[name]
+        return fingerprint(name, node.inputs(), [fingerprints[d] for d in node.deps])
+
+    def is_stale(self, name, fp):
+        entry = self.state.get(name)
+        if entry is None or entry.get("fingerprint") != fp:
+            return True
+        archived = storage.load_index(self.episode_dir / "shots")
+        # Candidates moved to shots/archive/ by storage.py still count as built
+        return not all((self.episode_dir / p).exists() or Path(p).name in archived
+                       for p in entry.get("outputs", []))
+
+    # -------------------------------------------------------------------------
+    # Node actions
+    # -------------------------------------------------------------------------
+
+    def _relative(self, paths):
+        return [str(Path(p).resolve().relative_to(self.episode_dir.resolve())) for p in paths]
+
+    def _render_images(self, image_key):
+        import generate_shot
+        payload = generate_shot.build_payload(image_key, episode_id=self.episode_id)
+        generate_shot.ensure_shot_model(image_key, episode_id=self.episode_id)
+        saved, _, _ = generate_shot.render_shot(
+            image_key, payload, generate_shot.shot_output_path(episode_id=self.episode_id)
+        )
+        return self._relative(saved)
+
+    def _read_selected_md(self):
+        """{shot_id: file} from the hand-maintained SELECTED.md table."""
+        picks = {}
+        selected_md = self.episode_dir / "shots" / "SELECTED.md"
+        if selected_md.exists():
+            shots = self.episode["shots"]
+            for line in selected_md.read_text().splitlines():
+                m = re.match(r"\|\s*(\d+)\s*\|[^|]*\|\s*(\S+\.png)\s*\|", line)
+                if m and 0 < int(m.group(1)) <= len(shots):
+                    picks[shots[int(m.group(1)) - 1]["id"]] = m.group(2)
+        return picks
+
+    def _manual_selection(self):
+        """Hand-picked overrides from shots/selection.json ({shot_id: filename})."""
+        selection_file = self.episode_dir / "shots" / SELECTION_NAME
+        if selection_file.exists():
+            with open(selection_file) as f:
+                return json.load(f)
+        return {}
+
+    def _hand_pick(self, shot_id):
+        """The SELECTED.md pick for a shot if it is a hand edit, else None.
+
+        SELECTED.md also lists the build's own automatic picks; only an entry
+        that differs from the automatic pick and names a current candidate counts.
+        """
+        pick = self._read_selected_md().get(shot_id)
+        names = [Path(c).name for c in self.outputs(f"images:{shot_id}")]
+        if pick in names and pick != self.state.get("_auto", {}).get(shot_id):
+            return pick
+        return None
+
+    def _select(self, shot_id):
+        """Copy the chosen candidate to shots/selected/<shot_id>.png.
+
+        Priority: selection.json override (shot_ranker.py rank --apply pins its
+        picks there), then a hand-picked SELECTED.md entry if it is one of the
+        current candidates, then the first candidate.
+        """
+        candidates = self.outputs(f"images:{shot_id}")
+        if not candidates:
+            raise RuntimeError(f"No candidates rendered for {shot_id}")
+        names = [Path(c).name for c in candidates]
+        auto_picks = self.state.setdefault("_auto", {})
+
+        pick = self._manual_selection().get(shot_id) or self._hand_pick(shot_id)
+        if pick:
+            auto_picks.pop(shot_id, None)
+        else:
+            pick = names[0]
+            auto_picks[shot_id] = pick
+
+        source = self.episode_dir / "shots" / pick
+        if not source.exists():
+            storage.restore(self.episode_id, [pick])  # only the pick leaves the archive
+
+        dest = self.episode_dir / "shots" / "selected" / f"{shot_id}.png"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, dest)
+        self.state.setdefault("_selected_from", {})[shot_id] = source.name
+        return self._relative([dest])
+
+    def _render_audio(self, shot_id):
+        import generate_audio
+        path = generate_audio.generate_audio(shot_id, episode_id=self.episode_id)
+        if path is None:
+            raise RuntimeError(f"Audio generation failed for {shot_id}")
+        return self._relative([path])
+
+    def _assemble(self):
+        """Write the timed shot list consumed by the assembly/encode stage."""
+        timeline = []
+        for shot in self.episode["shots"]:
+            image = self.outputs(f"selection:{shot['id']}")
+            audio = self.outputs(f"audio:{shot['id']}")
+            timeline.append({
+                "id": shot["id"],
+                "image": image[0] if image else None,
+                "audio": audio[0] if audio else None,
+                "duration": shot.get("duration"),
+            })
+
+        renders = self.episode_dir / "renders"
+        renders.mkdir(parents=True, exist_ok=True)
+        with open(renders / "timeline.json", "w") as f:
+            json.dump({"episode_id": self.episode_id, "shots": timeline}, f, indent=2)
+        self._write_selected_md()
+        return self._relative([renders / "timeline.json"])
+
+    def _write_selected_md(self):
+        """Regenerate SELECTED.md from what the selection nodes picked (hand edits win)."""
+        manual = self._manual_selection()
+        hand_edits = {s["id"]: self._hand_pick(s["id"]) for s in self.episode["shots"] if s["id"] not in manual}
+        picked = {
+            **self._read_selected_md(),
+            **self.state.get("_selected_from", {}),
+            **{shot_id: pick for shot_id, pick in hand_edits.items() if pick},
+        }
+        lines = [
+            f"# Episode {self.episode.get('number', '')} - {self.episode['title']} - Selected Shots",
+            "",
+            "## Selected Images",
+            "",
+            "| Shot | Character | Selected File |",
+            "|------|-----------|---------------|",
+        ]
+        for i, shot in enumerate(self.episode["shots"], 1):
+            label = f"{shot['character'].capitalize()} ({shot['id'].split('_', 2)[-1]})"
+            lines.append(f"| {i} | {label} | {picked.get(shot['id'], '')} |")
+        (self.episode_dir / "shots" / "SELECTED.md").write_text("\n".join(lines) + "\n")
+
+    # -------------------------------------------------------------------------
+    # Build
+    # -------------------------------------------------------------------------
+
+    def plan(self, targets=None):
+        """Return [(name, fingerprint, stale)] in execution order.
+
+        Staleness propagates: a node whose dependency will re-run is stale too.
+        """
+        fingerprints, stale_names, plan = {}, set(), []
+        for name in self.order(targets):
+            fp = self.node_fingerprint(name, fingerprints)
+            fingerprints[name] = fp
+            stale = self.is_stale(name, fp) or any(d in stale_names for d in self.nodes[name].deps)
+            if stale:
+                stale_names.add(name)
+            plan.append((name, fp, stale))
+        return plan
+
+    def build(self, targets=None, dry_run=False):
+        """Execute stale nodes. Returns the names that ran (or would run)."""
+        ran = []
+        fingerprints = {}
+        for name in self.order(targets):
+            node = self.nodes[name]
+            fp = self.node_fingerprint(name, fingerprints)
+            stale = self.is_stale(name, fp) or any(d in ran for d in node.deps)
+            if stale:
+                print(f"  {'would run' if dry_run else 'running'}: {name}")
+                if not dry_run:
+                    outputs = node.run()
+                    # Inputs such as selection candidates are only known after deps ran
+                    fp = self.node_fingerprint(name, fingerprints)
+                    self.state[name] = {"fingerprint": fp, "outputs": outputs}
+                    self._save_state()
+                ran.append(name)
+            fingerprints[name] = fp
+
+        total = len(fingerprints)
+        print(f"\n{len(ran)}/{total} nodes {'stale' if dry_run else 'rebuilt'}, {total - len(ran)} up to date")
+        return ran
+
+    def _existing_outputs(self, name):
+        """Outputs already on disk for a node, or None if it has to run."""
+        stage, _, shot_id = name.partition(":")
+        if stage == "prompt":
+            return []
+        if stage == "images":
+            found = sorted((self.episode_dir / "shots").glob(f"shot{shot_id}_*.png"))
+            return self._relative(found) if found else None
+        if stage == "selection":
+            dest = self.episode_dir / "shots" / "selected" / f"{shot_id}.png"
+            return self._relative([dest]) if dest.exists() else None
+        if stage == "audio":
+            path = self.episode_dir / "audio" / f"{shot_id}.mp3"
+            if not path.exists():
+                return None
+            # Only adopt audio whose recorded cache key matches the current line
+            manifest_file = path.parent / "manifest.json"
+            if manifest_file.exists():
+                with open(manifest_file) as f:
+                    entry = json.load(f).get(path.name)
+                if entry and entry.get("cache_key") != self._tts_key(shot_id):
+                    return None
+            return self._relative([path])
+        return None
+
+    def adopt(self):
+        """Mark outputs already on disk as built, so the first build doesn't rerender them."""
+        fingerprints = {}
+        adopted = 0
+        for name in self.order():
+            if name not in self.state:
+                existing = self._existing_outputs(name)
+                if existing is not None:
+                    self.state[name] = {"fingerprint": None, "outputs": existing}
+                    self.state[name]["fingerprint"] = self.node_fingerprint(name, fingerprints)
+                    adopted += 1
+            fingerprints[name] = self.node_fingerprint(name, fingerprints)
+
+        self._save_state()
+        print(f"Adopted {adopted} existing node outputs into {self.state_file}")
+        return adopted
+
+    def targets_for(self, stage=None, shot_id=None):
+        """Node names filtered by stage and/or shot id."""
+        names = []
+        for name, node in self.nodes.items():
+            if stage and node.stage != stage:
+                continue
+            if shot_id and name.split(":", 1)[-1] != shot_id:
+                continue
+            names.append(name)
+        return names
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python episode_build.py build [episode]              - Rebuild stale nodes")
+        print("  python episode_build.py build [episode] --dry-run    - Show what would rebuild")
+        print("  python episode_build.py status [episode]             - Show every node and whether it's stale")
+        print("  python episode_build.py adopt [episode]              - Record existing renders/audio as up to date")
+        print("\nOptions:")
+        print(f"  --stage <{'|'.join(STAGES)}>  Only build one stage (plus its dependencies)")
+        print("  --shot <shot_id>     Only build one shot (e.g. 03_rex_deadpan)")
+        sys.exit(0)
+
+    def take(flag):
+        if flag in sys.argv:
+            i = sys.argv.index(flag)
+            value = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+            return value
+        return None
+
+    stage = take("--stage")
+    shot_id = take("--shot")
+    dry_run = "--dry-run" in sys.argv
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+
+    cmd = args[0]
+    episode_id = args[1] if len(args) > 1 else episode_manifest.DEFAULT_EPISODE
+    build = EpisodeBuild(episode_id)
+    targets = build.targets_for(stage, shot_id) if (stage or shot_id) else None
+
+    if cmd == "build":
+        print(f"\nBuilding {episode_id}")
+        print("-" * 60)
+        build.build(targets, dry_run=dry_run)
+    elif cmd == "adopt":
+        build.adopt()
+    elif cmd == "status":
+        for name, fp, stale in build.plan(targets):
+            print(f"  {'STALE' if stale else 'ok   '}  {name:<32} {fp}")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Episode Manifest
+Loads episodes/<episode_id>/episode.json: the single source for an episode's
+shots, characters, dialogue, voice settings and framing. Image and audio
+stages read their shot lists from here instead of hardcoded dicts.
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+EPISODES_DIR = BASE_DIR / "episodes"
+MANIFEST_NAME = "episode.json"
+DEFAULT_EPISODE = "001-kevin-identity"
+
+REQUIRED_FIELDS = ("episode_id", "title", "framing", "characters", "shots")
+REQUIRED_SHOT_FIELDS = ("id", "character", "pose", "expression", "action", "line")
+VOICE_SETTING_FIELDS = ("stability", "similarity_boost", "style", "use_speaker_boost", "speed")
+
+
+class ManifestError(ValueError):
+    """Raised when an episode manifest is missing or invalid."""
+
+
+def manifest_path(episode_id):
+    """Path to an episode's manifest file."""
+    return EPISODES_DIR / episode_id / MANIFEST_NAME
+
+
+def list_episodes():
+    """Episode ids that have a manifest, in order."""
+    return sorted(p.parent.name for p in EPISODES_DIR.glob(f"*/{MANIFEST_NAME}"))
+
+
+def _check_voice_settings(values, where, problems):
+    if not isinstance(values, dict):
+        problems.append(f"{where}: voice settings must be an object")
+        return
+    for field, value in values.items():
+        if field not in VOICE_SETTING_FIELDS:
+            problems.append(f"{where}: unknown voice setting '{field}'")
+        elif field in ("stability", "similarity_boost", "style") and not 0 <= value <= 1:
+            problems.append(f"{where}: {field}={value} outside 0..1")
+
+
+def validate(episode, source="manifest"):
+    """Raise ManifestError listing every problem found in a manifest dict."""
+    problems = []
+
+    for field in REQUIRED_FIELDS:
+        if field not in episode:
+            problems.append(f"missing '{field}'")
+    if problems:
+        raise ManifestError(f"{source}: " + "; ".join(problems))
+
+    characters = set(episode["characters"])
+    presets = episode.get("voice_settings", {})
+    for name, values in presets.items():
+        _check_voice_settings(values, f"voice_settings.{name}", problems)
+
+    padding = episode.get("padding")
+    if padding is not None and not (isinstance(padding, (int, float)) and padding >= 0):
+        problems.append("padding must be a non-negative number of seconds")
+
+    seen = set()
+    for i, shot in enumerate(episode["shots"]):
+        where = f"shots[{i}]"
+        for field in REQUIRED_SHOT_FIELDS:
+            if not shot.get(field):
+                problems.append(f"{where}: missing '{field}'")
+
+        shot_id = shot.get("id")
+        if shot_id in seen:
+            problems.append(f"{where}: duplicate id '{shot_id}'")
+        seen.add(shot_id)
+
+        if shot.get("character") not in characters:
+            problems.append(f"{where}: character '{shot.get('character')}' not in characters")
+
+        settings = shot.get("voice_settings")
+        if isinstance(settings, str):
+            if settings not in presets and settings not in characters:
+                problems.append(f"{where}: unknown voice_settings preset '{settings}'")
+        elif settings is not None:
+            _check_voice_settings(settings, f"{where}.voice_settings", problems)
+
+        padding = shot.get("padding")
+        if padding is not None and not (isinstance(padding, (int, float)) and padding >= 0):
+            problems.append(f"{where}: padding must be a non-negative number of seconds")
+
+        duration = shot.get("duration")
+        if duration is not None and not (isinstance(duration, (int, float)) and duration > 0):
+            problems.append(f"{where}: duration must be a positive number of seconds")
+
+    if problems:
+        raise ManifestError(f"{source}: " + "; ".join(problems))
+
+
+@lru_cache(maxsize=None)
+def load_episode(episode_id=DEFAULT_EPISODE):
+    """Load and validate an episode manifest (cached for the rest of the run)."""
+    path = manifest_path(episode_id)
+    if not path.exists():
+        raise ManifestError(f"No manifest for episode '{episode_id}' at {path}")
+
+    with open(path) as f:
+        episode = json.load(f)
+
+    validate(episode, str(path))
+    return episode
+
+
+@lru_cache(maxsize=None)
+def image_shots(episode_id=DEFAULT_EPISODE):
+    """Shots keyed for the image stage: {"shot01_casey_hook": {...}}."""
+    episode = load_episode(episode_id)
+    return {
+        f"shot{shot['id']}": {
+            "character": shot["character"],
+            "expression": shot["expression"],
+            "pose": shot["pose"],
+            "action": shot["action"],
+            "framing": shot.get("framing", episode["framing"]),
+            "model": shot.get("model", episode.get("model")),
+            "vae": shot.get("vae", episode.get("vae")),
+        }
+        for shot in episode["shots"]
+    }
+
+
+@lru_cache(maxsize=None)
+def audio_script(episode_id=DEFAULT_EPISODE):
+    """Dialogue keyed for the audio stage: {"01_casey_hook": {...}}."""
+    script = {}
+    for shot in load_episode(episode_id)["shots"]:
+        entry = {"character": shot["character"], "line": shot["line"]}
+        if "voice_settings" in shot:
+            entry["voice_settings"] = shot["voice_settings"]
+        script[shot["id"]] = entry
+    return script
+
+
+def voice_presets(episode_id=DEFAULT_EPISODE):
+    """Named voice-settings presets defined by the episode."""
+    return load_episode(episode_id).get("voice_settings", {})
+
+
+def render_shot_plan(episode_id=DEFAULT_EPISODE):
+    """Render the episode's shot-plan.md from the manifest."""
+    episode = load_episode(episode_id)
+    notes = episode.get("character_notes", {})
+    lines = [
+        f"# {episode['title']} - Shot Plan",
+        "",
+        f"**Episode:** {episode.get('number', episode_id)}",
+        f"**Runtime:** {episode.get('runtime', '')}",
+        f"**Shot Count:** {len(episode['shots'])}",
+        f"**Style:** {episode.get('style', '')}",
+        "",
+        "---",
+        "",
+        "## Shot Breakdown",
+        "",
+    ]
+
+    for i, shot in enumerate(episode["shots"], 1):
+        duration = f"{shot['duration']}s" if shot.get("duration") else ""
+        rows = [
+            ("Duration", duration),
+            ("Character", shot["character"].capitalize()),
+            ("Action", shot.get("description", shot["action"])),
+            ("Expression", shot["expression"]),
+            ("Pose", shot.get("pose_key", shot["pose"])),
+            ("Dialogue", f"\"{shot['line']}\""),
+            ("Framing", shot.get("framing", episode["framing"])),
+            ("Background", shot.get("background", "")),
+        ]
+        lines += [f"### Shot {i}: {shot.get('title', shot['id'])}", "| Field | Value |", "|-------|-------|"]
+        lines += [f"| **{name}** | {value} |" for name, value in rows]
+        lines.append("")
+        if shot["character"] in notes:
+            lines.append(f"**Character notes:** {notes[shot['character']]}")
+        if shot.get("prompt_additions"):
+            lines.append(f"**Prompt additions:** `{shot['prompt_additions']}`")
+        lines += ["", "---", ""]
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python episode_manifest.py list                 - List episodes with a manifest")
+        print("  python episode_manifest.py validate [episode]   - Validate manifest(s)")
+        print("  python episode_manifest.py plan <episode>       - Print shot-plan.md generated from the manifest")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "list":
+        for episode_id in list_episodes():
+            episode = load_episode(episode_id)
+            print(f"  {episode_id}: {episode['title']} ({len(episode['shots'])} shots)")
+    elif cmd == "validate":
+        episodes = sys.argv[2:] or list_episodes()
+        failed = False
+        for episode_id in episodes:
+            try:
+                load_episode(episode_id)
+                print(f"  OK   {episode_id}")
+            except ManifestError as e:
+                failed = True
+                print(f"  FAIL {e}")
+        sys.exit(1 if failed else 0)
+    elif cmd == "plan":
+        print(render_shot_plan(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_EPISODE))
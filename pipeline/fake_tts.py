@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Fake ElevenLabs TTS Server
+Local stand-in for /v1/text-to-speech/{voice_id} and
+/v1/text-to-voice/create-previews so audio generation and voice design can be
+exercised and timed without an API key. Audio is streamed in chunks after a
+simulated latency, and requests beyond the concurrency limit get a 429 like
+the real API.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 7862
+DEFAULT_LATENCY = 0.5         # seconds before the first chunk
+DEFAULT_SECONDS_PER_CHAR = 0.005
+DEFAULT_MAX_CONCURRENT = 5    # Creator tier
+DEFAULT_DESIGN_LATENCY = 2.0  # seconds to generate a set of voice-design previews
+DESIGN_PREVIEWS = 3
+CHUNK_BYTES = 4096
+BYTES_PER_CHAR = 600
+
+
+def fake_audio(voice_id, text):
+    """Deterministic stand-in audio bytes for a voice + line."""
+    digest = hashlib.sha256(f"{voice_id}:{text}".encode("utf-8")).digest()
+    body = digest * (max(1, len(text)) * BYTES_PER_CHAR // len(digest) + 1)
+    return b"ID3" + body[:max(1, len(text)) * BYTES_PER_CHAR]
+
+
+class FakeTTS:
+    """Simulated TTS state shared by all request handlers."""
+
+    def __init__(self, latency=DEFAULT_LATENCY, seconds_per_char=DEFAULT_SECONDS_PER_CHAR,
+                 max_concurrent=DEFAULT_MAX_CONCURRENT, design_latency=DEFAULT_DESIGN_LATENCY):
+        self.latency = latency
+        self.design_latency = design_latency
+        self.seconds_per_char = seconds_per_char
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.peak = 0
+        self.requests = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.active >= self.max_concurrent:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self.requests += 1
+            self.peak = max(self.peak, self.active)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+
+def make_handler(state):
+    """Create a request handler bound to a FakeTTS instance."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, data, status=200):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            payload = self.read_json()
+
+            if path.startswith("/v1/text-to-speech/"):
+                voice_id = path.rsplit("/", 1)[-1]
+                self.stream_speech(voice_id, payload.get("text", ""))
+            elif path == "/v1/text-to-voice/create-previews":
+                self.create_previews(payload.get("voice_description", ""), payload.get("text", ""))
+            else:
+                self.send_json({"detail": "Not Found"}, 404)
+
+        def stream_speech(self, voice_id, text):
+            if not state.acquire():
+                self.send_json({"detail": {"status": "too_many_concurrent_requests"}}, 429)
+                return
+            try:
+                audio = fake_audio(voice_id, text)
+                chunks = [audio[i:i + CHUNK_BYTES] for i in range(0, len(audio), CHUNK_BYTES)]
+                delay = len(text) * state.seconds_per_char / max(1, len(chunks))
+
+                time.sleep(state.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+                    self.wfile.flush()
+                    time.sleep(delay)
+                self.wfile.write(b"0\r\n\r\n")
+            finally:
+                state.release()
+
+        def create_previews(self, description, text):
+            if not state.acquire():
+                self.send_json({"detail": {"status": "too_many_concurrent_requests"}}, 429)
+                return
+            try:
+                time.sleep(state.design_latency)
+                previews = []
+                for i in range(DESIGN_PREVIEWS):
+                    voice_id = hashlib.sha256(f"{description}:{i}".encode("utf-8")).hexdigest()[:20]
+                    audio = fake_audio(voice_id, text)
+                    previews.append({
+                        "audio_base_64": base64.b64encode(audio).decode("ascii"),
+                        "generated_voice_id": voice_id,
+                        "media_type": "audio/mpeg",
+                        "duration_secs": round(len(audio) * 8 / 128000, 2),
+                    })
+                self.send_json({"previews": previews, "text": text})
+            finally:
+                state.release()
+
+    return Handler
+
+
+def serve(port=0, **kwargs):
+    """Start a fake TTS server in a background thread. Returns (server, url, state)."""
+    state = FakeTTS(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, url, state
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+
+    server, url, _ = serve(port)
+    print(f"Fake ElevenLabs TTS running on {url}")
+    print("Press Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Fake Stable Diffusion WebUI
+Local stand-in for the /sdapi/v1 endpoints so pipeline throughput can be
+measured without a GPU. Renders are simulated with a sleep and return a
+small valid PNG (optionally padded to a realistic size).
+"""
+
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 7861
+DEFAULT_RENDER_TIME = 0.5  # seconds per image
+DEFAULT_SWITCH_TIME = 0.0  # seconds to load a different checkpoint/VAE
+DEFAULT_OVERHEAD = 0.0     # fixed seconds per request (setup, VAE decode, encoding)
+# With scale_work, render_time is the cost of one 1024x1024 / 25 step image and
+# other sizes/steps (and hires-fix passes) scale with pixels x steps
+REFERENCE_WORK = 1024 * 1024 * 25
+
+# X/Y/Z plot axis indices understood by the fake (txt2img axis list order)
+XYZ_AXIS_FIELDS = {1: "seed", 4: "steps", 6: "cfg_scale", 9: "sampler_name"}
+
+
+def work(payload):
+    """Denoising work of one image: pixels x steps, plus the hires-fix second pass.
+
+    img2img and hires passes only run steps x denoising_strength steps.
+    two_pass.py uses the same model for its GPU-second estimates.
+    """
+    width, height = int(payload.get("width", 512)), int(payload.get("height", 512))
+    steps = int(payload.get("steps", 20))
+    denoise = float(payload.get("denoising_strength", 0.75))
+    if payload.get("init_images"):
+        return width * height * int(steps * denoise)
+    total = width * height * steps
+    if payload.get("enable_hr"):
+        scale = float(payload.get("hr_scale", 2))
+        hr_steps = int(payload.get("hr_second_pass_steps") or steps)
+        total += int(width * scale) * int(height * scale) * int(hr_steps * denoise)
+    return total
+
+
+def title(name):
+    """Checkpoint title as the WebUI reports it: "name.safetensors [hash]"."""
+    return f"{name} [{hashlib.sha256(name.encode()).hexdigest()[:10]}]"
+
+
+def make_png(width=64, height=64, color=(200, 180, 150), padding=0):
+    """Build a solid-color PNG, optionally padded with an ancillary chunk."""
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(color) * width
+    raw = zlib.compress(row * height)
+    png = b"\x89PNG\r\n\x1a\n"
+    png += chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    png += chunk(b"IDAT", raw)
+    if padding:
+        png += chunk(b"teXt", b"padding\x00" + b"x" * padding)
+    png += chunk(b"IEND", b"")
+    return png
+
+
+class FakeWebUI:
+    """Simulated WebUI state shared by all request handlers."""
+
+    def __init__(self, render_time=DEFAULT_RENDER_TIME, image_bytes=0, model="juggernautXL_ragnarokBy.safetensors",
+                 switch_time=DEFAULT_SWITCH_TIME, overhead=DEFAULT_OVERHEAD, scale_work=False):
+        self.render_time = render_time
+        self.overhead = overhead
+        self.scale_work = scale_work
+        self.image_bytes = image_bytes
+        self.model = model
+        self.vae = "Automatic"
+        self.switch_time = switch_time
+        self.requests = 0
+        self.images = 0
+        self.switches = 0
+        self.gpu_seconds = 0.0
+        self.history = []  # (checkpoint, prompt) per render request, in GPU order
+        # A real WebUI renders one request at a time
+        self.gpu_lock = threading.Lock()
+
+    def image_time(self, payload):
+        """Seconds to render one image of a payload."""
+        if not self.scale_work:
+            return self.render_time
+        return self.render_time * work(payload) / REFERENCE_WORK
+
+    def render(self, payload):
+        """Pretend to render a txt2img/img2img payload."""
+        if payload.get("script_name") == "x/y/z plot":
+            return self.render_xyz(payload)
+
+        batch_size = int(payload.get("batch_size", 1)) * int(payload.get("n_iter", 1))
+        seed = int(payload.get("seed", -1))
+        if seed == -1:
+            seed = random.randint(0, 2**32 - 1)
+
+        with self.gpu_lock:
+            busy = self.overhead + self.image_time(payload) * batch_size
+            time.sleep(busy)
+            self.gpu_seconds += busy
+            self.requests += 1
+            self.images += batch_size
+            self.history.append((self.model, payload.get("prompt", "")))
+
+        seeds = [seed + i for i in range(batch_size)]
+        info = {
+            "seed": seed,
+            "all_seeds": seeds,
+            "sd_model_name": self.model,
+            "infotexts": [self.infotext(payload, s) for s in seeds],
+        }
+        return {"images": [self.image(s) for s in seeds], "parameters": payload, "info": json.dumps(info)}
+
+    def render_xyz(self, payload):
+        """Expand an X/Y/Z plot request: one grid image, then every cell's images."""
+        args = payload.get("script_args", [])
+        axes = []
+        for i in range(3):
+            kind, values, dropdown = args[i * 3:i * 3 + 3]
+            field = XYZ_AXIS_FIELDS.get(kind)
+            if field is None:
+                axes.append([{}])
+                continue
+            items = dropdown if dropdown else [v.strip() for v in str(values).split(",") if v.strip()]
+            cast = str if field == "sampler_name" else (int if field in ("seed", "steps") else float)
+            axes.append([{field: cast(v)} for v in items])
+
+        batch_size = int(payload.get("batch_size", 1)) * int(payload.get("n_iter", 1))
+        seed = int(payload.get("seed", -1))
+        if seed == -1:
+            seed = random.randint(0, 2**32 - 1)
+
+        cells = [{**payload, **x, **y, **z} for z in axes[2] for y in axes[1] for x in axes[0]]
+        with self.gpu_lock:
+            busy = self.overhead + sum(self.image_time(cell) for cell in cells) * batch_size
+            time.sleep(busy)
+            self.gpu_seconds += busy
+            self.requests += 1
+            self.images += batch_size * len(cells)
+
+        images, infotexts = [base64.b64encode(make_png(32, 32)).decode("ascii")], []
+        for cell in cells:
+            for i in range(batch_size):
+                images.append(self.image(int(cell.get("seed", seed)) + i))
+                infotexts.append(self.infotext(cell, int(cell.get("seed", seed)) + i))
+        infotexts.insert(0, infotexts[0])
+
+        info = {"seed": seed, "all_seeds": [seed] * len(images), "sd_model_name": self.model, "infotexts": infotexts}
+        return {"images": images, "parameters": payload, "info": json.dumps(info)}
+
+    def image(self, seed):
+        """Deterministic stand-in image for a seed (same seed, same pixels)."""
+        rng = random.Random(seed)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        return base64.b64encode(make_png(color=color, padding=self.image_bytes)).decode("ascii")
+
+    def infotext(self, payload, seed):
+        return (f"{payload.get('prompt', '')}\nNegative prompt: {payload.get('negative_prompt', '')}\n"
+                f"Steps: {payload.get('steps', 20)}, Sampler: {payload.get('sampler_name', 'Euler a')}, "
+                f"CFG scale: {payload.get('cfg_scale', 7)}, Seed: {seed}, "
+                f"Size: {payload.get('width', 512)}x{payload.get('height', 512)}, Model: {self.model}")
+
+    def set_options(self, options):
+        """Apply an /options POST; loading a new checkpoint or VAE takes switch_time."""
+        changed = False
+        with self.gpu_lock:
+            # Accepts a filename or a title, like the WebUI
+            model = options.get("sd_model_checkpoint", self.model).split(" [")[0]
+            if model != self.model:
+                self.model = model
+                changed = True
+            if options.get("sd_vae", self.vae) != self.vae:
+                self.vae = options["sd_vae"]
+                changed = True
+            if changed:
+                self.switches += 1
+                time.sleep(self.switch_time)
+
+
+def make_handler(state):
+    """Create a request handler bound to a FakeWebUI instance."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, data, status=200):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/sdapi/v1/sd-models":
+                self.send_json([{"title": title(state.model), "model_name": state.model.rsplit(".", 1)[0]}])
+            elif self.path == "/sdapi/v1/options":
+                self.send_json({"sd_model_checkpoint": title(state.model), "sd_vae": state.vae})
+            elif self.path == "/sdapi/v1/progress":
+                self.send_json({"progress": 0.0})
+            else:
+                self.send_json({"detail": "Not Found"}, 404)
+
+        def do_POST(self):
+            payload = self.read_json()
+            if self.path in ("/sdapi/v1/txt2img", "/sdapi/v1/img2img"):
+                self.send_json(state.render(payload))
+            elif self.path == "/sdapi/v1/options":
+                state.set_options(payload)
+                self.send_json(None)
+            else:
+                self.send_json({"detail": "Not Found"}, 404)
+
+    return Handler
+
+
+def serve(port=0, render_time=DEFAULT_RENDER_TIME, image_bytes=0, switch_time=DEFAULT_SWITCH_TIME,
+          overhead=DEFAULT_OVERHEAD, scale_work=False):
+    """Start a fake WebUI in a background thread. Returns (server, url, state)."""
+    state = FakeWebUI(render_time=render_time, image_bytes=image_bytes, switch_time=switch_time, overhead=overhead,
+                      scale_work=scale_work)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, url, state
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    render_time = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RENDER_TIME
+
+    server, url, _ = serve(port, render_time)
+    print(f"Fake WebUI running on {url} ({render_time}s per image)")
+    print("Press Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -11,6 +11,14 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+import character_registry
+import episode_manifest
+import generation_index
+import render_cache
+import seed_registry
+import tracing
+from webui_client import get_client
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -33,6 +41,11 @@ DEFAULTS = {
     "denoising_strength": 0.5,  # For img2img
 }
 
+SAMPLERS = ["DPM++ 2M Karras", "DPM++ SDE Karras", "DPM++ 2M SDE Karras", "Euler a", "DDIM"]
+POSES = ["standing_neutral", "standing_tablet", "reading_tablet", "gesturing", "arms_crossed", "hand_on_hip"]
+EXPRESSIONS = ["neutral", "exasperated", "deadpan", "amused", "surprised", "frustrated", "reading"]
+MODELS = ["juggernautXL_ragnarokBy.safetensors", "sd_xl_base_1.0.safetensors"]
+
 # Default negative prompt
 DEFAULT_NEGATIVE = (
     "photorealistic, hyperrealistic, photograph, real human, anime, 2d, flat, "
@@ -48,36 +61,22 @@ DEFAULT_NEGATIVE = (
 
 def check_api():
     """Check if WebUI API is running."""
-    try:
-        r = requests.get(f"{API_URL}/sdapi/v1/sd-models", timeout=5)
-        return r.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+    return get_client(API_URL).check_api()
 
 
-def get_current_model():
+def get_current_model(refresh=False):
     """Get currently loaded model."""
-    try:
-        r = requests.get(f"{API_URL}/sdapi/v1/options")
-        return r.json().get("sd_model_checkpoint", "Unknown")
-    except:
-        return "Unknown"
+    return get_client(API_URL).get_current_model(refresh)
 
 
 def set_model(model_name):
     """Switch to specified model."""
-    payload = {"sd_model_checkpoint": model_name}
-    r = requests.post(f"{API_URL}/sdapi/v1/options", json=payload)
-    return r.status_code == 200
+    return get_client(API_URL).set_model(model_name)
 
 
 def load_character_prompt(character_name):
-    """Load character prompt data from JSON."""
-    prompt_file = PIPELINE_DIR / "prompts" / f"{character_name}.json"
-    if prompt_file.exists():
-        with open(prompt_file, 'r') as f:
-            return json.load(f)
-    return None
+    """Character prompt data from prompts/<name>.json (loaded once by character_registry)."""
+    return character_registry.load().get(character_name)
 
 
 def generate_timestamp():
@@ -85,34 +84,8 @@ def generate_timestamp():
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-def save_images(images, character, pose, output_dir):
-    """Save generated images with metadata."""
-    timestamp = generate_timestamp()
-    saved_files = []
-
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    for i, img_data in enumerate(images):
-        filename = f"{character}_{pose}_{timestamp}_{i:02d}.png"
-        filepath = output_path / filename
-
-        # Decode and save image
-        img_bytes = base64.b64decode(img_data)
-        with open(filepath, 'wb') as f:
-            f.write(img_bytes)
-
-        saved_files.append(filepath)
-        print(f"  Saved: {filename}")
-
-    return saved_files
-
-
-def log_generation(character, prompt, settings, seed, output_files):
-    """Log generation metadata for reproducibility."""
-    log_dir = PIPELINE_DIR / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-
+def log_generation(character, prompt, settings, seed, output_files, shot=None, model=None):
+    """Log generation metadata for reproducibility (and index it for queries)."""
     log_entry = {
         "timestamp": datetime.now().isoformat(),
         "character": character,
@@ -121,32 +94,17 @@ def log_generation(character, prompt, settings, seed, output_files):
         "seed": seed,
         "output_files": [str(f) for f in output_files]
     }
+    if shot:
+        log_entry["shot"] = shot
+    if model:
+        log_entry["model"] = model
 
-    log_file = log_dir / f"{character}_generations.jsonl"
-    with open(log_file, 'a') as f:
-        f.write(json.dumps(log_entry) + "\n")
+    generation_index.log(log_entry, PIPELINE_DIR / "logs")
 
 
 def save_seed(character, seed, description):
     """Save a 'golden seed' for reuse."""
-    seeds_dir = PIPELINE_DIR / "seeds"
-    seeds_dir.mkdir(parents=True, exist_ok=True)
-
-    seeds_file = seeds_dir / f"{character}_seeds.json"
-
-    seeds = {}
-    if seeds_file.exists():
-        with open(seeds_file, 'r') as f:
-            seeds = json.load(f)
-
-    seeds[str(seed)] = {
-        "description": description,
-        "saved_at": datetime.now().isoformat()
-    }
-
-    with open(seeds_file, 'w') as f:
-        json.dump(seeds, f, indent=2)
-
+    seed_registry.save(character, seed, description)
     print(f"  Seed {seed} saved as '{description}'")
 
 
@@ -154,9 +112,10 @@ def save_seed(character, seed, description):
 # GENERATION FUNCTIONS
 # =============================================================================
 
-def txt2img(prompt, negative_prompt, settings, seed=-1):
-    """Generate image from text prompt."""
-    payload = {
+@tracing.traced("payload_build")
+def txt2img_payload(prompt, negative_prompt, settings, seed=-1):
+    """Build a txt2img payload from settings."""
+    return {
         "prompt": prompt,
         "negative_prompt": negative_prompt,
         "sampler_name": settings.get("sampler", DEFAULTS["sampler"]),
@@ -168,44 +127,56 @@ def txt2img(prompt, negative_prompt, settings, seed=-1):
         "seed": seed,
     }
 
-    r = requests.post(f"{API_URL}/sdapi/v1/txt2img", json=payload)
 
-    if r.status_code == 200:
-        result = r.json()
-        return result["images"], result.get("info", "{}")
-    else:
-        print(f"Error: {r.status_code} - {r.text}")
-        return None, None
-
-
-def img2img(init_image_path, prompt, negative_prompt, settings, seed=-1):
-    """Generate image variation from reference image."""
+@tracing.traced("payload_build")
+def img2img_payload(init_image_path, prompt, negative_prompt, settings, seed=-1):
+    """Build an img2img payload from a reference image and settings."""
     # Load and encode reference image
     with open(init_image_path, 'rb') as f:
         init_image = base64.b64encode(f.read()).decode('utf-8')
 
-    payload = {
+    return {
         "init_images": [init_image],
-        "prompt": prompt,
-        "negative_prompt": negative_prompt,
-        "sampler_name": settings.get("sampler", DEFAULTS["sampler"]),
-        "steps": settings.get("steps", DEFAULTS["steps"]),
-        "cfg_scale": settings.get("cfg_scale", DEFAULTS["cfg_scale"]),
-        "width": settings.get("width", DEFAULTS["width"]),
-        "height": settings.get("height", DEFAULTS["height"]),
-        "batch_size": settings.get("batch_size", DEFAULTS["batch_size"]),
+        **txt2img_payload(prompt, negative_prompt, settings, seed),
         "denoising_strength": settings.get("denoising_strength", DEFAULTS["denoising_strength"]),
-        "seed": seed,
     }
 
-    r = requests.post(f"{API_URL}/sdapi/v1/img2img", json=payload)
 
-    if r.status_code == 200:
-        result = r.json()
-        return result["images"], result.get("info", "{}")
+@tracing.traced()
+def render_to_disk(endpoint, payload, character, pose, output_dir):
+    """Render a payload, streaming images straight to disk.
+
+    Returns (saved_files, info), or (None, None) on failure.
+    """
+    timestamp = generate_timestamp()
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    # Scripted runs can finish several renders within one second
+    stem = f"{character}_{pose}_{timestamp}"
+    suffix = 1
+    while any(output_path.glob(f"{stem}_[0-9][0-9].png")):
+        suffix += 1
+        stem = f"{character}_{pose}_{timestamp}-{suffix}"
+    make_path = lambda i: output_path / f"{stem}_{i:02d}.png"
+
+    model = get_current_model()
+    with tracing.span("render_cache"):
+        cached = render_cache.copy_to(payload, model, make_path)
+    if cached:
+        print("  (cache hit)")
+        saved, info = cached
     else:
-        print(f"Error: {r.status_code} - {r.text}")
-        return None, None
+        try:
+            saved, info = get_client(API_URL).render_to_files(endpoint, payload, make_path)
+        except requests.exceptions.HTTPError as e:
+            print(f"Error: {e.response.status_code} - {e.response.text}")
+            return None, None
+        render_cache.put_files(payload, model, saved, info)
+
+    for filepath in saved:
+        print(f"  Saved: {filepath.name}")
+
+    return saved, info
 
 
 # =============================================================================
@@ -243,7 +214,7 @@ def ask_choice(question, options, default=None):
             return response
 
 
-def ask_seed():
+def ask_seed(character=None):
     """Ask user for seed preference."""
     print("\nSeed options:")
     print("  1. Random (new seed)")
@@ -258,10 +229,21 @@ def ask_seed():
         seed = input("Enter seed number: ").strip()
         return int(seed) if seed else -1
     elif choice == "3":
-        # List saved seeds
-        print("\nSaved seeds would be listed here...")
-        seed = input("Enter seed number: ").strip()
-        return int(seed) if seed else -1
+        # List saved seeds for this character (or all characters)
+        registry = {character: seed_registry.load(character)} if character else seed_registry.all_seeds()
+        saved = [(name, seed, data) for name, seeds in registry.items() for seed, data in seeds.items()]
+        if not saved:
+            print("\nNo saved seeds yet.")
+            seed = input("Enter seed number: ").strip()
+            return int(seed) if seed else -1
+
+        print("\nSaved seeds:")
+        for i, (name, seed, data) in enumerate(saved, 1):
+            print(f"  {i}. {seed} ({name}) - {data['description']}")
+        pick = input("Choose number or enter a seed [1]: ").strip() or "1"
+        if pick.isdigit() and 1 <= int(pick) <= len(saved):
+            return int(saved[int(pick) - 1][1])
+        return int(pick) if pick.lstrip("-").isdigit() else -1
     return -1
 
 
@@ -279,50 +261,71 @@ def ask_negative_prompt():
 
 def ask_sampler():
     """Ask user for sampler."""
-    samplers = [
-        "DPM++ 2M Karras",
-        "DPM++ SDE Karras",
-        "DPM++ 2M SDE Karras",
-        "Euler a",
-        "DDIM"
-    ]
-    return ask_choice("Select sampler:", samplers, default="DPM++ 2M Karras")
+    return ask_choice("Select sampler:", SAMPLERS, default=DEFAULTS["sampler"])
 
 
 # =============================================================================
 # CHARACTER GENERATION WORKFLOWS
 # =============================================================================
 
+def build_character_prompt(character, pose="standing_neutral", expression="neutral"):
+    """Build full reference prompt for a character (pose/expression keys or free text)."""
+    return character_registry.reference_prompt(character, pose, expression)
+
+
 def build_casey_prompt(pose="standing_neutral", expression="neutral"):
     """Build full prompt for Casey."""
-    char_data = load_character_prompt("casey")
-
-    if not char_data:
-        print("Warning: casey.json not found, using hardcoded prompt")
-        char_data = {
-            "base_prompt": "3D animated male character, Pixar Disney style",
-            "identity_tags": "adult man late 20s, short dark brown hair, thick eyebrows, brown eyes",
-            "outfit_tags": "olive blazer, cream shirt, dark jeans, brown shoes",
-            "style_tags": "high quality, professional 3D animation",
-            "expressions": {"neutral": "neutral calm expression"},
-            "poses": {"standing_neutral": "standing naturally, relaxed stance"}
-        }
+    return build_character_prompt("casey", pose, expression)
 
-    # Get expression and pose tags
-    expr_tag = char_data.get("expressions", {}).get(expression, "neutral expression")
-    pose_tag = char_data.get("poses", {}).get(pose, "standing naturally")
-
-    # Build full prompt
-    prompt_parts = [
-        char_data.get("base_prompt", ""),
-        char_data.get("identity_tags", ""),
-        char_data.get("outfit_tags", ""),
-        pose_tag,
-        expr_tag,
-        char_data.get("style_tags", "")
-    ]
 
-    return ", ".join(filter(None, prompt_parts))
+def render_casey(pose="standing_neutral", expression="neutral", mode="txt2img", sampler=None,
+                 seed=-1, negative_prompt=None, output_dir=None, settings=None):
+    """Render one Casey batch without prompting. Returns (saved_files, actual_seed)."""
+    prompt = build_casey_prompt(pose, expression)
+    settings = {**DEFAULTS, **(settings or {}), **({"sampler": sampler} if sampler else {})}
+    negative_prompt = negative_prompt or DEFAULT_NEGATIVE
+
+    if output_dir is None:
+        output_dir = CHARACTERS_DIR / "casey" / "poses"
+
+    if mode == "txt2img":
+        payload = txt2img_payload(prompt, negative_prompt, settings, seed)
+    else:
+        ref_image = CHARACTERS_DIR / "casey" / "reference.png"
+        if not ref_image.exists():
+            print(f"Error: Reference image not found at {ref_image}")
+            return None, seed
+        payload = img2img_payload(ref_image, prompt, negative_prompt, settings, seed)
+
+    # Images are streamed straight to disk
+    saved, info = render_to_disk(mode, payload, "casey", pose, output_dir)
+    if not saved:
+        return None, seed
+
+    # Parse seed from info
+    try:
+        actual_seed = json.loads(info).get("seed", seed)
+    except ValueError:
+        actual_seed = seed
+
+    log_generation("casey", prompt, settings, actual_seed, saved, shot=pose, model=get_current_model())
+    return saved, actual_seed
+
+
+def run_casey(pose="standing_neutral", expression="neutral", mode="txt2img", sampler=None,
+              seeds=(-1,), count=1, negative_prompt=None, output_dir=None, settings=None):
+    """Render Casey for each seed, count times per seed. Returns [(saved_files, seed)]."""
+    results = []
+    for seed in seeds:
+        for _ in range(count):
+            saved, actual_seed = render_casey(pose, expression, mode, sampler, seed,
+                                              negative_prompt, output_dir, settings)
+            if saved:
+                print(f"  {len(saved)} images, seed {actual_seed}")
+                results.append((saved, actual_seed))
+            else:
+                print(f"  Generation failed (seed {seed})")
+    return results
 
 
 def generate_casey(pose="standing_neutral", expression="neutral", output_dir=None, mode="txt2img"):
@@ -341,7 +344,7 @@ def generate_casey(pose="standing_neutral", expression="neutral", output_dir=Non
     print("\n--- Settings ---")
     sampler = ask_sampler()
     negative_prompt = ask_negative_prompt()
-    seed = ask_seed()
+    seed = ask_seed("casey")
 
     settings = {
         **DEFAULTS,
@@ -364,34 +367,9 @@ def generate_casey(pose="standing_neutral", expression="neutral", output_dir=Non
 
     # Generate
     print("\nGenerating...")
+    saved, actual_seed = render_casey(pose, expression, mode, sampler, seed, negative_prompt, output_dir)
 
-    if mode == "txt2img":
-        images, info = txt2img(prompt, negative_prompt, settings, seed)
-    else:
-        ref_image = CHARACTERS_DIR / "casey" / "reference.png"
-        if not ref_image.exists():
-            print(f"Error: Reference image not found at {ref_image}")
-            return
-        images, info = img2img(ref_image, prompt, negative_prompt, settings, seed)
-
-    if images:
-        # Determine output directory
-        if output_dir is None:
-            output_dir = CHARACTERS_DIR / "casey" / "poses"
-
-        # Save images
-        saved = save_images(images, "casey", pose, output_dir)
-
-        # Parse seed from info
-        try:
-            info_dict = json.loads(info)
-            actual_seed = info_dict.get("seed", seed)
-        except:
-            actual_seed = seed
-
-        # Log generation
-        log_generation("casey", prompt, settings, actual_seed, saved)
-
+    if saved:
         print(f"\nGenerated {len(saved)} images")
         print(f"Seed used: {actual_seed}")
 
@@ -407,15 +385,80 @@ def generate_casey(pose="standing_neutral", expression="neutral", output_dir=Non
 # EPISODE SHOT GENERATION
 # =============================================================================
 
-def generate_episode_shots(episode_id, shot_plan):
+def episode_shot_plan(episode_id):
+    """Shot plan for generate_episode_shots() from the episode manifest."""
+    return [
+        {
+            "shot_id": f"shot{shot['id']}",
+            "character": shot["character"],
+            "expression": shot["expression"],
+            "pose": shot.get("pose_key", "standing_neutral"),
+            "description": shot.get("description", shot["action"]),
+        }
+        for shot in episode_manifest.load_episode(episode_id)["shots"]
+    ]
+
+
+def render_episode_shot(shot, output_dir, sampler=None, seed=-1, negative_prompt=None, settings=None):
+    """Render one shot-plan entry without prompting. Returns (saved_files, actual_seed)."""
+    prompt = build_character_prompt(shot['character'], shot.get('pose', 'standing_neutral'), shot['expression'])
+
+    settings = {**DEFAULTS, **(settings or {}), **({"sampler": sampler} if sampler else {})}
+    payload = txt2img_payload(prompt, negative_prompt or DEFAULT_NEGATIVE, settings, seed)
+    saved, info = render_to_disk("txt2img", payload, shot['character'], shot['shot_id'], output_dir)
+    if not saved:
+        return None, seed
+
+    try:
+        actual_seed = json.loads(info).get("seed", seed)
+    except ValueError:
+        actual_seed = seed
+    log_generation(shot['character'], prompt, settings, actual_seed, saved,
+                   shot=shot['shot_id'], model=get_current_model())
+    return saved, actual_seed
+
+
+def episode_output_dir(episode_id):
+    output_dir = EPISODES_DIR / episode_id / "shots"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir
+
+
+def run_episode_shots(episode_id, shots=None, sampler=None, seeds=(-1,), count=1,
+                      negative_prompt=None, settings=None):
+    """Render an episode's shots without prompting.
+
+    shots limits the run to these shot ids ("shot03_rex_deadpan" or "03_rex_deadpan").
+    Returns {shot_id: [(saved_files, seed)]}.
+    """
+    shot_plan = episode_shot_plan(episode_id)
+    if shots:
+        wanted = {s if s.startswith("shot") else f"shot{s}" for s in shots}
+        shot_plan = [shot for shot in shot_plan if shot['shot_id'] in wanted]
+    output_dir = episode_output_dir(episode_id)
+
+    results = {}
+    for i, shot in enumerate(shot_plan, 1):
+        print(f"\n--- Shot {i}/{len(shot_plan)}: {shot['shot_id']} ---")
+        for seed in seeds:
+            for _ in range(count):
+                saved, actual_seed = render_episode_shot(shot, output_dir, sampler, seed, negative_prompt, settings)
+                if saved:
+                    print(f"  Saved {len(saved)} images (seed {actual_seed})")
+                    results.setdefault(shot['shot_id'], []).append((saved, actual_seed))
+    return results
+
+
+def generate_episode_shots(episode_id, shot_plan=None):
     """Generate all shots for an episode based on shot plan."""
+    if shot_plan is None:
+        shot_plan = episode_shot_plan(episode_id)
 
     print(f"\n{'='*60}")
     print(f"EPISODE SHOT GENERATION: {episode_id}")
     print(f"{'='*60}")
 
-    output_dir = EPISODES_DIR / episode_id / "shots"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    output_dir = episode_output_dir(episode_id)
 
     for i, shot in enumerate(shot_plan, 1):
         print(f"\n--- Shot {i}/{len(shot_plan)}: {shot['character']} ---")
@@ -425,23 +468,12 @@ def generate_episode_shots(episode_id, shot_plan):
         if not ask_yes_no(f"Generate this shot?", "y"):
             continue
 
-        # Build prompt for this character
-        # (In full implementation, would load character-specific prompts)
-        prompt = build_casey_prompt(shot.get('pose', 'standing_neutral'), shot['expression'])
-
-        # Override character in prompt if not Casey
-        if shot['character'] != 'casey':
-            print(f"  Note: {shot['character']} prompt not yet configured, using Casey as template")
-
         negative_prompt = ask_negative_prompt()
-        seed = ask_seed()
-
-        settings = {**DEFAULTS, "sampler": ask_sampler()}
-
-        images, info = txt2img(prompt, negative_prompt, settings, seed)
+        seed = ask_seed(shot['character'])
+        sampler = ask_sampler()
 
-        if images:
-            saved = save_images(images, shot['character'], shot['shot_id'], output_dir)
+        saved, _ = render_episode_shot(shot, output_dir, sampler, seed, negative_prompt)
+        if saved:
             print(f"  Saved {len(saved)} images for shot {i}")
 
 
@@ -464,7 +496,7 @@ def main():
         return
 
     print(f"\nAPI connected: {API_URL}")
-    print(f"Current model: {get_current_model()}")
+    print(f"Current model: {get_current_model(refresh=True)}")
 
     while True:
         print("\n--- Main Menu ---")
@@ -477,44 +509,19 @@ def main():
 
         choice = input("\nSelect option: ").strip().lower()
 
-        if choice == "1":
-            pose = ask_choice("Select pose:", [
-                "standing_neutral", "standing_tablet", "reading_tablet",
-                "gesturing", "arms_crossed", "hand_on_hip"
-            ], default="standing_neutral")
-
-            expression = ask_choice("Select expression:", [
-                "neutral", "exasperated", "deadpan", "amused",
-                "surprised", "frustrated", "reading"
-            ], default="neutral")
-
-            generate_casey(pose, expression, mode="txt2img")
-
-        elif choice == "2":
-            pose = ask_choice("Select pose:", [
-                "standing_neutral", "standing_tablet", "reading_tablet",
-                "gesturing", "arms_crossed", "hand_on_hip"
-            ], default="standing_neutral")
-
-            expression = ask_choice("Select expression:", [
-                "neutral", "exasperated", "deadpan", "amused",
-                "surprised", "frustrated", "reading"
-            ], default="neutral")
-
-            generate_casey(pose, expression, mode="img2img")
+        if choice in ("1", "2"):
+            pose = ask_choice("Select pose:", POSES, default="standing_neutral")
+            expression = ask_choice("Select expression:", EXPRESSIONS, default="neutral")
+            generate_casey(pose, expression, mode="txt2img" if choice == "1" else "img2img")
 
         elif choice == "3":
-            # Example shot plan for Kevin Identity
-            shot_plan = [
-                {"shot_id": "shot01", "character": "casey", "expression": "neutral", "description": "Casey reading OP"},
-                {"shot_id": "shot02", "character": "rex", "expression": "deadpan", "description": "Rex delivers options"},
-                {"shot_id": "shot03", "character": "fizz", "expression": "excited", "description": "Fizz agrees"},
-            ]
-            generate_episode_shots("001-kevin-identity", shot_plan)
+            # Shot plan comes from episodes/<episode_id>/episode.json
+            episodes = episode_manifest.list_episodes()
+            episode_id = ask_choice("Select episode:", episodes, default=episode_manifest.DEFAULT_EPISODE)
+            generate_episode_shots(episode_id)
 
         elif choice == "4":
-            models = ["juggernautXL_ragnarokBy.safetensors", "sd_xl_base_1.0.safetensors"]
-            model = ask_choice("Select model:", models)
+            model = ask_choice("Select model:", MODELS)
             print(f"Switching to {model}...")
             if set_model(model):
                 print("Model switched successfully!")
@@ -522,16 +529,7 @@ def main():
                 print("Failed to switch model.")
 
         elif choice == "5":
-            seeds_dir = PIPELINE_DIR / "seeds"
-            if seeds_dir.exists():
-                for f in seeds_dir.glob("*.json"):
-                    print(f"\n{f.stem}:")
-                    with open(f) as sf:
-                        seeds = json.load(sf)
-                        for seed, data in seeds.items():
-                            print(f"  {seed}: {data['description']}")
-            else:
-                print("No saved seeds yet.")
+            seed_registry.print_seeds()
 
         elif choice == "q":
             print("Goodbye!")
@@ -540,5 +538,159 @@ def main():
             print("Invalid option.")
 
 
+# =============================================================================
+# NON-INTERACTIVE CLI
+# =============================================================================
+
+# CLI/config keys that map onto DEFAULTS
+SETTING_ARGS = {"steps": "steps", "cfg": "cfg_scale", "width": "width", "height": "height",
+                "batch_size": "batch_size", "denoising_strength": "denoising_strength"}
+JOB_KEYS = {"workflow", "sampler", "seed", "seeds", "count", "negative_prompt", "settings",
+            "pose", "expression", "mode", "output_dir", "episode", "shots", *SETTING_ARGS}
+
+
+def normalize_job(job):
+    """Check a job's keys and move top-level setting keys (steps, cfg, ...) into "settings".
+
+    Raises ValueError for keys no workflow reads, so a typo isn't silently ignored.
+    """
+    unknown = set(job) - JOB_KEYS
+    if unknown:
+        raise ValueError(f"Unknown job keys: {', '.join(sorted(unknown))} (expected {', '.join(sorted(JOB_KEYS))})")
+    job = dict(job)
+    settings = dict(job.pop("settings", None) or {})
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))} (expected {', '.join(DEFAULTS)})")
+    for flag, key in SETTING_ARGS.items():
+        value = job.pop(flag, None)
+        if value is not None:
+            settings[key] = value
+    if settings:
+        job["settings"] = settings
+    return job
+
+
+def merge_jobs(defaults, job):
+    """defaults overlaid with job; "settings" is merged one level deep."""
+    defaults, job = normalize_job(defaults), normalize_job(job)
+    merged = {**defaults, **job}
+    settings = {**defaults.get("settings", {}), **job.get("settings", {})}
+    if settings:
+        merged["settings"] = settings
+    return merged
+
+
+def run_job(job):
+    """Run one workflow described by a dict (from the CLI or a config file)."""
+    job = normalize_job(job)
+    workflow = job.get("workflow", "casey")
+    model = job.get("settings", {}).get("model")
+    if model and not set_model(model):
+        print(f"Failed to load {model}, skipping {workflow} job")
+        return None
+    common = {
+        "sampler": job.get("sampler"),
+        "seeds": job.get("seeds") or [job.get("seed", -1)],
+        "count": job.get("count", 1),
+        "negative_prompt": job.get("negative_prompt"),
+        "settings": job.get("settings"),
+    }
+    if workflow == "casey":
+        return run_casey(job.get("pose", "standing_neutral"), job.get("expression", "neutral"),
+                         job.get("mode", "txt2img"), output_dir=job.get("output_dir"), **common)
+    if workflow == "episode":
+        return run_episode_shots(job.get("episode", episode_manifest.DEFAULT_EPISODE), job.get("shots"), **common)
+    raise ValueError(f"Unknown workflow '{workflow}' (expected casey or episode)")
+
+
+def run_config(path):
+    """Run every job in a JSON config: {"defaults": {...}, "jobs": [{...}, ...]}.
+
+    A config without "jobs" is a single job.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    defaults = config.get("defaults", {})
+    jobs = config.get("jobs", [config])
+    # Check every job before rendering any of them
+    jobs = [merge_jobs(defaults, job) for job in jobs]
+    for i, job in enumerate(jobs, 1):
+        print(f"\n=== Job {i}/{len(jobs)}: {job.get('workflow', 'casey')} ===")
+        run_job(job)
+
+
+def build_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Internet Improv asset generation (no args = interactive menu)")
+    parser.add_argument("--no-cache", action="store_true", help="always render, skip the render cache")
+    parser.add_argument("--api-url", default=API_URL, help=f"WebUI URL (default {API_URL})")
+    sub = parser.add_subparsers(dest="command")
+
+    render = argparse.ArgumentParser(add_help=False)
+    render.add_argument("--sampler", help=f"default {DEFAULTS['sampler']}")
+    render.add_argument("--seed", type=int, action="append", dest="seeds",
+                        help="seed to render (repeatable; -1 = random, the default)")
+    render.add_argument("--count", type=int, default=1, help="renders per seed")
+    render.add_argument("--negative-prompt", help="override the default negative prompt")
+    for flag, key in SETTING_ARGS.items():
+        render.add_argument(f"--{flag.replace('_', '-')}", dest=flag,
+                            type=float if flag in ("cfg", "denoising_strength") else int,
+                            help=f"default {DEFAULTS[key]}")
+
+    sub.add_parser("menu", help="interactive menu")
+
+    casey = sub.add_parser("casey", parents=[render], help="render Casey poses")
+    casey.add_argument("--pose", default="standing_neutral", help=f"one of {', '.join(POSES)}")
+    casey.add_argument("--expression", default="neutral", help=f"one of {', '.join(EXPRESSIONS)}")
+    casey.add_argument("--mode", choices=["txt2img", "img2img"], default="txt2img")
+    casey.add_argument("--output-dir")
+
+    episode = sub.add_parser("episode", parents=[render], help="render episode shots")
+    episode.add_argument("episode", nargs="?", default=episode_manifest.DEFAULT_EPISODE)
+    episode.add_argument("--shot", action="append", dest="shots", help="only this shot id (repeatable)")
+
+    run = sub.add_parser("run", help="run jobs from a JSON config file")
+    run.add_argument("config")
+
+    model = sub.add_parser("model", help="switch checkpoint")
+    model.add_argument("name", help=f"e.g. {MODELS[0]}")
+
+    seeds = sub.add_parser("seeds", help="list golden seeds")
+    seeds.add_argument("character", nargs="?")
+    return parser
+
+
+def cli(argv=None):
+    """Entry point: argument-driven workflows, or the menu when no command is given."""
+    global API_URL
+    args = build_parser().parse_args(argv)
+
+    if args.no_cache:
+        render_cache.ENABLED = False
+    API_URL = args.api_url
+
+    if args.command in (None, "menu"):
+        return main()
+    if args.command == "seeds":
+        return seed_registry.print_seeds(args.character)
+
+    if not check_api():
+        print(f"ERROR: WebUI API not accessible at {API_URL}")
+        raise SystemExit(1)
+
+    if args.command == "model":
+        ok = set_model(args.name)
+        print("Model switched successfully!" if ok else "Failed to switch model.")
+        raise SystemExit(0 if ok else 1)
+    if args.command == "run":
+        return run_config(args.config)
+
+    job = {key: value for key, value in vars(args).items() if key in JOB_KEYS}
+    job["workflow"] = args.command
+    return run_job(job)
+
+
 if __name__ == "__main__":
-    main()
+    cli()
@@ -4,9 +4,17 @@ Internet Improv - Audio Generator using ElevenLabs
 Generates voice audio for each shot using character-appropriate voices
 """
 
+import asyncio
 import os
+import time
 from pathlib import Path
-from elevenlabs import ElevenLabs, VoiceSettings
+from elevenlabs import AsyncElevenLabs, ElevenLabs, VoiceSettings
+from elevenlabs.core.api_error import ApiError
+
+import audio_cache
+import episode_manifest
+import stream_writer
+import tracing
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,9 +29,24 @@ def load_api_key():
     return os.environ.get("ELEVENLABS_API_KEY")
 
 API_KEY = load_api_key()
+# Set to a fake_tts.py URL for local runs; unset = ElevenLabs production
+BASE_URL_ENV = "ELEVENLABS_BASE_URL"
+
+MODEL_ID = "eleven_multilingual_v2"  # Best quality model
+
+# Max simultaneous TTS requests for `all`. Match your ElevenLabs tier's
+# concurrency limit (Free 2, Starter 3, Creator 5, Pro 10).
+CONCURRENCY = 3
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 1.0  # seconds, doubled after each 429
+# Pipe single-shot audio to a local player while it downloads (--play)
+PLAY = False
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-AUDIO_DIR = BASE_DIR / "episodes" / "001-kevin-identity" / "audio"
+EPISODES_DIR = BASE_DIR / "episodes"
+
+# Dialogue and per-episode voice presets come from episodes/<episode_id>/episode.json
+EPISODE_ID = episode_manifest.DEFAULT_EPISODE
 
 # Voice IDs from ElevenLabs voice library
 # You can browse voices at: https://elevenlabs.io/voice-library
@@ -38,12 +61,12 @@ VOICES = {
     "byte": "MF3mGyEYCl7XYWbV9V6O",        # Elli - slightly robotic
 }
 
-# Voice settings per character (stability, similarity_boost, style)
+# Default voice settings per character (stability, similarity_boost, style).
+# Episodes can add named presets (e.g. "casey_reading") in their manifest.
 # Lower stability = more expressive/varied
 # Higher style = more emotional range
 VOICE_SETTINGS = {
     "casey": VoiceSettings(stability=0.4, similarity_boost=0.75, style=0.5),  # Expressive narrator
-    "casey_reading": VoiceSettings(stability=0.15, similarity_boost=0.6, style=1.0),  # Max expressiveness for OP readings
     "rex": VoiceSettings(stability=0.8, similarity_boost=0.8, style=0.2),  # Deadpan, monotone
     "fizz": VoiceSettings(stability=0.25, similarity_boost=0.7, style=0.9),  # Chaotic, energetic
     "harper": VoiceSettings(stability=0.5, similarity_boost=0.8, style=0.6),  # Warm, friendly
@@ -52,92 +75,112 @@ VOICE_SETTINGS = {
     "byte": VoiceSettings(stability=0.85, similarity_boost=0.9, style=0.1),  # Robotic, consistent
 }
 
-# Episode 001 script
-SCRIPT = {
-    "01_casey_hook": {
-        "character": "casey",
-        "line": "Internet Improv presents...",
-    },
-    "02_casey_reading": {
-        "character": "casey",
-        "line": "I mumbled my name at a coffee shop. The barista heard... Kevin! I panicked and just nodded. Now she asks about my dog every morning. I don't own any pets.",
-        "voice_settings": "casey_reading",  # Use more expressive settings
-    },
-    "03_rex_deadpan": {
-        "character": "rex",
-        "line": "You have two options. One: Find another coffee place. Two: Change your name to Kevin.",
-    },
-    "04_fizz_excited": {
-        "character": "fizz",
-        "line": "Option 2 sounds easier!",
-    },
-    "05_harper_wholesome": {
-        "character": "harper",
-        "line": "Or just embrace it! Who doesn't want a cool coffee persona like Kevin?",
-    },
-    "06_fizz_mischievous": {
-        "character": "fizz",
-        "line": "I hear Kevin rescues injured pandas in his spare time. The guy's a legend.",
-    },
-    "07_byte_robotic": {
-        "character": "byte",
-        "line": "Chuck Norris has a shrine dedicated to Kevin.",
-    },
-    "08_mira_theatrical": {
-        "character": "mira",
-        "line": "Kevin? Oh, he once climbed a tree to save my blind kitten. One hell of a guy, I tell ya!",
-    },
-    "09_dot_serious": {
-        "character": "dot",
-        "line": "I heard someone say that if Kevin dies, he's giving his eyes to Stevie Wonder.",
-    },
-    "10_casey_outro": {
-        "character": "casey",
-        "line": "...Follow for more Internet Improv.",
-    },
-}
+def get_script(episode_id=None):
+    """Dialogue for an episode, keyed like "01_casey_hook"."""
+    return episode_manifest.audio_script(episode_id or EPISODE_ID)
 
 
-def generate_audio(shot_key, output_dir=None):
-    """Generate audio for a specific shot."""
+def audio_dir(episode_id=None):
+    """Default audio output directory for an episode."""
+    return EPISODES_DIR / (episode_id or EPISODE_ID) / "audio"
 
-    if not API_KEY:
+
+def resolve_voice_settings(shot, episode_id=None):
+    """VoiceSettings for a shot: inline values, an episode preset, or the character default."""
+    settings = shot.get("voice_settings", shot["character"])
+    if isinstance(settings, dict):
+        return VoiceSettings(**settings)
+    presets = episode_manifest.voice_presets(episode_id or EPISODE_ID)
+    if settings in presets:
+        return VoiceSettings(**presets[settings])
+    return VOICE_SETTINGS.get(settings)
+
+
+_client = None
+
+
+def make_client(api_key, base_url=None, use_async=False):
+    """ElevenLabs (or AsyncElevenLabs) client; base_url defaults to $ELEVENLABS_BASE_URL."""
+    cls = AsyncElevenLabs if use_async else ElevenLabs
+    return cls(api_key=api_key, base_url=base_url or os.environ.get(BASE_URL_ENV) or None)
+
+
+def get_client():
+    """Return the shared ElevenLabs client."""
+    global _client
+    if _client is None:
+        _client = make_client(API_KEY)
+    return _client
+
+
+def tts_request(shot_key, episode_id=None):
+    """Resolve the voice, text and settings for a shot's line."""
+    shot = get_script(episode_id)[shot_key]
+
+    return {
+        "voice_id": VOICES[shot["character"]],
+        "text": shot["line"],
+        "model_id": MODEL_ID,
+        # Shot-specific override if available, else character default
+        "voice_settings": resolve_voice_settings(shot, episode_id),
+    }
+
+
+def cache_key(request):
+    """Audio cache key for a tts_request()."""
+    return audio_cache.tts_key(request["voice_id"], request["model_id"], request["voice_settings"], request["text"])
+
+
+def record_manifest(output_path, shot_key, request, key, hit, episode_id=None):
+    """Note which cached file {shot_key}.mp3 came from."""
+    audio_cache.record(
+        output_path, f"{shot_key}.mp3", key, hit,
+        character=get_script(episode_id)[shot_key]["character"],
+        voice_id=request["voice_id"],
+        model_id=request["model_id"],
+        voice_settings=audio_cache.settings_dict(request["voice_settings"]),
+        text=request["text"],
+    )
+
+
+def log_metrics(output_path, shot_key, request, metrics, episode_id=None):
+    """Append a line's streaming metrics to tts_metrics.jsonl next to the audio."""
+    stream_writer.log(
+        output_path, metrics,
+        shot=shot_key,
+        character=get_script(episode_id)[shot_key]["character"],
+        voice=request["voice_id"],
+        chars=len(request["text"]),
+        voice_settings=audio_cache.settings_dict(request["voice_settings"]),
+    )
+
+
+@tracing.traced()
+def generate_audio(shot_key, output_dir=None, episode_id=None, client=None):
+    """Generate audio for a specific shot (on the shared client unless one is given)."""
+
+    if client is None and not API_KEY:
         print("ERROR: ELEVENLABS_API_KEY not set")
         print("Set it with: set ELEVENLABS_API_KEY=your_key_here")
         return None
 
-    if shot_key not in SCRIPT:
+    script = get_script(episode_id)
+    if shot_key not in script:
         print(f"Unknown shot: {shot_key}")
         return None
 
-    shot = SCRIPT[shot_key]
-    character = shot["character"]
-    line = shot["line"]
-    voice_id = VOICES[character]
-
-    # Get voice settings - use shot-specific override if available, else character default
-    settings_key = shot.get("voice_settings", character)
-    voice_settings = VOICE_SETTINGS.get(settings_key)
+    request = tts_request(shot_key, episode_id)
+    voice_settings = request["voice_settings"]
 
     print(f"\nGenerating audio for: {shot_key}")
-    print(f"Character: {character}")
-    print(f"Line: {line}")
+    print(f"Character: {script[shot_key]['character']}")
+    print(f"Line: {request['text']}")
     if voice_settings:
         print(f"Settings: stability={voice_settings.stability}, style={voice_settings.style}")
 
-    client = ElevenLabs(api_key=API_KEY)
-
-    # Generate audio
-    audio = client.text_to_speech.convert(
-        voice_id=voice_id,
-        text=line,
-        model_id="eleven_multilingual_v2",  # Best quality model
-        voice_settings=voice_settings,
-    )
-
     # Determine output directory
     if output_dir is None:
-        output_dir = AUDIO_DIR
+        output_dir = audio_dir(episode_id)
 
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -146,30 +189,180 @@ def generate_audio(shot_key, output_dir=None):
     filename = f"{shot_key}.mp3"
     filepath = output_path / filename
 
-    with open(filepath, "wb") as f:
-        for chunk in audio:
-            f.write(chunk)
+    key = cache_key(request)
+    if audio_cache.get(key, filepath):
+        record_manifest(output_path, shot_key, request, key, True, episode_id)
+        print(f"Cached: {filepath}")
+        return filepath
+
+    # Generate audio, streaming to disk (and the player) as chunks arrive
+    player = stream_writer.open_player() if PLAY else None
+    start = time.perf_counter()
+    audio = (client or get_client()).text_to_speech.convert(
+        voice_id=request["voice_id"],
+        text=request["text"],
+        model_id=request["model_id"],
+        voice_settings=voice_settings,
+    )
+    try:
+        metrics = stream_writer.write_stream(audio, filepath, player, start)
+    finally:
+        if player:
+            player.close()
 
-    print(f"Saved: {filepath}")
+    audio_cache.put(key, filepath)
+    record_manifest(output_path, shot_key, request, key, False, episode_id)
+    log_metrics(output_path, shot_key, request, metrics, episode_id)
+
+    print(f"Saved: {filepath} ({stream_writer.describe(metrics)})")
     return filepath
 
 
-def generate_all():
-    """Generate audio for all shots."""
+def generate_all(episode_id=None):
+    """Generate audio for all shots, one at a time."""
+    episode_id = episode_id or EPISODE_ID
     print("\n" + "="*60)
-    print("GENERATING ALL AUDIO FOR EPISODE 001")
+    print(f"GENERATING ALL AUDIO FOR {episode_id.upper()}")
     print("="*60)
 
-    for shot_key in SCRIPT:
-        generate_audio(shot_key)
+    for shot_key in get_script(episode_id):
+        generate_audio(shot_key, episode_id=episode_id)
         print()
 
 
-def list_shots():
+@tracing.traced("generate_audio")
+async def generate_audio_async(client, shot_key, semaphore, output_path, episode_id=None):
+    """Synthesize one line, streaming chunks to disk as they arrive.
+
+    Returns (shot_key, filepath, seconds).
+    """
+    request = tts_request(shot_key, episode_id)
+    filepath = output_path / f"{shot_key}.mp3"
+
+    key = cache_key(request)
+    if audio_cache.get(key, filepath):
+        record_manifest(output_path, shot_key, request, key, True, episode_id)
+        print(f"  {shot_key:<22}  cached -> {filepath.name}")
+        return shot_key, filepath, 0.0
+
+    async with semaphore:
+        start = time.monotonic()
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                # Streamed to {shot_key}.mp3.part and renamed once complete
+                metrics = await stream_writer.write_stream_async(client.text_to_speech.convert(
+                    voice_id=request["voice_id"],
+                    text=request["text"],
+                    model_id=request["model_id"],
+                    voice_settings=request["voice_settings"],
+                ), filepath)
+                break
+            except ApiError as e:
+                # 429 = over the account's concurrency/rate limit; back off and retry
+                if e.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                await asyncio.sleep(RATE_LIMIT_BACKOFF * 2**attempt)
+        elapsed = time.monotonic() - start
+
+    audio_cache.put(key, filepath)
+    record_manifest(output_path, shot_key, request, key, False, episode_id)
+    log_metrics(output_path, shot_key, request, {**metrics, "retries": attempt}, episode_id)
+    print(f"  {shot_key:<22} {elapsed:5.2f}s  first chunk {metrics['ttfb_s'] or 0:.2f}s  -> {filepath.name}")
+    return shot_key, filepath, elapsed
+
+
+@tracing.traced()
+async def generate_all_async(concurrency=CONCURRENCY, output_dir=None, shot_keys=None, episode_id=None,
+                             client=None):
+    """Synthesize all lines concurrently with one AsyncElevenLabs client.
+
+    Returns {shot_key: filepath}.
+    """
+    output_path = Path(output_dir or audio_dir(episode_id))
+    output_path.mkdir(parents=True, exist_ok=True)
+    shot_keys = list(shot_keys or get_script(episode_id))
+
+    client = client or make_client(API_KEY, use_async=True)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(generate_audio_async(client, key, semaphore, output_path, episode_id) for key in shot_keys),
+        return_exceptions=True,
+    )
+    total = time.monotonic() - start
+
+    saved = {}
+    line_time = 0.0
+    for key, result in zip(shot_keys, results):
+        if isinstance(result, Exception):
+            print(f"  {key}: FAILED ({result})")
+            continue
+        _, filepath, elapsed = result
+        saved[key] = filepath
+        line_time += elapsed
+
+    print(f"\n{len(saved)}/{len(shot_keys)} lines in {total:.2f}s wall time "
+          f"({line_time:.2f}s of synthesis, concurrency {concurrency})")
+    return saved
+
+
+def generate_all_parallel(concurrency=CONCURRENCY, episode_id=None):
+    """Generate audio for all shots concurrently."""
+    if not API_KEY:
+        print("ERROR: ELEVENLABS_API_KEY not set")
+        print("Set it with: set ELEVENLABS_API_KEY=your_key_here")
+        return None
+
+    episode_id = episode_id or EPISODE_ID
+    print("\n" + "="*60)
+    print(f"GENERATING ALL AUDIO FOR {episode_id.upper()} (concurrency {concurrency})")
+    print("="*60)
+
+    return asyncio.run(generate_all_async(concurrency, episode_id=episode_id))
+
+
+def benchmark(concurrency=CONCURRENCY, latency=0.5):
+    """Compare sequential vs concurrent synthesis against fake_tts.py."""
+    import contextlib
+    import io
+    import tempfile
+
+    import fake_tts
+
+    server, url, state = fake_tts.serve(latency=latency, max_concurrent=concurrency)
+    cache_enabled, audio_cache.ENABLED = audio_cache.ENABLED, False
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client("fake", url)
+            start = time.monotonic()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for key in get_script():
+                    generate_audio(key, output_dir=tmp, client=client)
+            sequential = time.monotonic() - start
+
+            start = time.monotonic()
+            asyncio.run(generate_all_async(concurrency, output_dir=tmp,
+                                           client=make_client("fake", url, use_async=True)))
+            concurrent = time.monotonic() - start
+    finally:
+        audio_cache.ENABLED = cache_enabled
+        server.shutdown()
+
+    print(f"\n{len(get_script())} lines, {latency}s first-byte latency")
+    print("-" * 50)
+    print(f"  sequential:          {sequential:6.2f}s")
+    print(f"  concurrent ({concurrency}):      {concurrent:6.2f}s")
+    print(f"  peak in-flight: {state.peak}, 429s: {state.rejected}")
+
+
+def list_shots(episode_id=None):
     """List all shots and their lines."""
-    print("\nEpisode 001 Script:")
+    episode_id = episode_id or EPISODE_ID
+    print(f"\n{episode_id} Script:")
     print("-" * 60)
-    for key, shot in SCRIPT.items():
+    for key, shot in get_script(episode_id).items():
         print(f"{key} ({shot['character']}): \"{shot['line'][:50]}...\"" if len(shot['line']) > 50 else f"{key} ({shot['character']}): \"{shot['line']}\"")
 
 
@@ -179,8 +372,7 @@ def list_voices():
         print("ERROR: ELEVENLABS_API_KEY not set")
         return
 
-    client = ElevenLabs(api_key=API_KEY)
-    voices = client.voices.get_all()
+    voices = get_client().voices.get_all()
 
     print("\nAvailable voices:")
     print("-" * 60)
@@ -196,20 +388,46 @@ if __name__ == "__main__":
         print("  python generate_audio.py list        - List shots and lines")
         print("  python generate_audio.py voices      - List available ElevenLabs voices")
         print("  python generate_audio.py <shot_key>  - Generate audio for specific shot")
-        print("  python generate_audio.py all         - Generate all audio")
+        print("  python generate_audio.py all [N]     - Generate all audio, N lines at a time")
+        print("  python generate_audio.py all --sequential - Generate all audio one line at a time")
+        print("  python generate_audio.py bench [N]   - Time sequential vs concurrent on a fake TTS server")
         print("\nExample:")
         print("  python generate_audio.py 01_casey_hook")
+        print("\nAdd --no-cache to re-synthesize lines that haven't changed.")
+        print("Add --play to hear a single shot while it downloads (ffplay/mpv/mpg123 or TTS_PLAYER).")
+        print("Streaming metrics go to audio/tts_metrics.jsonl (python stream_writer.py summary <dir>).")
+        print("Add --episode <episode_id> to work on another episode's manifest.")
         print("\nFirst, set your API key:")
         print("  set ELEVENLABS_API_KEY=your_key_here")
         sys.exit(0)
 
+    if "--no-cache" in sys.argv:
+        audio_cache.ENABLED = False
+        sys.argv.remove("--no-cache")
+
+    if "--play" in sys.argv:
+        PLAY = True
+        sys.argv.remove("--play")
+
+    episode_id = None
+    if "--episode" in sys.argv:
+        i = sys.argv.index("--episode")
+        episode_id = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+
     cmd = sys.argv[1]
 
     if cmd == "list":
-        list_shots()
+        list_shots(episode_id)
     elif cmd == "voices":
         list_voices()
     elif cmd == "all":
-        generate_all()
+        if "--sequential" in sys.argv:
+            generate_all(episode_id)
+        else:
+            concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCY
+            generate_all_parallel(concurrency, episode_id)
+    elif cmd == "bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCY)
     else:
-        generate_audio(cmd)
+        generate_audio(cmd, episode_id=episode_id)
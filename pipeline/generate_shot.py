@@ -5,12 +5,26 @@ Generates medium-shot character images optimized for Runway Gen-3/4 animation
 """
 
 import requests
-import base64
 import json
 from pathlib import Path
 from datetime import datetime
 
+import character_registry
+import episode_manifest
+import generation_index
+import model_batching
+import prompt_tokens
+import render_cache
+import tracing
+from webui_client import get_client, print_all_metrics
+
 API_URL = "http://127.0.0.1:7860"
+# WebUI instances to fan out across in `all` mode (add one per GPU)
+API_URLS = [API_URL]
+# Set to False to keep benchmark runs out of logs/*_generations.jsonl
+LOG_GENERATIONS = True
+# Identity-first, de-duplicated prompts that fit fewer CLIP chunks (prompt_tokens.py)
+COMPACT_PROMPTS = False
 BASE_DIR = Path(__file__).resolve().parent.parent
 EPISODES_DIR = BASE_DIR / "episodes"
 
@@ -25,222 +39,188 @@ RUNWAY_SETTINGS = {
     "seed": -1,
 }
 
-# Base style prompt (consistent across all characters)
-STYLE_BASE = "3D animated character, Pixar Disney style, stylized proportions, soft 3D render, smooth skin texture, warm studio lighting, clean solid cream beige background"
-STYLE_QUALITY = "high quality, detailed, professional 3D animation style, Pixar aesthetic, DreamWorks style, soft diffused lighting, clean render"
+NEGATIVE_PROMPT = "photorealistic, hyperrealistic, photograph, real human, anime, 2d, flat, cartoon, sketch, painting, watercolor, blurry, low quality, bad anatomy, extra fingers, mutated hands, poorly drawn face, distorted face, ugly, duplicate, morbid, dark, gritty, horror, scary, nsfw, nude, text, watermark, signature, logo, multiple characters, crowd, full body, legs visible, feet visible"
 
-# Framing for Runway (medium shot)
-RUNWAY_FRAMING = "medium shot, chest up, waist up framing, character centered, face clearly visible, looking at camera"
+# Shots (with framing) come from episodes/<episode_id>/episode.json
+EPISODE_ID = episode_manifest.DEFAULT_EPISODE
 
-NEGATIVE_PROMPT = "photorealistic, hyperrealistic, photograph, real human, anime, 2d, flat, cartoon, sketch, painting, watercolor, blurry, low quality, bad anatomy, extra fingers, mutated hands, poorly drawn face, distorted face, ugly, duplicate, morbid, dark, gritty, horror, scary, nsfw, nude, text, watermark, signature, logo, multiple characters, crowd, full body, legs visible, feet visible"
 
-# Character definitions
-CHARACTERS = {
-    "casey": {
-        "identity": "adult man late 20s, short dark brown hair side-parted, thick expressive dark eyebrows, brown eyes, warm tan skin, slight stubble, friendly approachable face",
-        "outfit": "olive khaki blazer jacket, cream beige button-up collared shirt, dark wristwatch on left wrist",
-    },
-    "rex": {
-        "identity": "adult man early 30s, sharp angular face, short black hair slicked back, piercing dark eyes, pale skin, perpetually unimpressed expression, lean build",
-        "outfit": "all black outfit, black turtleneck sweater, black jacket",
-    },
-    "fizz": {
-        "identity": "young adult, wild spiky orange-yellow hair, bright wide eyes, round energetic face, freckles, mischievous grin, small and wiry build",
-        "outfit": "bright yellow hoodie, orange accents, casual energetic style",
-    },
-    "harper": {
-        "identity": "adult woman mid 20s, soft wavy light brown hair, warm kind eyes, gentle smile, rosy cheeks, soft rounded features",
-        "outfit": "soft pink cozy sweater, delicate necklace, warm and inviting appearance",
-    },
-    "mira": {
-        "identity": "adult woman late 20s, dramatic dark wavy hair, expressive large eyes with bold makeup, theatrical features, elegant bone structure",
-        "outfit": "sheer transparent purple blouse, dramatic accessories, theatrical bohemian style",
-    },
-    "dot": {
-        "identity": "adult woman early 30s, neat short dark hair with bangs, large round glasses, intelligent focused eyes, serious but kind face",
-        "outfit": "smart navy blue cardigan, white collared shirt underneath, professional academic style",
-    },
-    "byte": {
-        "identity": "androgynous young adult, short teal-blue hair with digital gradient effect, slightly robotic smooth features, glowing subtle cyan eyes, friendly but slightly uncanny",
-        "outfit": "tech hoodie with circuit pattern details, minimalist futuristic style, subtle LED accents",
-    },
-}
+def get_shots(episode_id=None):
+    """Image-stage shots for an episode, keyed like "shot01_casey_hook"."""
+    return episode_manifest.image_shots(episode_id or EPISODE_ID)
 
-# Shot-specific prompts for Episode 001
-EPISODE_001_SHOTS = {
-    "shot01_casey_hook": {
-        "character": "casey",
-        "expression": "neutral confident expression, slight friendly smile, looking at camera",
-        "pose": "holding tablet in hands, presenting stance",
-        "action": "about to speak, welcoming",
-    },
-    "shot02_casey_reading": {
-        "character": "casey",
-        "expression": "focused reading expression, looking down slightly, concentrated",
-        "pose": "holding tablet, looking at screen",
-        "action": "reading from tablet",
-    },
-    "shot03_rex_deadpan": {
-        "character": "rex",
-        "expression": "deadpan expression, flat unamused stare, one eyebrow slightly raised",
-        "pose": "arms crossed over chest",
-        "action": "delivering dry commentary",
-    },
-    "shot04_fizz_excited": {
-        "character": "fizz",
-        "expression": "excited expression, wide grin, eyes bright with enthusiasm",
-        "pose": "hands up gesturing, animated stance",
-        "action": "enthusiastically agreeing",
-    },
-    "shot05_harper_wholesome": {
-        "character": "harper",
-        "expression": "warm genuine smile, kind eyes, soft expression",
-        "pose": "hands clasped together near chest",
-        "action": "offering kind suggestion",
-    },
-    "shot06_fizz_mischievous": {
-        "character": "fizz",
-        "expression": "mischievous grin, conspiratorial look, raised eyebrow",
-        "pose": "leaning forward slightly, hands together",
-        "action": "sharing a secret, playful",
-    },
-    "shot07_byte_robotic": {
-        "character": "byte",
-        "expression": "slightly robotic smile, friendly but uncanny, processing look",
-        "pose": "standing straight, slight head tilt",
-        "action": "delivering fact with artificial enthusiasm",
-    },
-    "shot08_mira_theatrical": {
-        "character": "mira",
-        "expression": "dramatic theatrical expression, emotional, eyes glistening",
-        "pose": "one hand on chest, other hand gesturing outward",
-        "action": "dramatic storytelling moment",
-    },
-    "shot09_dot_serious": {
-        "character": "dot",
-        "expression": "matter-of-fact expression, serious but earnest, slight knowing look",
-        "pose": "adjusting glasses with one hand",
-        "action": "delivering obscure fact",
-    },
-    "shot10_casey_outro": {
-        "character": "casey",
-        "expression": "tired deadpan expression, slight exhale, done with this energy",
-        "pose": "holding tablet loosely, shoulders slightly slumped",
-        "action": "wrapping up, looking at camera",
-    },
-}
 
+@tracing.traced("prompt_build")
+def build_prompt(shot_key, episode_id=None):
+    """Build full prompt for a specific shot (memoized in character_registry)."""
+    shot = get_shots(episode_id)[shot_key]
+    args = (shot["character"], shot["framing"], shot["pose"], shot["expression"], shot["action"])
+    if COMPACT_PROMPTS:
+        return prompt_tokens.compact(character_registry.shot_segments(*args))
+    return character_registry.shot_prompt(*args)
 
-def build_prompt(shot_key):
-    """Build full prompt for a specific shot."""
-    shot = EPISODE_001_SHOTS[shot_key]
-    char = CHARACTERS[shot["character"]]
 
-    parts = [
-        STYLE_BASE,
-        RUNWAY_FRAMING,
-        char["identity"],
-        char["outfit"],
-        shot["pose"],
-        shot["expression"],
-        shot["action"],
-        STYLE_QUALITY,
-    ]
+def build_payload(shot_key, seed=-1, episode_id=None):
+    """Build the txt2img payload for a specific shot."""
+    return {
+        **RUNWAY_SETTINGS,
+        "prompt": build_prompt(shot_key, episode_id),
+        "negative_prompt": NEGATIVE_PROMPT,
+        "seed": seed,
+    }
+
+
+def shot_requirement(shot_key, episode_id=None):
+    """(checkpoint, vae, loras) a shot needs; checkpoint None = use whatever is loaded."""
+    shot = get_shots(episode_id)[shot_key]
+    return model_batching.requirement(shot.get("model"), shot.get("vae"), build_prompt(shot_key, episode_id))
+
+
+def ensure_shot_model(shot_key, api_url=None, episode_id=None):
+    """Load the checkpoint/VAE a shot needs (no-op if already loaded)."""
+    model, vae, _ = shot_requirement(shot_key, episode_id)
+    client = get_client(api_url or API_URL)
+    # Re-read first: the model may have been changed from the WebUI tab or another process
+    client.get_current_model(refresh=True)
+    if model and not client.set_model(model, vae):
+        raise RuntimeError(f"Could not load {model}")
+
+
+def log_shot(shot_key, payload, info, saved_files, model=None):
+    """Record a finished shot in logs/{character}_generations.jsonl and the index."""
+    if not LOG_GENERATIONS or not saved_files:
+        return
+    try:
+        seed = json.loads(info or "{}").get("seed", payload.get("seed"))
+    except ValueError:
+        seed = payload.get("seed")
+    generation_index.log({
+        "character": shot_key.split("_")[1] if "_" in shot_key else shot_key,
+        "shot": shot_key,
+        "prompt": payload["prompt"],
+        "settings": {k: v for k, v in payload.items() if k not in ("prompt", "negative_prompt")},
+        "seed": seed,
+        "model": model,
+        "output_files": [str(f) for f in saved_files],
+    })
+
+
+def shot_output_path(output_dir=None, episode_id=None):
+    """Resolve (and create) the directory shots are written to."""
+    if output_dir is None:
+        output_dir = EPISODES_DIR / (episode_id or EPISODE_ID) / "shots"
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    return output_path
+
+
+@tracing.traced()
+def render_shot(shot_key, payload, output_dir=None, api_url=None):
+    """Render a payload, streaming images straight to disk.
+
+    Returns (saved_files, info, cached).
+    """
+    client = get_client(api_url or API_URL)
+    output_path = shot_output_path(output_dir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    make_path = lambda i: output_path / f"{shot_key}_{timestamp}_{i:02d}.png"
+
+    model = client.get_current_model()
+    with tracing.span("render_cache"):
+        cached = render_cache.copy_to(payload, model, make_path)
+    if cached:
+        print("  (cache hit)")
+        saved_files, info = cached
+    else:
+        saved_files, info = client.render_to_files("txt2img", payload, make_path)
+        render_cache.put_files(payload, model, saved_files, info)
+
+    for filepath in saved_files:
+        print(f"  Saved: {filepath.name}")
 
-    return ", ".join(parts)
+    log_shot(shot_key, payload, info, saved_files, model)
+    return saved_files, info, cached is not None
 
 
-def generate_shot(shot_key, output_dir=None):
+@tracing.traced()
+def generate_shot(shot_key, output_dir=None, seed=-1, episode_id=None):
     """Generate images for a specific shot."""
+    shots = get_shots(episode_id)
 
-    if shot_key not in EPISODE_001_SHOTS:
+    if shot_key not in shots:
         print(f"Unknown shot: {shot_key}")
-        print(f"Available shots: {list(EPISODE_001_SHOTS.keys())}")
+        print(f"Available shots: {list(shots.keys())}")
         return None
 
-    shot = EPISODE_001_SHOTS[shot_key]
-    prompt = build_prompt(shot_key)
+    shot = shots[shot_key]
+    payload = build_payload(shot_key, seed, episode_id)
+    output_dir = shot_output_path(output_dir, episode_id)
 
     print(f"\n{'='*60}")
     print(f"Generating: {shot_key}")
     print(f"Character: {shot['character']}")
     print(f"{'='*60}")
-    print(f"\nPrompt preview: {prompt[:100]}...")
-
-    payload = {
-        **RUNWAY_SETTINGS,
-        "prompt": prompt,
-        "negative_prompt": NEGATIVE_PROMPT,
-    }
+    print(f"\nPrompt preview: {payload['prompt'][:100]}...")
 
     print(f"\nSending request to API...")
 
     try:
-        r = requests.post(f"{API_URL}/sdapi/v1/txt2img", json=payload, timeout=600)
-
-        if r.status_code == 200:
-            result = r.json()
-            images = result["images"]
-            info = json.loads(result.get("info", "{}"))
-            seed = info.get("seed", "unknown")
-
-            # Determine output directory
-            if output_dir is None:
-                output_dir = EPISODES_DIR / "001-kevin-identity" / "shots"
-
-            output_path = Path(output_dir)
-            output_path.mkdir(parents=True, exist_ok=True)
-
-            # Save images
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            saved_files = []
+        ensure_shot_model(shot_key, episode_id=episode_id)
+        saved_files, info, _ = render_shot(shot_key, payload, output_dir)
 
-            for i, img_data in enumerate(images):
-                filename = f"{shot_key}_{timestamp}_{i:02d}.png"
-                filepath = output_path / filename
+        info = json.loads(info)
+        seed = info.get("seed", "unknown")
 
-                img_bytes = base64.b64decode(img_data)
-                with open(filepath, 'wb') as f:
-                    f.write(img_bytes)
+        print(f"\nGenerated {len(saved_files)} images")
+        print(f"Seed: {seed}")
+        print(f"Output: {saved_files[0].parent if saved_files else output_dir}")
 
-                saved_files.append(filepath)
-                print(f"  Saved: {filename}")
-
-            print(f"\nGenerated {len(saved_files)} images")
-            print(f"Seed: {seed}")
-            print(f"Output: {output_path}")
-
-            return saved_files
-        else:
-            print(f"Error: {r.status_code}")
-            print(r.text)
-            return None
+        return saved_files
 
     except requests.exceptions.Timeout:
         print("Error: Request timed out (10 min limit)")
         return None
+    except requests.exceptions.HTTPError as e:
+        print(f"Error: {e.response.status_code}")
+        print(e.response.text)
+        return None
     except Exception as e:
         print(f"Error: {e}")
         return None
 
 
-def list_shots():
+def list_shots(episode_id=None):
     """List all available shots."""
-    print("\nAvailable shots for Episode 001:")
+    episode_id = episode_id or EPISODE_ID
+    print(f"\nAvailable shots for {episode_id}:")
     print("-" * 50)
-    for key, shot in EPISODE_001_SHOTS.items():
+    for key, shot in get_shots(episode_id).items():
         print(f"  {key}: {shot['character']} - {shot['expression'][:40]}...")
 
 
-def generate_all():
+def generate_all(api_urls=None, sequential=False, episode_id=None):
     """Generate all shots for the episode."""
+    episode_id = episode_id or EPISODE_ID
     print("\n" + "="*60)
-    print("GENERATING ALL SHOTS FOR EPISODE 001")
+    print(f"GENERATING ALL SHOTS FOR {episode_id.upper()}")
     print("="*60)
 
-    for shot_key in EPISODE_001_SHOTS:
-        generate_shot(shot_key)
-        print("\n")
+    if sequential:
+        for shot_key in get_shots(episode_id):
+            generate_shot(shot_key, episode_id=episode_id)
+            print("\n")
+        return
+
+    from shot_scheduler import ShotScheduler
+
+    scheduler = ShotScheduler(
+        api_urls or API_URLS,
+        build_payload=lambda key: build_payload(key, episode_id=episode_id),
+        requirement=lambda key: shot_requirement(key, episode_id),
+    )
+    scheduler.run(list(get_shots(episode_id)), output_dir=shot_output_path(episode_id=episode_id))
+    scheduler.print_stats()
+    print_all_metrics()
 
 
 if __name__ == "__main__":
@@ -250,16 +230,38 @@ if __name__ == "__main__":
         print("Usage:")
         print("  python generate_shot.py list              - List available shots")
         print("  python generate_shot.py <shot_key>        - Generate specific shot")
+        print("  python generate_shot.py <shot_key> <seed> - Re-render a shot with a pinned seed")
         print("  python generate_shot.py all               - Generate all shots")
+        print("  python generate_shot.py all --sequential  - Generate all shots one at a time")
+        print("  python generate_shot.py all URL [URL ...]  - Fan out across several WebUI instances")
+        print("\nAdd --episode <episode_id> to work on another episode's manifest.")
+        print("\nAdd --no-cache to skip the render cache.")
+        print("Add --compact for identity-first prompts that fit fewer CLIP chunks (see prompt_tokens.py).")
         print("\nExample:")
         print("  python generate_shot.py shot01_casey_hook")
         sys.exit(0)
 
+    if "--no-cache" in sys.argv:
+        render_cache.ENABLED = False
+        sys.argv.remove("--no-cache")
+
+    if "--compact" in sys.argv:
+        COMPACT_PROMPTS = True
+        sys.argv.remove("--compact")
+
+    episode_id = None
+    if "--episode" in sys.argv:
+        i = sys.argv.index("--episode")
+        episode_id = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+
     cmd = sys.argv[1]
 
     if cmd == "list":
-        list_shots()
+        list_shots(episode_id)
     elif cmd == "all":
-        generate_all()
+        urls = [a for a in sys.argv[2:] if not a.startswith("--")]
+        generate_all(urls or None, sequential="--sequential" in sys.argv, episode_id=episode_id)
     else:
-        generate_shot(cmd)
+        seed = int(sys.argv[2]) if len(sys.argv) > 2 else -1
+        generate_shot(cmd, seed=seed, episode_id=episode_id)
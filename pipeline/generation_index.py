@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Generation Index
+SQLite index over logs/*_generations.jsonl so "which seed made that Rex
+shot?" is a query instead of a grep. Entries are indexed as they are logged,
+and the JSONL files are re-synced incrementally (from the last byte read).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+LOG_DIR = PIPELINE_DIR / "logs"
+DB_PATH = LOG_DIR / "generations.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id           INTEGER PRIMARY KEY,
+    entry_hash   TEXT UNIQUE NOT NULL,
+    timestamp    TEXT NOT NULL,
+    character    TEXT,
+    shot         TEXT,
+    seed         INTEGER,
+    model        TEXT,
+    prompt       TEXT,
+    settings     TEXT,
+    output_files TEXT
+);
+CREATE INDEX IF NOT EXISTS gen_character ON generations (character, timestamp);
+CREATE INDEX IF NOT EXISTS gen_shot ON generations (shot, timestamp);
+CREATE INDEX IF NOT EXISTS gen_seed ON generations (seed);
+CREATE INDEX IF NOT EXISTS gen_model ON generations (model, timestamp);
+CREATE INDEX IF NOT EXISTS gen_timestamp ON generations (timestamp);
+
+CREATE TABLE IF NOT EXISTS sources (
+    path   TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+_log_lock = threading.Lock()
+
+
+def connect(db_path=None):
+    """Open the index (created on first use)."""
+    db_path = Path(db_path or DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _row(entry):
+    settings = entry.get("settings") or {}
+    blob = json.dumps(entry, sort_keys=True)
+    seed = entry.get("seed")
+    return (
+        hashlib.sha256(blob.encode("utf-8")).hexdigest(),
+        entry.get("timestamp", ""),
+        entry.get("character"),
+        entry.get("shot"),
+        int(seed) if isinstance(seed, (int, str)) and str(seed).lstrip("-").isdigit() else None,
+        entry.get("model") or settings.get("model"),
+        entry.get("prompt"),
+        json.dumps(settings),
+        json.dumps(entry.get("output_files", [])),
+    )
+
+
+def add(conn, entries):
+    """Index log entries (duplicates are ignored). Returns the number added."""
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO generations "
+        "(entry_hash, timestamp, character, shot, seed, model, prompt, settings, output_files) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (_row(entry) for entry in entries),
+    )
+    conn.commit()
+    return conn.total_changes - before
+
+
+def log(entry, log_dir=None):
+    """Append an entry to logs/{character}_generations.jsonl and index it."""
+    log_dir = Path(log_dir or LOG_DIR)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    entry.setdefault("timestamp", datetime.now().isoformat())
+
+    log_file = log_dir / f"{entry['character']}_generations.jsonl"
+    with _log_lock:
+        with open(log_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    try:
+        conn = connect(log_dir / DB_PATH.name)
+        add(conn, [entry])
+        conn.close()
+    except sqlite3.Error as e:
+        # The JSONL line is the source of truth; the next sync picks it up
+        print(f"Warning: could not index generation ({e})")
+
+
+def sync(conn, log_dir=None, full=False):
+    """Index lines appended to the JSONL logs since the last sync.
+
+    full=True re-reads every file from the start (bulk import).
+    Returns the number of new entries.
+    """
+    log_dir = Path(log_dir or LOG_DIR)
+    added = 0
+    for path in sorted(log_dir.glob("*_generations.jsonl")):
+        row = conn.execute("SELECT offset FROM sources WHERE path = ?", (str(path),)).fetchone()
+        offset = 0 if full or row is None else row["offset"]
+        size = path.stat().st_size
+        if offset > size:  # file was truncated/rewritten
+            offset = 0
+        if offset == size:
+            continue
+
+        entries = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line still being written
+                offset += len(line)
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        added += add(conn, entries)
+        conn.execute("INSERT OR REPLACE INTO sources (path, offset) VALUES (?, ?)", (str(path), offset))
+        conn.commit()
+    return added
+
+
+def query(conn, character=None, shot=None, seed=None, prompt=None, model=None,
+          since=None, until=None, limit=50):
+    """Find generations matching every given filter, newest first.
+
+    prompt and model match substrings; since/until are ISO dates (inclusive).
+    """
+    clauses, params = [], []
+    if character:
+        clauses.append("character = ?")
+        params.append(character)
+    if shot:
+        clauses.append("shot = ?")
+        params.append(shot)
+    if seed is not None:
+        clauses.append("seed = ?")
+        params.append(int(seed))
+    if prompt:
+        clauses.append("instr(lower(prompt), lower(?)) > 0")
+        params.append(prompt)
+    if model:
+        clauses.append("instr(lower(model), lower(?)) > 0")
+        params.append(model)
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        clauses.append("timestamp < date(?, '+1 day')")
+        params.append(until)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"SELECT * FROM generations {where} ORDER BY timestamp DESC LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+    return [dict(r, settings=json.loads(r["settings"]), output_files=json.loads(r["output_files"])) for r in rows]
+
+
+def print_rows(rows):
+    if not rows:
+        print("No matching generations")
+        return
+    for r in rows:
+        files = r["output_files"]
+        first = Path(files[0]).name if files else ""
+        print(f"{r['timestamp'][:19]}  {r['character'] or '':<8} {r['shot'] or '':<24} "
+              f"seed={r['seed']!s:<11} {r['model'] or ''}")
+        print(f"    {len(files)} files, e.g. {first}")
+
+
+def benchmark(entries=20000):
+    """Time bulk import and typical queries on synthetic logs."""
+    import random
+    import tempfile
+    import time
+
+    characters = ["casey", "rex", "fizz", "harper", "mira", "dot", "byte"]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        files = {c: open(tmp / f"{c}_generations.jsonl", "w") for c in characters}
+        for i in range(entries):
+            c = rng.choice(characters)
+            files[c].write(json.dumps({
+                "timestamp": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:{i % 60:02d}",
+                "character": c,
+                "shot": f"shot{rng.randint(1, 10):02d}_{c}",
+                "prompt": f"3D animated character, {c}, pose {rng.randint(0, 99)}",
+                "settings": {"model": rng.choice(["juggernautXL", "sd_xl_base"]), "steps": 20},
+                "seed": rng.randint(0, 2**32 - 1),
+                "output_files": [f"{c}_{i}_00.png"],
+            }) + "\n")
+        for f in files.values():
+            f.close()
+
+        conn = connect(tmp / "generations.db")
+        start = time.perf_counter()
+        sync(conn, tmp)
+        print(f"Imported {entries} entries in {time.perf_counter() - start:.2f}s")
+
+        seed = conn.execute("SELECT seed FROM generations LIMIT 1 OFFSET ?", (entries // 2,)).fetchone()[0]
+        for label, kwargs in [
+            ("by character", {"character": "rex"}),
+            ("by shot", {"shot": "shot03_rex"}),
+            ("by seed", {"seed": seed}),
+            ("prompt substring", {"prompt": "pose 42"}),
+            ("model + date range", {"model": "jugger", "since": "2025-03-01", "until": "2025-03-31"}),
+        ]:
+            start = time.perf_counter()
+            rows = query(conn, **kwargs)
+            print(f"  {label:<20} {len(rows):>3} rows in {(time.perf_counter() - start) * 1000:6.2f} ms")
+
+        start = time.perf_counter()
+        sync(conn, tmp)
+        print(f"  no-op resync          in {(time.perf_counter() - start) * 1000:6.2f} ms")
+        conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python generation_index.py import                  - Bulk (re)import logs/*_generations.jsonl")
+        print("  python generation_index.py find [filters]          - Query generations")
+        print("  python generation_index.py seed <seed>             - Which generation used a seed")
+        print("  python generation_index.py bench [entries]         - Benchmark import/queries on synthetic logs")
+        print("\nFilters:")
+        print("  --character rex  --shot shot03_rex_deadpan  --seed 123  --prompt \"smirk\"")
+        print("  --model juggernaut  --since 2025-11-01  --until 2025-11-30  --limit 50")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+        sys.exit(0)
+
+    conn = connect()
+    if cmd == "import":
+        print(f"Indexed {sync(conn, full=True)} new entries into {DB_PATH}")
+    elif cmd == "find":
+        filters = {}
+        args = sys.argv[2:]
+        for flag, value in zip(args[::2], args[1::2]):
+            filters[flag.lstrip("-")] = value
+        limit = int(filters.pop("limit", 50))
+        sync(conn)
+        print_rows(query(conn, limit=limit, **filters))
+    elif cmd == "seed":
+        sync(conn)
+        print_rows(query(conn, seed=sys.argv[2]))
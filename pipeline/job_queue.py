@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Job Queue
+Durable SQLite queue of render and TTS jobs across episodes. Workers claim a
+job, run it, and checkpoint its outputs; a job left 'running' by a crashed or
+interrupted worker is reclaimed, so a batch resumes exactly where it stopped.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import episode_manifest
+import model_batching
+from webui_client import get_client
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+DB_PATH = PIPELINE_DIR / "jobs.db"
+
+KINDS = ("render", "tts")
+MAX_ATTEMPTS = 3
+LEASE_SECONDS = 900     # longer than the 600s txt2img timeout
+HEARTBEAT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    episode_id  TEXT NOT NULL,
+    shot_key    TEXT NOT NULL,
+    model       TEXT,
+    vae         TEXT,
+    loras       TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    heartbeat   REAL,
+    outputs     TEXT,
+    error       TEXT,
+    created_at  TEXT NOT NULL,
+    finished_at TEXT,
+    UNIQUE (kind, episode_id, shot_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, kind);
+"""
+
+
+def connect(db_path=None):
+    """Open the queue database (one connection per thread)."""
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+
+def _migrate(conn):
+    """Add columns introduced after a queue file was created."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in ("model", "vae", "loras"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # A killed worker can linger as a zombie until its parent reaps it
+    stat = Path(f"/proc/{pid}/stat")
+    if stat.exists():
+        return stat.read_text().rsplit(")", 1)[-1].split()[0] != "Z"
+    return True
+
+
+# =============================================================================
+# QUEUE OPERATIONS
+# =============================================================================
+
+def enqueue(conn, kind, episode_id, shot_key, requirement=(None, None, ())):
+    """Add a job unless it already exists. Returns True if it was added.
+
+    requirement is the (checkpoint, vae, loras) a render job needs.
+    """
+    model, vae, loras = requirement
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO jobs (kind, episode_id, shot_key, model, vae, loras, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (kind, episode_id, shot_key, model, vae, ",".join(loras), datetime.now().isoformat()),
+    )
+    return cur.rowcount == 1
+
+
+def enqueue_episode(conn, episode_id, kinds=KINDS):
+    """Queue every shot of an episode for the given job kinds."""
+    added = 0
+    if "render" in kinds:
+        import generate_shot
+        for shot_key in episode_manifest.image_shots(episode_id):
+            requirement = generate_shot.shot_requirement(shot_key, episode_id)
+            added += enqueue(conn, "render", episode_id, shot_key, requirement)
+    if "tts" in kinds:
+        for shot_key in episode_manifest.audio_script(episode_id):
+            added += enqueue(conn, "tts", episode_id, shot_key)
+    return added
+
+
+def requeue_abandoned(conn):
+    """Return 'running' jobs whose worker died (or lease expired) to 'pending'."""
+    host = socket.gethostname()
+    now = time.time()
+    requeued = 0
+    rows = conn.execute("SELECT id, worker, heartbeat FROM jobs WHERE status = 'running'").fetchall()
+    for row in rows:
+        worker_host, pid, _ = (row["worker"] or "::").split(":", 2)
+        dead = worker_host == host and pid.isdigit() and not _pid_alive(int(pid))
+        expired = row["heartbeat"] is None or now - row["heartbeat"] > LEASE_SECONDS
+        if dead or expired:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL WHERE id = ? AND status = 'running' AND worker IS ?",
+                (row["id"], row["worker"]),
+            )
+            requeued += cur.rowcount
+    return requeued
+
+
+def claim(conn, worker, kinds=KINDS, loaded=(None, None)):
+    """Atomically claim the next pending job of the given kinds, or None.
+
+    Jobs needing no checkpoint or the loaded (checkpoint, vae) come first, then
+    jobs grouped by checkpoint/VAE/LoRA set, so a worker drains one checkpoint
+    before loading the next.
+    """
+    marks = ",".join("?" * len(kinds))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            f"SELECT * FROM jobs WHERE status = 'pending' AND kind IN ({marks}) "
+            "ORDER BY (model IS NULL OR (model = ? AND (vae IS NULL OR vae IS ?))) DESC, "
+            "model, vae, loras, id LIMIT 1",
+            (*kinds, *loaded),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ?",
+            (worker, time.time(), row["id"]),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return dict(row, attempts=row["attempts"] + 1)
+
+
+def heartbeat(conn, job_id, worker):
+    conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?", (time.time(), job_id, worker))
+
+
+def complete(conn, job_id, outputs):
+    """Checkpoint a finished job and its output files."""
+    conn.execute(
+        "UPDATE jobs SET status = 'done', outputs = ?, error = NULL, worker = NULL, finished_at = ? WHERE id = ?",
+        (json.dumps([str(p) for p in outputs]), datetime.now().isoformat(), job_id),
+    )
+
+
+def fail(conn, job, error):
+    """Record a failure; the job is retried until MAX_ATTEMPTS."""
+    status = "failed" if job["attempts"] >= MAX_ATTEMPTS else "pending"
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, worker = NULL WHERE id = ?",
+        (status, str(error)[:500], job["id"]),
+    )
+    return status
+
+
+def release(conn, job_id):
+    """Put an interrupted job back without counting the attempt."""
+    conn.execute(
+        "UPDATE jobs SET status = 'pending', worker = NULL, attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = 'running'",
+        (job_id,),
+    )
+
+
+def retry_failed(conn):
+    cur = conn.execute("UPDATE jobs SET status = 'pending', attempts = 0 WHERE status = 'failed'")
+    return cur.rowcount
+
+
+def counts(conn):
+    """{(episode_id, kind): {status: n}}"""
+    summary = {}
+    for row in conn.execute("SELECT episode_id, kind, status, COUNT(*) AS n FROM jobs GROUP BY 1, 2, 3"):
+        summary.setdefault((row["episode_id"], row["kind"]), {})[row["status"]] = row["n"]
+    return summary
+
+
+# =============================================================================
+# JOB RUNNERS
+# =============================================================================
+
+def run_render(job, api_url=None):
+    """Render one shot. Returns the saved image paths.
+
+    Workers share one client per URL; using_model() keeps another worker from
+    switching the checkpoint between this job's switch and its render.
+    """
+    import generate_shot
+    client = get_client(api_url or generate_shot.API_URL)
+    payload = generate_shot.build_payload(job["shot_key"], episode_id=job["episode_id"])
+    output_dir = generate_shot.shot_output_path(episode_id=job["episode_id"])
+    with client.using_model(job["model"], job["vae"]):
+        saved, _, _ = generate_shot.render_shot(job["shot_key"], payload, output_dir, api_url)
+    if not saved:
+        raise RuntimeError("WebUI returned no images")
+    return saved
+
+
+def run_tts(job, api_url=None):
+    """Synthesize one line. Returns [audio path]."""
+    import generate_audio
+    path = generate_audio.generate_audio(job["shot_key"], episode_id=job["episode_id"])
+    if path is None:
+        raise RuntimeError("audio generation failed")
+    return [path]
+
+
+RUNNERS = {"render": run_render, "tts": run_tts}
+
+
+def _keep_alive(db_path, job_id, worker, stop):
+    conn = connect(db_path)
+    while not stop.wait(HEARTBEAT_SECONDS):
+        heartbeat(conn, job_id, worker)
+    conn.close()
+
+
+def work(kinds=KINDS, api_url=None, db_path=None, stop=None):
+    """Claim and run jobs until the queue is empty (or stop is set).
+
+    Ctrl-C puts the current job back to 'pending' before exiting.
+    Returns (done, failed).
+    """
+    import generate_shot
+    conn = connect(db_path)
+    worker = worker_name()
+    client = get_client(api_url or generate_shot.API_URL) if "render" in kinds else None
+    done = failed = 0
+    switches_before = client.switches if client else 0
+    if client:
+        client.get_current_model(refresh=True)
+    initial = client.loaded_model() if client else (None, None)
+    rendered = []
+
+    while stop is None or not stop.is_set():
+        loaded = client.loaded_model() if client else (None, None)
+        job = claim(conn, worker, kinds, loaded)
+        if job is None:
+            break
+        if job["kind"] == "render":
+            rendered.append(job)
+
+        print(f"[{job['kind']}] {job['episode_id']}/{job['shot_key']} (attempt {job['attempts']})")
+        beat_stop = threading.Event()
+        beat = threading.Thread(target=_keep_alive, args=(db_path, job["id"], worker, beat_stop), daemon=True)
+        beat.start()
+        try:
+            outputs = RUNNERS[job["kind"]](job, api_url)
+            complete(conn, job["id"], outputs)
+            done += 1
+        except KeyboardInterrupt:
+            release(conn, job["id"])
+            print(f"\nInterrupted - {job['shot_key']} returned to the queue")
+            raise
+        except Exception as e:
+            status = fail(conn, job, e)
+            failed += status == "failed"
+            print(f"  Error: {e} ({'giving up' if status == 'failed' else 'will retry'})")
+        finally:
+            beat_stop.set()
+
+    conn.close()
+    if client and any(job["model"] for job in rendered):
+        # Compare against claiming the same jobs in queue (id) order
+        reqs = [(job["model"], job["vae"], ()) for job in sorted(rendered, key=lambda j: j["id"])]
+        model_batching.print_report(client.switches - switches_before, model_batching.count_switches(reqs, initial))
+    return done, failed
+
+
+def work_parallel(workers, kinds=KINDS, api_url=None, db_path=None):
+    """Run several worker threads against the queue."""
+    stop = threading.Event()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(work(kinds, api_url, db_path, stop)), daemon=True)
+        for _ in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        # Let in-flight jobs finish, then stop claiming
+        print("\nStopping after in-flight jobs finish (Ctrl-C again to abort)...")
+        stop.set()
+        for t in threads:
+            t.join()
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def print_status(conn):
+    summary = counts(conn)
+    if not summary:
+        print("Queue is empty")
+        return
+    print(f"\n{'episode':<24} {'kind':<7} {'pending':>7} {'running':>7} {'done':>5} {'failed':>6}")
+    for (episode_id, kind), c in sorted(summary.items()):
+        print(f"{episode_id:<24} {kind:<7} {c.get('pending', 0):>7} {c.get('running', 0):>7} "
+              f"{c.get('done', 0):>5} {c.get('failed', 0):>6}")
+    for row in conn.execute("SELECT episode_id, kind, shot_key, error FROM jobs WHERE status = 'failed'"):
+        print(f"  FAILED {row['kind']} {row['episode_id']}/{row['shot_key']}: {row['error']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python job_queue.py add <episode> [episode...]   - Queue render + TTS jobs for episodes")
+        print("  python job_queue.py add all                      - Queue every episode with a manifest")
+        print("  python job_queue.py work [N]                     - Run N workers (default 1) until the queue drains")
+        print("  python job_queue.py status                       - Show progress per episode")
+        print("  python job_queue.py retry                        - Re-queue failed jobs")
+        print("  python job_queue.py clear                        - Delete the queue")
+        print("\nOptions:")
+        print("  --kind render|tts    Only queue/run one kind of job")
+        print("  --url <webui_url>    WebUI for render jobs (default: generate_shot.API_URL)")
+        sys.exit(0)
+
+    def take(flag):
+        if flag in sys.argv:
+            i = sys.argv.index(flag)
+            value = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+            return value
+        return None
+
+    kind = take("--kind")
+    kinds = (kind,) if kind else KINDS
+    api_url = take("--url")
+    cmd = sys.argv[1]
+
+    if cmd == "clear":
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+        print("Queue cleared")
+        sys.exit(0)
+
+    conn = connect()
+
+    if cmd == "add":
+        episodes = sys.argv[2:]
+        if episodes == ["all"]:
+            episodes = episode_manifest.list_episodes()
+        for episode_id in episodes:
+            added = enqueue_episode(conn, episode_id, kinds)
+            print(f"  {episode_id}: {added} new jobs")
+    elif cmd == "work":
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        requeued = requeue_abandoned(conn)
+        if requeued:
+            print(f"Resuming {requeued} jobs left running by a stopped worker")
+        try:
+            if workers > 1:
+                done, failed = work_parallel(workers, kinds, api_url)
+            else:
+                done, failed = work(kinds, api_url)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print(f"\nDone: {done}, failed: {failed}")
+        print_status(conn)
+    elif cmd == "status":
+        print_status(conn)
+    elif cmd == "retry":
+        print(f"Re-queued {retry_failed(conn)} failed jobs")
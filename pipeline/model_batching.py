@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Model-Aware Batching
+Groups render jobs by the checkpoint, VAE and LoRA set they need so each
+checkpoint is loaded once per run instead of once per switch in job order.
+"""
+
+import re
+
+LORA_TAG = re.compile(r"<lora:([^:>]+)")
+
+
+def lora_set(prompt):
+    """Sorted LoRA names referenced by <lora:name:weight> tags in a prompt."""
+    return tuple(sorted(set(LORA_TAG.findall(prompt or ""))))
+
+
+def requirement(model=None, vae=None, prompt=""):
+    """What a job needs loaded: (checkpoint, vae, loras). None = whatever is loaded."""
+    return (model, vae, lora_set(prompt))
+
+
+def needs_switch(req, loaded):
+    """True if running req on a WebUI with `loaded` = (checkpoint, vae) needs an /options call."""
+    model, vae, _ = req
+    if model is None:
+        return False
+    return (model, vae or loaded[1]) != tuple(loaded)
+
+
+def count_switches(reqs, loaded=(None, None)):
+    """Number of checkpoint/VAE loads needed to run reqs in the given order."""
+    current = tuple(loaded)
+    switches = 0
+    for req in reqs:
+        if needs_switch(req, current):
+            switches += 1
+            current = (req[0], req[1] or current[1])
+    return switches
+
+
+def group_jobs(jobs, req_of, loaded=(None, None)):
+    """Stable-reorder jobs so each requirement's jobs run back to back.
+
+    Jobs that run on the already-loaded checkpoint (or don't care) go first,
+    then the remaining groups in order of first appearance.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault(req_of(job), []).append(job)
+
+    def rank(item):
+        req, _ = item
+        return 0 if not needs_switch(req, loaded) else 1
+
+    ordered = sorted(groups.items(), key=rank)  # sort is stable
+    return [job for _, group in ordered for job in group]
+
+
+def assign_groups(jobs, req_of, endpoints, loaded=None):
+    """Split jobs across endpoints, keeping each requirement's group on one endpoint.
+
+    loaded maps endpoint -> (checkpoint, vae). Largest groups are placed first,
+    on an endpoint that already has that checkpoint if possible, otherwise on
+    the least-loaded endpoint. Returns {endpoint: [jobs]} (each list grouped).
+    """
+    loaded = loaded or {}
+    groups = {}
+    for job in jobs:
+        groups.setdefault(req_of(job), []).append(job)
+
+    plan = {url: [] for url in endpoints}
+    for req, group in sorted(groups.items(), key=lambda item: -len(item[1])):
+        warm = [url for url in endpoints if not needs_switch(req, loaded.get(url, (None, None)))]
+        url = min(warm or endpoints, key=lambda u: len(plan[u]))
+        plan[url].extend(group)
+    return {url: group_jobs(plan[url], req_of, loaded.get(url, (None, None))) for url in endpoints}
+
+
+def print_report(actual, ungrouped):
+    """Print checkpoint loads done vs. what job order alone would have cost."""
+    saved = max(0, ungrouped - actual)
+    print(f"\nModel switches: {actual} (ungrouped order would need {ungrouped}, saved {saved})")
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Prompt Token Budget
+Counts CLIP tokens per prompt the way the WebUI does (75-token chunks, break
+at a recent comma), flags tags repeated across prompt segments, and builds a
+compacted prompt with the identity tags first so they land in chunk 1.
+
+Exact counts need the CLIP BPE merges: bpe_simple_vocab_16e6.txt.gz (from
+openai/CLIP) or merges.txt (from openai/clip-vit-large-patch14), found via
+$CLIP_BPE_PATH, pipeline/cache/ or the Hugging Face cache. Without one,
+counts are a word-length estimate.
+"""
+
+import gzip
+import html
+import os
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import regex
+except ImportError:  # letter/number classes approximated with re
+    regex = None
+
+import character_registry
+import episode_manifest
+
+CHUNK_TOKENS = 75           # 77 minus start/end tokens
+COMMA_BACKTRACK = 20        # WebUI default: move the tail after a comma this close to the end
+COMMA = ",</w>"
+VOCAB_NAMES = ("bpe_simple_vocab_16e6.txt.gz", "merges.txt")
+CACHE_DIR = Path(__file__).resolve().parent / "cache"
+HF_CLIP = Path.home() / ".cache" / "huggingface" / "hub" / "models--openai--clip-vit-large-patch14"
+
+# Segment order for compaction: who the character is comes first
+COMPACT_ORDER = ("identity", "outfit", "expression", "pose", "action", "framing", "style", "quality")
+TRIMMABLE = ("quality",)    # tags that may be dropped to save a whole chunk
+STYLE_SEGMENTS = ("style", "quality")  # style tags that mostly restate an earlier one are dropped
+STOPWORDS = {"a", "an", "and", "the", "of", "with", "in", "on", "at", "to", "but"}
+
+if regex:
+    PATTERN = regex.compile(r"""'s|'t|'re|'ve|'m|'ll|'d|[\p{L}]+|[\p{N}]|[^\s\p{L}\p{N}]+""", regex.IGNORECASE)
+else:
+    PATTERN = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d|[^\W\d_]+|\d|(?:[^\s\w]|_)+""", re.IGNORECASE)
+
+LORA_TAG = re.compile(r"<(?:lora|lyco|hypernet):[^>]+>")
+WEIGHT = re.compile(r":\s*-?[\d.]+\s*(?=[)\]])")
+
+
+# =============================================================================
+# TOKENIZER
+# =============================================================================
+
+def find_vocab():
+    """Path to a CLIP merges file, or None."""
+    candidates = [os.environ.get("CLIP_BPE_PATH")]
+    candidates += [CACHE_DIR / name for name in VOCAB_NAMES]
+    candidates += sorted(HF_CLIP.glob("snapshots/*/merges.txt"))
+    for path in candidates:
+        if path and Path(path).is_file():
+            return Path(path)
+    return None
+
+
+def _bytes_to_unicode():
+    """CLIP's reversible byte -> printable unicode table."""
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + n)
+            n += 1
+    return dict(zip(bs, map(chr, cs)))
+
+
+BYTE_ENCODER = _bytes_to_unicode()
+
+
+@lru_cache(maxsize=None)
+def _merge_ranks(path):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    # First line is a version header; CLIP uses the first 49152-256-2 merges
+    merges = [tuple(line.split()) for line in lines[1:49152 - 256 - 2 + 1] if line.strip()]
+    return {pair: i for i, pair in enumerate(merges)}
+
+
+@lru_cache(maxsize=65536)
+def _bpe(word, path):
+    ranks = _merge_ranks(path)
+    parts = tuple(word[:-1]) + (word[-1] + "</w>",)
+    while len(parts) > 1:
+        pairs = {(parts[i], parts[i + 1]) for i in range(len(parts) - 1)}
+        best = min(pairs, key=lambda p: ranks.get(p, float("inf")))
+        if best not in ranks:
+            break
+        merged, i = [], 0
+        while i < len(parts):
+            if i < len(parts) - 1 and (parts[i], parts[i + 1]) == best:
+                merged.append(parts[i] + parts[i + 1])
+                i += 2
+            else:
+                merged.append(parts[i])
+                i += 1
+        parts = tuple(merged)
+    return parts
+
+
+def _estimate(word):
+    """Token estimate without the vocabulary: common words are one token, long ones split."""
+    if not word[0].isalpha():
+        return (word + "</w>",)
+    pieces = max(1, (len(word) - 3) // 5 + 1) if len(word) > 8 else 1
+    return tuple(f"{word}#{i}" for i in range(pieces - 1)) + (word + "</w>",)
+
+
+def clean(text):
+    """Strip WebUI syntax that is not sent to CLIP: LoRA tags, emphasis brackets, weights."""
+    text = LORA_TAG.sub("", text)
+    text = WEIGHT.sub("", text)
+    text = re.sub(r"[()\[\]]", " ", text)
+    text = html.unescape(text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def tokenize(text, vocab=None):
+    """CLIP BPE tokens for text (estimated pieces when no vocabulary is available)."""
+    vocab = vocab if vocab is not None else find_vocab()
+    tokens = []
+    for word in PATTERN.findall(clean(text)):
+        if vocab:
+            encoded = "".join(BYTE_ENCODER[b] for b in word.encode("utf-8"))
+            tokens.extend(_bpe(encoded, str(vocab)))
+        else:
+            tokens.extend(_estimate(word))
+    return tokens
+
+
+def chunk(tokens):
+    """Split tokens into the WebUI's 75-token chunks.
+
+    When a chunk fills up and a comma sits within the last COMMA_BACKTRACK
+    tokens, everything after that comma moves to the next chunk.
+    """
+    chunks, current, last_comma = [], [], -1
+    for token in tokens:
+        if token == COMMA:
+            last_comma = len(current)
+        elif len(current) == CHUNK_TOKENS and last_comma != -1 and len(current) - last_comma <= COMMA_BACKTRACK:
+            split = last_comma + 1
+            chunks.append(current[:split])
+            current, last_comma = current[split:], -1
+        if len(current) == CHUNK_TOKENS:
+            chunks.append(current)
+            current, last_comma = [], -1
+        current.append(token)
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_count(text, vocab=None):
+    """Chunks the WebUI encodes for a prompt ("BREAK" forces a new chunk)."""
+    return sum(len(chunk(tokenize(part, vocab))) for part in re.split(r"\bBREAK\b", text))
+
+
+# =============================================================================
+# ANALYSIS
+# =============================================================================
+
+def split_tags(text):
+    return [t.strip() for t in text.split(",") if t.strip()]
+
+
+def _words(tag):
+    return set(re.findall(r"[a-z0-9]+", tag.lower())) - STOPWORDS
+
+
+def _repeats(words, label, earlier_words):
+    if not words:
+        return False
+    if words <= earlier_words:
+        return True
+    # Style tags restating half their words ("Pixar aesthetic" after "Pixar Disney style")
+    return label in STYLE_SEGMENTS and len(words & earlier_words) * 2 >= len(words)
+
+
+def duplicates(segments):
+    """Tags that repeat an earlier tag: [(tag, segment, earlier_tag, earlier_segment)].
+
+    A tag is repeated if all of its words already appear in one earlier tag
+    ("kind eyes" after "warm kind eyes"). In style/quality segments, sharing
+    half its words is enough.
+    """
+    seen, found = [], []
+    for label, text in segments:
+        for tag in split_tags(text):
+            words = _words(tag)
+            for earlier, earlier_label, earlier_words in seen:
+                if _repeats(words, label, earlier_words):
+                    found.append((tag, label, earlier, earlier_label))
+                    break
+            else:
+                seen.append((tag, label, words))
+    return found
+
+
+def compact(segments, vocab=None):
+    """Compacted prompt: identity first, repeated tags dropped, and quality tags
+    trimmed from the end only when that saves a whole chunk."""
+    order = {label: i for i, label in enumerate(COMPACT_ORDER)}
+    ordered = sorted(segments, key=lambda s: order.get(s[0], len(order)))
+    repeated = {(tag, label) for tag, label, _, _ in duplicates(ordered)}
+
+    kept = [(label, tag) for label, text in ordered for tag in split_tags(text) if (tag, label) not in repeated]
+    prompt = ", ".join(tag for _, tag in kept)
+    chunks = chunk_count(prompt, vocab)
+
+    trimmable = [i for i, (label, _) in enumerate(kept) if label in TRIMMABLE]
+    for k in range(1, len(trimmable) + 1):
+        drop = set(trimmable[-k:])
+        trimmed = ", ".join(tag for i, (_, tag) in enumerate(kept) if i not in drop)
+        if chunk_count(trimmed, vocab) < chunks:
+            return trimmed
+    return prompt
+
+
+def identity_in_first_chunk(prompt, identity, vocab=None):
+    """True if every identity tag ends inside chunk 1."""
+    first = len(chunk(tokenize(prompt, vocab))[0])
+    for tag in split_tags(identity):
+        pos = prompt.find(tag)
+        if pos == -1 or len(tokenize(prompt[:pos + len(tag)], vocab)) > first:
+            return False
+    return True
+
+
+def analyze_shot(shot_key, episode_id=None, vocab=None):
+    shot = episode_manifest.image_shots(episode_id or episode_manifest.DEFAULT_EPISODE)[shot_key]
+    segments = character_registry.shot_segments(
+        shot["character"], shot["framing"], shot["pose"], shot["expression"], shot["action"]
+    )
+    original = ", ".join(text for _, text in segments)
+    compacted = compact(segments, vocab)
+    identity = dict(segments)["identity"]
+    return {
+        "shot": shot_key,
+        "tokens": len(tokenize(original, vocab)),
+        "chunks": chunk_count(original, vocab),
+        "identity_first": identity_in_first_chunk(original, identity, vocab),
+        "compact_tokens": len(tokenize(compacted, vocab)),
+        "compact_chunks": chunk_count(compacted, vocab),
+        "compact_identity_first": identity_in_first_chunk(compacted, identity, vocab),
+        "duplicates": duplicates(segments),
+        "compacted": compacted,
+    }
+
+
+def report(episode_id=None, verbose=False):
+    """Per-shot token and chunk counts before/after compaction."""
+    episode_id = episode_id or episode_manifest.DEFAULT_EPISODE
+    vocab = find_vocab()
+    print(f"\nTokenizer: {'CLIP BPE (' + vocab.name + ')' if vocab else 'estimate (no CLIP vocab found)'}")
+    print(f"{'shot':<28} {'tokens':>6} {'chunks':>6} {'id@1':>5}   {'tokens':>6} {'chunks':>6} {'id@1':>5}")
+    print(f"{'':<28} {'--- as built ---':>19}   {'--- compacted ---':>19}")
+
+    start = time.perf_counter()
+    rows = [analyze_shot(key, episode_id, vocab) for key in episode_manifest.image_shots(episode_id)]
+    elapsed = time.perf_counter() - start
+
+    yes = {True: "yes", False: "NO"}
+    for r in rows:
+        print(f"{r['shot']:<28} {r['tokens']:>6} {r['chunks']:>6} {yes[r['identity_first']]:>5}   "
+              f"{r['compact_tokens']:>6} {r['compact_chunks']:>6} {yes[r['compact_identity_first']]:>5}")
+        if verbose:
+            for tag, label, earlier, earlier_label in r["duplicates"]:
+                print(f"    repeated: '{tag}' ({label}) ~ '{earlier}' ({earlier_label})")
+            print(f"    -> {r['compacted']}")
+
+    before = sum(r["chunks"] for r in rows)
+    after = sum(r["compact_chunks"] for r in rows)
+    print(f"\nTotal chunks: {before} -> {after} across {len(rows)} shots (analyzed in {elapsed * 1000:.0f} ms)")
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python prompt_tokens.py report [episode] [-v]   - Chunk counts per shot, before/after compaction")
+        print("  python prompt_tokens.py shot <shot_key>         - Repeated tags and compacted prompt for one shot")
+        print("  python prompt_tokens.py count \"<prompt>\"        - Tokens and chunks for any prompt")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+    args = [a for a in sys.argv[2:] if not a.startswith("-")]
+
+    if cmd == "report":
+        report(args[0] if args else None, verbose="-v" in sys.argv)
+    elif cmd == "shot":
+        r = analyze_shot(args[0])
+        print(f"{r['shot']}: {r['tokens']} tokens / {r['chunks']} chunks -> "
+              f"{r['compact_tokens']} tokens / {r['compact_chunks']} chunks")
+        for tag, label, earlier, earlier_label in r["duplicates"]:
+            print(f"  repeated: '{tag}' ({label}) ~ '{earlier}' ({earlier_label})")
+        print(f"\n{r['compacted']}")
+    elif cmd == "count":
+        text = " ".join(args)
+        tokens = tokenize(re.sub(r"\bBREAK\b", " ", text))
+        print(f"{len(tokens)} tokens, {chunk_count(text)} chunks")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Render Cache
+Content-addressed cache for txt2img/img2img results. The key is a hash of the
+canonicalized payload plus the loaded model checkpoint, so rerunning the same
+prompt + settings + seed returns the stored PNGs without touching the GPU.
+The index is SQLite, so several processes (job_queue workers, one
+generate_shot.py per GPU) can share the cache without losing entries.
+"""
+
+import base64
+import hashlib
+import json
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = PIPELINE_DIR / "cache" / "renders"
+DB_NAME = "index.db"
+LEGACY_INDEX = "index.json"  # imported once into the SQLite index
+MAX_BYTES = 2 * 1024**3  # 2 GB
+
+# Set to False (e.g. via --no-cache) to always render
+ENABLED = True
+
+# Payload fields that don't change the pixels
+IGNORED_FIELDS = {"send_images", "save_images", "do_not_save_samples", "do_not_save_grid"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    key       TEXT PRIMARY KEY,
+    files     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    info      TEXT,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used);
+"""
+
+
+def payload_key(payload, model):
+    """Hash the canonicalized payload and model checkpoint."""
+    canonical = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    canonical["sd_model_checkpoint"] = model
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def connect():
+    """Open the cache index (created on first use, importing a legacy index.json)."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(CACHE_DIR / DB_NAME, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    legacy = CACHE_DIR / LEGACY_INDEX
+    if legacy.exists():
+        try:
+            with open(legacy) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        conn.executemany(
+            "INSERT OR IGNORE INTO renders (key, files, size, info, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(k, json.dumps(e["files"]), e["size"], e["info"], e["last_used"]) for k, e in entries.items()],
+        )
+        legacy.unlink(missing_ok=True)
+    return conn
+
+
+def _evict(conn, max_bytes):
+    """Drop least-recently-used entries until the cache fits in max_bytes. Returns the evicted files.
+
+    Runs inside the caller's write transaction; files are deleted after it commits.
+    """
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM renders").fetchone()[0]
+    evicted = []
+    for key, files, size in conn.execute("SELECT key, files, size FROM renders ORDER BY last_used").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+        evicted.extend(json.loads(files))
+        total -= size
+    return evicted
+
+
+def _unlink(names):
+    for name in names:
+        (CACHE_DIR / name).unlink(missing_ok=True)
+
+
+def _resolve_seed(payload, info):
+    """Replace a random seed (-1) with the seed the WebUI reports in info."""
+    payload = dict(payload)
+    if payload.get("seed", -1) == -1:
+        try:
+            payload["seed"] = json.loads(info).get("seed", -1)
+        except (TypeError, ValueError):
+            return None
+        if payload["seed"] == -1:
+            return None
+    return payload
+
+
+def lookup_files(payload, model):
+    """Return (cached_paths, info) for a cached render, or None on a miss."""
+    if not ENABLED or payload.get("seed", -1) == -1:
+        return None
+
+    key = payload_key(payload, model)
+    with closing(connect()) as conn:
+        row = conn.execute("SELECT files, info FROM renders WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        paths = [CACHE_DIR / name for name in json.loads(row[0])]
+        if not all(path.exists() for path in paths):
+            # Files removed behind our back - treat as a miss
+            conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+            return None
+
+        conn.execute("UPDATE renders SET last_used = ? WHERE key = ?", (time.time(), key))
+        return paths, row[1]
+
+
+def get(payload, model):
+    """Return (images, info) for a cached render, or None on a miss."""
+    found = lookup_files(payload, model)
+    if found is None:
+        return None
+    paths, info = found
+    images = [base64.b64encode(path.read_bytes()).decode("ascii") for path in paths]
+    return images, info
+
+
+def copy_to(payload, model, make_path):
+    """Copy a cached render to make_path(i). Returns (paths, info) or None."""
+    found = lookup_files(payload, model)
+    if found is None:
+        return None
+    cached, info = found
+    paths = []
+    for i, src in enumerate(cached):
+        dest = make_path(i)
+        shutil.copyfile(src, dest)
+        paths.append(dest)
+    return paths, info
+
+
+def _add_entry(key, files, size, info, max_bytes):
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR REPLACE INTO renders (key, files, size, info, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(files), size, info, time.time()),
+        )
+        evicted = _evict(conn, max_bytes)
+        conn.execute("COMMIT")
+    _unlink(name for name in evicted if name not in files)
+
+
+def put(payload, model, images, info, max_bytes=MAX_BYTES):
+    """Store base64 images. Random-seed requests are keyed on the seed actually used."""
+    if not ENABLED:
+        return
+    payload = _resolve_seed(payload, info)
+    if payload is None:
+        return
+
+    key = payload_key(payload, model)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    files = []
+    size = 0
+    for i, img_data in enumerate(images):
+        name = f"{key}_{i:02d}.png"
+        img_bytes = base64.b64decode(img_data)
+        (CACHE_DIR / name).write_bytes(img_bytes)
+        files.append(name)
+        size += len(img_bytes)
+    _add_entry(key, files, size, info, max_bytes)
+
+
+def put_files(payload, model, paths, info, max_bytes=MAX_BYTES):
+    """Store PNGs already written to disk (copied, so callers may move them)."""
+    if not ENABLED:
+        return
+    payload = _resolve_seed(payload, info)
+    if payload is None:
+        return
+
+    key = payload_key(payload, model)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    files = []
+    size = 0
+    for i, path in enumerate(paths):
+        name = f"{key}_{i:02d}.png"
+        shutil.copyfile(path, CACHE_DIR / name)
+        files.append(name)
+        size += Path(path).stat().st_size
+    _add_entry(key, files, size, info, max_bytes)
+
+
+def stats():
+    """Print cache size and entry count."""
+    with closing(connect()) as conn:
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM renders").fetchone()
+    print(f"Render cache: {CACHE_DIR}")
+    print(f"  Entries: {count}")
+    print(f"  Size: {total / 1024**2:.1f} MB / {MAX_BYTES / 1024**2:.0f} MB")
+
+
+def clear():
+    """Remove every cached render."""
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        evicted = _evict(conn, 0)
+        conn.execute("COMMIT")
+    _unlink(evicted)
+    print("Render cache cleared.")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python render_cache.py stats  - Show cache size")
+        print("  python render_cache.py clear  - Delete all cached renders")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "stats":
+        stats()
+    elif cmd == "clear":
+        clear()
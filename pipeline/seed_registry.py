@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Golden Seed Registry
+Shared store for seeds/{character}_seeds.json. Updates take a file lock,
+re-read the latest file, and atomically replace it, so parallel generation
+workers never drop each other's seeds. Reads are served from an in-memory
+view that is reloaded only when the file changes on disk.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+SEEDS_DIR = PIPELINE_DIR / "seeds"
+
+_cache = {}  # path -> (mtime_ns, size, seeds)
+_cache_lock = threading.Lock()
+_thread_lock = threading.Lock()
+
+
+def seeds_file(character, seeds_dir=None):
+    return Path(seeds_dir or SEEDS_DIR) / f"{character}_seeds.json"
+
+
+@contextmanager
+def _locked(path):
+    """Exclusive lock on path's sidecar .lock file (across processes and threads)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock, open(path.with_suffix(".lock"), "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read(path, fresh=False):
+    """Seeds in a file, reusing the cached copy while the file is unchanged.
+
+    fresh=True always re-reads (used under the lock, where a same-size write
+    within one mtime tick must not be missed).
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return {}
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and not fresh and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+    with open(path) as f:
+        seeds = json.load(f)
+    with _cache_lock:
+        _cache[path] = (st.st_mtime_ns, st.st_size, seeds)
+    return seeds
+
+
+def _write(path, seeds):
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(seeds, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    st = path.stat()
+    with _cache_lock:
+        _cache[path] = (st.st_mtime_ns, st.st_size, seeds)
+
+
+def load(character, seeds_dir=None):
+    """{seed: {"description", "saved_at", ...}} for a character (read-only view)."""
+    return _read(seeds_file(character, seeds_dir))
+
+
+def save(character, seed, description, seeds_dir=None, **extra):
+    """Add or update a golden seed."""
+    path = seeds_file(character, seeds_dir)
+    with _locked(path):
+        seeds = dict(_read(path, fresh=True))
+        seeds[str(seed)] = {
+            "description": description,
+            "saved_at": datetime.now().isoformat(),
+            **extra,
+        }
+        _write(path, seeds)
+
+
+def remove(character, seed, seeds_dir=None):
+    """Delete a golden seed. Returns True if it existed."""
+    path = seeds_file(character, seeds_dir)
+    with _locked(path):
+        seeds = dict(_read(path, fresh=True))
+        if seeds.pop(str(seed), None) is None:
+            return False
+        _write(path, seeds)
+        return True
+
+
+def characters(seeds_dir=None):
+    """Characters that have saved seeds."""
+    return sorted(p.name[:-len("_seeds.json")] for p in Path(seeds_dir or SEEDS_DIR).glob("*_seeds.json"))
+
+
+def all_seeds(seeds_dir=None):
+    """{character: seeds} for every character."""
+    return {c: load(c, seeds_dir) for c in characters(seeds_dir)}
+
+
+def print_seeds(character=None, seeds_dir=None):
+    registry = {character: load(character, seeds_dir)} if character else all_seeds(seeds_dir)
+    if not any(registry.values()):
+        print("No saved seeds yet.")
+        return
+    for name, seeds in registry.items():
+        print(f"\n{name}:")
+        for seed, data in seeds.items():
+            print(f"  {seed}: {data['description']}")
+
+
+def _stress_worker(args):
+    seeds_dir, worker, count = args
+    for i in range(count):
+        save("stress", worker * 100000 + i, f"worker {worker} seed {i}", seeds_dir)
+
+
+def stress_test(workers=4, count=50):
+    """Save seeds from several processes at once and check none were lost."""
+    import tempfile
+    import time
+    from multiprocessing import Pool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        with Pool(workers) as pool:
+            pool.map(_stress_worker, [(tmp, w, count) for w in range(workers)])
+        elapsed = time.perf_counter() - start
+        saved = len(load("stress", tmp))
+
+    print(f"{workers} processes x {count} saves in {elapsed:.2f}s: {saved}/{workers * count} seeds kept")
+    return saved == workers * count
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python seed_registry.py list [character]                - List golden seeds")
+        print("  python seed_registry.py add <character> <seed> <desc>   - Save a golden seed")
+        print("  python seed_registry.py remove <character> <seed>       - Delete a golden seed")
+        print("  python seed_registry.py stress [workers] [count]        - Concurrent-save check")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "list":
+        print_seeds(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif cmd == "add":
+        save(sys.argv[2], int(sys.argv[3]), " ".join(sys.argv[4:]) or "")
+        print(f"Seed {sys.argv[3]} saved for {sys.argv[2]}")
+    elif cmd == "remove":
+        print("Removed" if remove(sys.argv[2], sys.argv[3]) else "Not found")
+    elif cmd == "stress":
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+        count = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        sys.exit(0 if stress_test(workers, count) else 1)
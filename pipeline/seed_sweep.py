@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Seed Sweep
+Grid search over seeds, cfg_scale, steps and samplers for one shot, packed
+into as few WebUI requests as possible. A run of consecutive seeds becomes one
+request (batch_size/n_iter render seed, seed+1, ...). With --xyz, the cfg, steps
+and sampler axes also go into a single X/Y/Z plot request. Writes the images,
+results.csv and contact_sheet.html to a sweep folder.
+"""
+
+import csv
+import html
+import itertools
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+import generate_shot
+from webui_client import get_client
+
+MAX_BATCH = 4          # images per batch (SDXL 1024x1024 VRAM limit)
+MAX_IMAGES = 16        # images per request (keeps one request from running for minutes)
+
+XYZ_SCRIPT = "x/y/z plot"
+# Axis indices in the txt2img X/Y/Z plot dropdown (WebUI 1.6+). If your
+# version lists axes differently, adjust these to match the dropdown order.
+XYZ_AXES = {"steps": 4, "cfg_scale": 6, "sampler_name": 9}
+
+INFOTEXT_FIELDS = {"Steps": ("steps", int), "Sampler": ("sampler_name", str),
+                   "CFG scale": ("cfg_scale", float), "Seed": ("seed", int)}
+
+
+def parse_ints(spec):
+    """'100-103,200' -> [100, 101, 102, 103, 200]"""
+    values = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if re.fullmatch(r"\d+-\d+", part):
+            lo, hi = map(int, part.split("-"))
+            values.extend(range(lo, hi + 1))
+        elif part:
+            values.append(int(part))
+    return values
+
+
+def parse_floats(spec):
+    """'5,7.5,9' -> [5.0, 7.5, 9.0]"""
+    return [float(v) for v in str(spec).split(",") if v.strip()]
+
+
+def seed_runs(seeds):
+    """Split seeds into runs of consecutive values: [1,2,3,7,8] -> [[1,2,3],[7,8]]."""
+    runs = []
+    for seed in sorted(set(seeds)):
+        if runs and seed == runs[-1][-1] + 1:
+            runs[-1].append(seed)
+        else:
+            runs.append([seed])
+    return runs
+
+
+def _chunks(run, size):
+    return [run[i:i + size] for i in range(0, len(run), size)]
+
+
+def _batches(run, max_batch):
+    """(first_seed, batch_size, n_iter) requests covering a consecutive seed run exactly."""
+    full = len(run) // max_batch * max_batch
+    batches = []
+    if full:
+        batches.append((run[0], max_batch, full // max_batch))
+    if len(run) > full:
+        batches.append((run[full], len(run) - full, 1))
+    return batches
+
+
+# =============================================================================
+# PLANNING
+# =============================================================================
+
+def plan(base_payload, seeds, cfgs, steps, samplers, xyz=False, max_batch=MAX_BATCH, max_images=MAX_IMAGES):
+    """Pack the sweep into requests: [{"payload": ..., "cells": [...]}].
+
+    cells lists {seed, cfg_scale, steps, sampler_name} in the order the WebUI
+    returns the (non-grid) images.
+    """
+    requests = []
+
+    if not xyz:
+        for sampler, step, cfg in itertools.product(samplers, steps, cfgs):
+            for run in seed_runs(seeds):
+                for chunk in _chunks(run, max_images):
+                    for first, batch_size, n_iter in _batches(chunk, max_batch):
+                        payload = {**base_payload, "seed": first, "batch_size": batch_size, "n_iter": n_iter,
+                                   "cfg_scale": cfg, "steps": step, "sampler_name": sampler}
+                        cells = [{"seed": first + i, "cfg_scale": cfg, "steps": step, "sampler_name": sampler}
+                                 for i in range(batch_size * n_iter)]
+                        requests.append({"payload": payload, "cells": cells})
+        return requests
+
+    # X = cfg, Y = steps, Z = sampler; a one-value axis is set on the payload instead
+    axes = [("cfg_scale", cfgs), ("steps", steps), ("sampler_name", samplers)]
+    fixed = {field: values[0] for field, values in axes if len(values) == 1}
+    script_args = []
+    for field, values in axes:
+        if len(values) == 1:
+            script_args += [0, "", []]
+        elif field == "sampler_name":
+            script_args += [XYZ_AXES[field], "", list(values)]
+        else:
+            script_args += [XYZ_AXES[field], ", ".join(f"{v:g}" for v in values), []]
+    # draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds,
+    # vary_seeds_x/y/z, margin_size, csv_mode
+    script_args += [True, True, False, False, False, False, False, 0, False]
+
+    grid = [dict(zip(("sampler_name", "steps", "cfg_scale"), combo))
+            for combo in itertools.product(samplers, steps, cfgs)]
+    cells_per_image = len(grid)
+    per_request = max(1, max_images // cells_per_image)
+
+    for run in seed_runs(seeds):
+        for chunk in _chunks(run, min(per_request, max_batch)):
+            payload = {**base_payload, **fixed, "seed": chunk[0], "batch_size": len(chunk), "n_iter": 1,
+                       "script_name": XYZ_SCRIPT, "script_args": script_args}
+            cells = [{**cell, "seed": seed} for cell in grid for seed in chunk]
+            requests.append({"payload": payload, "cells": cells})
+    return requests
+
+
+def parse_infotext(text):
+    """Pull steps/sampler/cfg/seed out of an A1111 infotext."""
+    params = {}
+    last_line = (text or "").strip().splitlines()[-1] if text else ""
+    for key, value in re.findall(r"([\w .]+): ([^,]+)", last_line):
+        field = INFOTEXT_FIELDS.get(key.strip())
+        if field:
+            name, cast = field
+            try:
+                params[name] = cast(value.strip())
+            except ValueError:
+                pass
+    return params
+
+
+# =============================================================================
+# RUNNING
+# =============================================================================
+
+def sweep_dir(shot_key, episode_id=None):
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = generate_shot.shot_output_path(episode_id=episode_id) / "sweeps" / f"{shot_key}_{stamp}"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def run_sweep(shot_key, seeds, cfgs, steps, samplers, xyz=False, api_url=None, episode_id=None,
+              output_dir=None, max_batch=MAX_BATCH, max_images=MAX_IMAGES):
+    """Render the sweep and write results. Returns (rows, output_dir)."""
+    client = get_client(api_url or generate_shot.API_URL)
+    generate_shot.ensure_shot_model(shot_key, api_url, episode_id)
+    base = generate_shot.build_payload(shot_key, episode_id=episode_id)
+    requests = plan(base, seeds, cfgs, steps, samplers, xyz, max_batch, max_images)
+    output_dir = Path(output_dir) if output_dir else sweep_dir(shot_key, episode_id)
+    total = sum(len(r["cells"]) for r in requests)
+
+    print(f"\nSweep {shot_key}: {total} images in {len(requests)} requests "
+          f"(one per image would be {total})")
+    rows = []
+    for n, request in enumerate(requests, 1):
+        start = time.monotonic()
+        make_path = lambda i, n=n: output_dir / f"_request{n:03d}_{i:03d}.png"
+        paths, info = client.render_to_files("txt2img", request["payload"], make_path)
+        elapsed = time.monotonic() - start
+
+        try:
+            infotexts = json.loads(info).get("infotexts", [])
+        except ValueError:
+            infotexts = []
+
+        # Grids (X/Y/Z) come first; the remaining images map onto the cells
+        extra = max(0, len(paths) - len(request["cells"]))
+        for i, path in enumerate(paths[:extra]):
+            path.replace(output_dir / f"grid_{n:03d}_{i}.png")
+
+        saved = []
+        for i, (path, cell) in enumerate(zip(paths[extra:], request["cells"])):
+            params = {**cell, **parse_infotext(infotexts[extra + i] if extra + i < len(infotexts) else "")}
+            name = (f"{shot_key}_s{params['seed']}_{params['sampler_name'].replace(' ', '')}"
+                    f"_st{params['steps']}_cfg{params['cfg_scale']:g}.png")
+            path.replace(output_dir / name)
+            saved.append(output_dir / name)
+            rows.append({"file": name, **params, "request": n, "request_seconds": round(elapsed, 2)})
+
+        generate_shot.log_shot(shot_key, request["payload"], info, saved, client.get_current_model())
+        print(f"  request {n}/{len(requests)}: {len(paths)} images in {elapsed:.1f}s")
+
+    write_results(rows, output_dir, shot_key)
+    return rows, output_dir
+
+
+def write_results(rows, output_dir, title=""):
+    """Write results.csv and a contact sheet (one row per setting, one column per seed)."""
+    fields = ["file", "seed", "sampler_name", "steps", "cfg_scale", "request", "request_seconds"]
+    with open(output_dir / "results.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    seeds = sorted({r["seed"] for r in rows})
+    settings = sorted({(r["sampler_name"], r["steps"], r["cfg_scale"]) for r in rows})
+    by_cell = {(r["sampler_name"], r["steps"], r["cfg_scale"], r["seed"]): r["file"] for r in rows}
+
+    lines = [
+        "<!doctype html><meta charset='utf-8'>",
+        f"<title>{html.escape(title)} sweep</title>",
+        "<style>body{font-family:sans-serif}td{text-align:center;font-size:12px}img{width:192px}</style>",
+        f"<h2>{html.escape(title)}</h2><table><tr><th></th>",
+    ]
+    lines += [f"<th>seed {seed}</th>" for seed in seeds]
+    lines.append("</tr>")
+    for sampler, steps, cfg in settings:
+        lines.append(f"<tr><th>{html.escape(sampler)}<br>steps {steps}<br>cfg {cfg:g}</th>")
+        for seed in seeds:
+            name = by_cell.get((sampler, steps, cfg, seed))
+            cell = f"<a href='{html.escape(name)}'><img src='{html.escape(name)}'></a>" if name else ""
+            lines.append(f"<td>{cell}</td>")
+        lines.append("</tr>")
+    lines.append("</table>")
+    (output_dir / "contact_sheet.html").write_text("\n".join(lines))
+
+    print(f"\n{len(rows)} images -> {output_dir}")
+    print(f"  results.csv, contact_sheet.html")
+
+
+def benchmark(overhead=1.0, render_time=0.05, seeds=8):
+    """Compare one-request-per-image, packed and X/Y/Z sweeps on a fake WebUI."""
+    import contextlib
+    import io
+    import tempfile
+
+    import fake_webui
+    import render_cache
+
+    render_cache.ENABLED = False
+    generate_shot.LOG_GENERATIONS = False
+    shot_key = next(iter(generate_shot.get_shots()))
+    grid = {"seeds": list(range(1000, 1000 + seeds)), "cfgs": [5.0, 7.0], "steps": [20, 30],
+            "samplers": ["Euler a", "DPM++ 2M Karras"]}
+
+    rows = []
+    for label, kwargs in [("per image", {"max_batch": 1, "max_images": 1}), ("packed", {}), ("x/y/z", {"xyz": True})]:
+        server, url, state = fake_webui.serve(render_time=render_time, overhead=overhead)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.monotonic()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results, _ = run_sweep(shot_key, api_url=url, output_dir=tmp, **grid, **kwargs)
+            rows.append((label, state.requests, len(results), time.monotonic() - start))
+        server.shutdown()
+
+    print(f"\n{seeds} seeds x 2 cfg x 2 steps x 2 samplers, {overhead}s overhead per request, "
+          f"{render_time}s per image")
+    print("-" * 60)
+    for label, requests, images, elapsed in rows:
+        print(f"  {label:<10} {requests:>3} requests  {images:>3} images  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Seed / cfg / steps / sampler sweep for one shot")
+    parser.add_argument("shot_key", help="e.g. shot03_rex_deadpan, or 'bench' to benchmark packing")
+    parser.add_argument("--seeds", default="1000-1007", help="e.g. 1000-1015,2800128069")
+    parser.add_argument("--cfg", default=str(generate_shot.RUNWAY_SETTINGS["cfg_scale"]), help="e.g. 5,7,9")
+    parser.add_argument("--steps", default=str(generate_shot.RUNWAY_SETTINGS["steps"]), help="e.g. 20,30")
+    parser.add_argument("--sampler", action="append", dest="samplers",
+                        help=f"repeatable (default {generate_shot.RUNWAY_SETTINGS['sampler_name']})")
+    parser.add_argument("--xyz", action="store_true", help="pack cfg/steps/sampler into one X/Y/Z plot request")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--episode", default=None)
+    parser.add_argument("--url", default=None, help="WebUI URL")
+    args = parser.parse_args()
+
+    if args.shot_key == "bench":
+        benchmark()
+    else:
+        run_sweep(
+            args.shot_key,
+            parse_ints(args.seeds),
+            parse_floats(args.cfg),
+            parse_ints(args.steps),
+            args.samplers or [generate_shot.RUNWAY_SETTINGS["sampler_name"]],
+            xyz=args.xyz,
+            api_url=args.url,
+            episode_id=args.episode,
+            max_batch=args.max_batch,
+        )
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Shot Ranker
+Scores candidate renders against the character's reference sheet
+(characters/<name>/reference.png or characters/<name>.png) so each shot's
+best candidate can be picked without eyeballing every PNG. Features are a
+color histogram, a perceptual hash and a gradient-orientation grid, computed
+for all candidates at once with NumPy.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import episode_manifest
+import storage
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CHARACTERS_DIR = REPO_ROOT / "characters"
+RANKING_NAME = "ranking.json"
+SELECTION_NAME = "selection.json"
+
+SIZE = 64              # images are compared at 64x64
+HIST_BITS = 3          # 8 levels per channel -> 512-bin color histogram
+HASH_SIZE = 8          # 8x8 low-frequency DCT -> 64-bit pHash
+HOG_CELLS = 4          # 4x4 cells
+HOG_BINS = 8           # orientation bins per cell
+# Tuned on episode 001's hand picks (python shot_ranker.py check): 3/8 top-1,
+# 5/8 top-2. The pHash never helped there, so it is reported but not weighted.
+WEIGHTS = {"color": 0.65, "hash": 0.0, "shape": 0.35}
+
+
+def reference_path(character):
+    """characters/<name>/reference.png, else characters/<name>.png, else None."""
+    for path in (CHARACTERS_DIR / character / "reference.png", CHARACTERS_DIR / f"{character}.png"):
+        if path.exists():
+            return path
+    return None
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def _square(img, fill):
+    side = max(img.size)
+    canvas = Image.new(img.mode, (side, side), fill)
+    canvas.paste(img, ((side - img.width) // 2, (side - img.height) // 2))
+    return canvas
+
+
+def _load_reference(path):
+    """Character cutout from a reference sheet: (rgb, weight mask).
+
+    Uses the alpha channel when there is one, otherwise treats pixels close to
+    the corner color as background.
+    """
+    img = Image.open(path)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        alpha = img.getchannel("A")
+    else:
+        img = img.convert("RGB")
+        arr = np.asarray(img, dtype=np.int16)
+        corners = np.array([arr[0, 0], arr[0, -1], arr[-1, 0], arr[-1, -1]])
+        background = np.median(corners, axis=0)
+        alpha = Image.fromarray(((np.abs(arr - background).sum(-1) > 30) * 255).astype(np.uint8))
+
+    bbox = alpha.getbbox() or (0, 0, *img.size)
+    rgb = _square(img.convert("RGB").crop(bbox), (128, 128, 128)).resize((SIZE, SIZE), Image.BILINEAR)
+    mask = _square(alpha.crop(bbox), 0).resize((SIZE, SIZE), Image.BILINEAR)
+    return np.asarray(rgb), np.asarray(mask, dtype=np.float32) / 255
+
+
+def _center_weights():
+    """Gaussian weighting toward the frame center, where the character is framed."""
+    axis = np.linspace(-1, 1, SIZE)
+    xx, yy = np.meshgrid(axis, axis)
+    return np.exp(-(xx ** 2 + yy ** 2) / (2 * 0.45 ** 2)).astype(np.float32)
+
+
+def _load_candidate(path):
+    img = Image.open(storage.open_candidate(path)).convert("RGB")
+    if img.width >= SIZE * 4:
+        img = img.reduce(img.width // (SIZE * 2))  # cheap box downscale before the resample
+    return np.asarray(img.resize((SIZE, SIZE), Image.BILINEAR))
+
+
+def load_candidates(paths, workers=8):
+    """Decode candidates in parallel (PIL releases the GIL) -> (N, SIZE, SIZE, 3) uint8.
+
+    Candidates moved to shots/archive/ are read from their zip member.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return np.stack(list(pool.map(_load_candidate, paths)))
+
+
+# =============================================================================
+# FEATURES (vectorized over N images)
+# =============================================================================
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+DCT = _dct_matrix(32)
+
+
+def _gray(rgb):
+    return rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def color_histograms(rgb, weights):
+    """(N, 512) weighted, normalized RGB histograms."""
+    n = len(rgb)
+    q = (rgb >> (8 - HIST_BITS)).astype(np.int64)
+    bins = 1 << (3 * HIST_BITS)
+    idx = (q[..., 0] << (2 * HIST_BITS)) | (q[..., 1] << HIST_BITS) | q[..., 2]
+    idx += (np.arange(n) * bins)[:, None, None]
+    w = np.broadcast_to(weights, idx.shape)
+    hist = np.bincount(idx.ravel(), weights=w.ravel(), minlength=n * bins).reshape(n, bins)
+    return hist / np.maximum(hist.sum(1, keepdims=True), 1e-9)
+
+
+def phashes(gray):
+    """(N, 64) bool perceptual hashes from the low-frequency DCT of a 32x32 image."""
+    small = gray.reshape(len(gray), 32, SIZE // 32, 32, SIZE // 32).mean((2, 4))
+    coeffs = np.einsum("ij,njk,lk->nil", DCT, small, DCT)[:, :HASH_SIZE, :HASH_SIZE]
+    flat = coeffs.reshape(len(gray), -1)
+    median = np.median(flat[:, 1:], axis=1, keepdims=True)  # DC term skews the median
+    return flat > median
+
+
+def orientation_grids(gray, weights):
+    """(N, HOG_CELLS^2 * HOG_BINS) L2-normalized gradient-orientation histograms."""
+    n = len(gray)
+    gy, gx = np.gradient(gray, axis=(1, 2))
+    magnitude = np.hypot(gx, gy) * weights
+    angle = np.mod(np.arctan2(gy, gx), np.pi)
+    bin_idx = np.minimum((angle / np.pi * HOG_BINS).astype(np.int64), HOG_BINS - 1)
+    cell = SIZE // HOG_CELLS
+    rows = (np.arange(SIZE) // cell)[:, None]
+    cols = (np.arange(SIZE) // cell)[None, :]
+    cell_idx = (rows * HOG_CELLS + cols) * HOG_BINS
+    per_image = HOG_CELLS * HOG_CELLS * HOG_BINS
+    idx = bin_idx + cell_idx + (np.arange(n) * per_image)[:, None, None]
+    hog = np.bincount(idx.ravel(), weights=magnitude.ravel(), minlength=n * per_image).reshape(n, per_image)
+    return hog / np.maximum(np.linalg.norm(hog, axis=1, keepdims=True), 1e-9)
+
+
+def features(rgb, weights):
+    gray = _gray(rgb)
+    return {
+        "color": color_histograms(rgb, weights),
+        "hash": phashes(gray),
+        "shape": orientation_grids(gray, weights),
+    }
+
+
+@lru_cache(maxsize=None)
+def _reference_features(path, mtime):
+    rgb, mask = _load_reference(path)
+    return features(rgb[None], mask[None])
+
+
+def reference_features(character):
+    path = reference_path(character)
+    if path is None:
+        return None
+    return _reference_features(str(path), path.stat().st_mtime_ns)
+
+
+def score(candidate, reference):
+    """Similarity of each candidate to the reference -> (total (N,), {feature: (N,)})."""
+    parts = {
+        "color": np.minimum(candidate["color"], reference["color"]).sum(1),
+        "hash": 1 - (candidate["hash"] != reference["hash"]).mean(1),
+        "shape": candidate["shape"] @ reference["shape"][0],
+    }
+    total = sum(WEIGHTS[k] * v for k, v in parts.items())
+    return total, parts
+
+
+# =============================================================================
+# RANKING
+# =============================================================================
+
+def rank(paths, character):
+    """[{"file", "score", "color", "hash", "shape"}] best first.
+
+    Without a reference sheet for the character, the original order is kept.
+    """
+    paths = [Path(p) for p in paths]
+    reference = reference_features(character)
+    if not paths or reference is None:
+        return [{"file": p.name, "score": None} for p in paths]
+
+    rgb = load_candidates(paths)
+    total, parts = score(features(rgb, _center_weights()), reference)
+    order = np.argsort(-total, kind="stable")
+    return [
+        {"file": paths[i].name, "score": round(float(total[i]), 4),
+         **{k: round(float(v[i]), 4) for k, v in parts.items()}}
+        for i in order
+    ]
+
+
+def best(paths, character):
+    """Filename of the top-ranked candidate (None if there are no candidates)."""
+    ranked = rank(paths, character)
+    return ranked[0]["file"] if ranked else None
+
+
+def candidates(episode_id, shot_id):
+    """Rendered candidates for a shot: episodes/<id>/shots/shot<shot_id>_*.png."""
+    shots_dir = episode_manifest.EPISODES_DIR / episode_id / "shots"
+    return sorted(shots_dir.glob(f"shot{shot_id}_*.png"))
+
+
+def rank_episode(episode_id=episode_manifest.DEFAULT_EPISODE):
+    """Rank every shot's candidates -> {shot_id: {"character", "pick", "candidates"}}."""
+    ranking = {}
+    for shot in episode_manifest.load_episode(episode_id)["shots"]:
+        ranked = rank(candidates(episode_id, shot["id"]), shot["character"])
+        ranking[shot["id"]] = {
+            "character": shot["character"],
+            "reference": str(reference_path(shot["character"]) or ""),
+            "pick": ranked[0]["file"] if ranked else None,
+            "candidates": ranked,
+        }
+    return ranking
+
+
+def write_ranking(episode_id, ranking, apply=False):
+    """Write shots/ranking.json; apply=True also pins the picks in shots/selection.json."""
+    shots_dir = episode_manifest.EPISODES_DIR / episode_id / "shots"
+    with open(shots_dir / RANKING_NAME, "w") as f:
+        json.dump(ranking, f, indent=2)
+
+    if apply:
+        selection_file = shots_dir / SELECTION_NAME
+        selection = json.loads(selection_file.read_text()) if selection_file.exists() else {}
+        for shot_id, entry in ranking.items():
+            if entry["pick"] and shot_id not in selection:
+                selection[shot_id] = entry["pick"]
+        selection_file.write_text(json.dumps(selection, indent=2) + "\n")
+    return shots_dir / RANKING_NAME
+
+
+def agreement(episode_id=episode_manifest.DEFAULT_EPISODE):
+    """Where the hand picks in SELECTED.md land in the ranking -> {shot_id: (pick, position)}.
+
+    Position is 0 for the top-ranked candidate; shots whose pick is not one of
+    the candidates, or that have no reference sheet, are left out.
+    """
+    import episode_build
+    picks = episode_build.EpisodeBuild(episode_id)._read_selected_md()
+    result = {}
+    for shot in episode_manifest.load_episode(episode_id)["shots"]:
+        pick = picks.get(shot["id"])
+        files = candidates(episode_id, shot["id"])
+        if pick not in [f.name for f in files] or reference_path(shot["character"]) is None:
+            continue
+        order = [c["file"] for c in rank(files, shot["character"])]
+        result[shot["id"]] = (pick, order.index(pick))
+    return result
+
+
+def print_ranking(ranking):
+    for shot_id, entry in ranking.items():
+        note = "" if entry["reference"] else "  (no reference sheet, kept render order)"
+        print(f"\n{shot_id} [{entry['character']}]{note}")
+        if not entry["candidates"]:
+            print("  no candidates")
+        for i, c in enumerate(entry["candidates"]):
+            mark = "*" if i == 0 else " "
+            if c["score"] is None:
+                print(f"  {mark} {c['file']}")
+            else:
+                print(f"  {mark} {c['score']:.3f}  color {c['color']:.3f}  hash {c['hash']:.3f}  "
+                      f"shape {c['shape']:.3f}  {c['file']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python shot_ranker.py rank [episode] [--apply]   - Rank candidates, write shots/ranking.json")
+        print("                                                     (--apply pins picks in shots/selection.json)")
+        print("  python shot_ranker.py shot <shot_key> [episode]  - Rank one shot's candidates")
+        print("  python shot_ranker.py check [episode]            - Compare the ranking with SELECTED.md hand picks")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    episode_id = args[0] if cmd in ("rank", "check") and args else episode_manifest.DEFAULT_EPISODE
+
+    if cmd == "rank":
+        start = time.perf_counter()
+        ranking = rank_episode(episode_id)
+        elapsed = time.perf_counter() - start
+        print_ranking(ranking)
+        path = write_ranking(episode_id, ranking, apply="--apply" in sys.argv)
+        total = sum(len(e["candidates"]) for e in ranking.values())
+        print(f"\nRanked {total} candidates in {elapsed:.2f}s -> {path}")
+    elif cmd == "shot":
+        shot_key = args[0]
+        episode_id = args[1] if len(args) > 1 else episode_manifest.DEFAULT_EPISODE
+        shot_id = shot_key[len("shot"):] if shot_key.startswith("shot") else shot_key
+        character = episode_manifest.image_shots(episode_id)[f"shot{shot_id}"]["character"]
+        ranked = rank(candidates(episode_id, shot_id), character)
+        print_ranking({shot_id: {"character": character, "reference": str(reference_path(character) or ""),
+                                 "candidates": ranked, "pick": None}})
+    elif cmd == "check":
+        result = agreement(episode_id)
+        for shot_id, (pick, position) in result.items():
+            print(f"  {shot_id:24} hand pick ranked #{position + 1}  {pick}")
+        top1 = sum(position == 0 for _, position in result.values())
+        top2 = sum(position < 2 for _, position in result.values())
+        print(f"\nTop-1 agreement {top1}/{len(result)}, top-2 {top2}/{len(result)} (weights {WEIGHTS})")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Concurrent Shot Scheduler
+Keeps every WebUI endpoint's queue fed: while one request renders, the other
+one in flight streams its images straight to disk (generate_shot.render_shot),
+so prompt building and decoding overlap GPU time without buffering responses.
+"""
+
+import queue
+import threading
+import time
+
+import generate_shot
+import model_batching
+from webui_client import get_client
+
+# Requests kept in flight per endpoint. The WebUI renders one at a time, so 2
+# means the next payload is already waiting when the current render finishes.
+DEFAULT_DEPTH = 2
+DEFAULT_QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+class ShotScheduler:
+    """Bounded work queue feeding one or more WebUI endpoints."""
+
+    def __init__(self, api_urls, depth=DEFAULT_DEPTH, queue_size=DEFAULT_QUEUE_SIZE, build_payload=None,
+                 requirement=None):
+        self.api_urls = list(api_urls)
+        self.depth = depth
+        self.queue_size = queue_size
+        self.build_payload = build_payload or generate_shot.build_payload
+        # key -> (checkpoint, vae, loras); None disables model-aware batching
+        self.requirement = requirement
+        self.results = {}
+        self.errors = {}
+        self.per_endpoint = {url: 0 for url in self.api_urls}
+        self.elapsed = 0.0
+        self.switches = 0
+        self.ungrouped_switches = 0
+        self._lock = threading.Lock()
+
+    def _produce(self, jobs, work, consumers):
+        """Build payloads ahead of the submitters (blocks when the queue is full)."""
+        for key in jobs:
+            work.put((key, self.build_payload(key)))
+        for _ in range(consumers):
+            work.put(_DONE)
+
+    def _enter(self, url, key):
+        """Wait until url can take key's job, loading its checkpoint if needed.
+
+        The gate lives on the shared client (WebUIClient.acquire), so a
+        checkpoint switch only happens once the endpoint has nothing in flight,
+        including renders from other callers in this process.
+        """
+        req = self.requirement(key) if self.requirement else (None, None, ())
+        if get_client(url).acquire(req[0], req[1]):
+            with self._lock:
+                self.switches += 1
+
+    def _leave(self, url):
+        get_client(url).release()
+
+    def _submit(self, url, work, output_dir):
+        """Pull payloads off the queue, render them on one endpoint and stream the images to disk."""
+        while True:
+            item = work.get()
+            if item is _DONE:
+                break
+            key, payload = item
+            try:
+                self._enter(url, key)
+                try:
+                    # The gate holds the checkpoint until _leave, so render_shot
+                    # caches and logs the shot under the model it rendered on
+                    saved, _, _ = generate_shot.render_shot(key, payload, output_dir, url)
+                finally:
+                    self._leave(url)
+            except Exception as e:
+                with self._lock:
+                    self.errors[key] = str(e)
+                print(f"  {key}: failed on {url} ({e})")
+                continue
+
+            with self._lock:
+                self.per_endpoint[url] += 1
+                self.results[key] = saved
+
+    def _plan(self, jobs):
+        """{url: jobs} grouped by model, or None to share one queue across endpoints."""
+        if not self.requirement:
+            return None
+        reqs = {key: self.requirement(key) for key in jobs}
+        if all(req[0] is None for req in reqs.values()):
+            return None
+
+        loaded = {url: get_client(url).loaded_model() for url in self.api_urls}
+
+        # What the same jobs would cost dealt round-robin in their original order
+        self.ungrouped_switches = sum(
+            model_batching.count_switches([reqs[k] for k in jobs[i::len(self.api_urls)]], loaded[url])
+            for i, url in enumerate(self.api_urls)
+        )
+        return model_batching.assign_groups(jobs, reqs.get, self.api_urls, loaded)
+
+    def run(self, jobs, output_dir=None):
+        """Render every job key and return {key: saved_files}."""
+        jobs = list(jobs)
+        # The checkpoint may have changed since this process last looked
+        for url in self.api_urls:
+            get_client(url).get_current_model(refresh=True)
+        plan = self._plan(jobs)
+        start = time.monotonic()
+
+        # One shared queue, or one per endpoint when jobs are grouped by model
+        if plan is None:
+            shared = queue.Queue(maxsize=self.queue_size)
+            queues = {url: shared for url in self.api_urls}
+            feeds = [(jobs, shared, len(self.api_urls) * self.depth)]
+        else:
+            queues = {url: queue.Queue(maxsize=self.queue_size) for url in self.api_urls}
+            feeds = [(plan[url], queues[url], self.depth) for url in self.api_urls]
+
+        producers = [
+            threading.Thread(target=self._produce, args=feed, daemon=True)
+            for feed in feeds
+        ]
+        for t in producers:
+            t.start()
+
+        submitters = [
+            threading.Thread(target=self._submit, args=(url, queues[url], output_dir), daemon=True)
+            for url in self.api_urls
+            for _ in range(self.depth)
+        ]
+        for t in submitters:
+            t.start()
+        for t in submitters:
+            t.join()
+        for t in producers:
+            t.join()
+
+        self.elapsed = time.monotonic() - start
+        return self.results
+
+    def shots_per_minute(self):
+        """Completed shots per minute for the last run."""
+        if not self.elapsed:
+            return 0.0
+        return len(self.results) * 60 / self.elapsed
+
+    def print_stats(self):
+        """Print a short run summary."""
+        print(f"\nCompleted {len(self.results)} shots in {self.elapsed:.1f}s "
+              f"({self.shots_per_minute():.1f} shots/min)")
+        for url, count in self.per_endpoint.items():
+            print(f"  {url}: {count} shots")
+        if self.switches or self.ungrouped_switches:
+            model_batching.print_report(self.switches, self.ungrouped_switches)
+        if self.errors:
+            print(f"Failed: {', '.join(sorted(self.errors))}")
+
+
+def benchmark(endpoints=2, render_time=0.2):
+    """Compare sequential generate_all against the scheduler on fake WebUIs."""
+    import contextlib
+    import io
+    import tempfile
+
+    import fake_webui
+    import render_cache
+
+    render_cache.ENABLED = False
+    generate_shot.LOG_GENERATIONS = False
+    servers = [fake_webui.serve(render_time=render_time) for _ in range(endpoints)]
+    urls = [url for _, url, _ in servers]
+    shots = list(generate_shot.get_shots())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_url = generate_shot.API_URL
+        generate_shot.API_URL = urls[0]
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for key in shots:
+                generate_shot.generate_shot(key, output_dir=tmp)
+        sequential = time.monotonic() - start
+        generate_shot.API_URL = original_url
+
+        rows = [("sequential", 1, sequential)]
+        for count in (1, endpoints):
+            scheduler = ShotScheduler(urls[:count])
+            with contextlib.redirect_stdout(io.StringIO()):
+                scheduler.run(shots, output_dir=tmp)
+            rows.append(("scheduler", count, scheduler.elapsed))
+
+    for server, _, _ in servers:
+        server.shutdown()
+
+    print(f"\n{len(shots)} shots, {render_time}s per image, "
+          f"batch_size {generate_shot.RUNWAY_SETTINGS['batch_size']}")
+    print("-" * 50)
+    for mode, count, elapsed in rows:
+        print(f"  {mode:<12} {count} endpoint(s): {elapsed:6.2f}s  "
+              f"{len(shots) * 60 / elapsed:6.1f} shots/min")
+
+
+def benchmark_models(models=2, switch_time=2.0, render_time=0.05):
+    """Compare job-order vs model-grouped rendering when shots alternate checkpoints."""
+    import contextlib
+    import io
+    import tempfile
+
+    import fake_webui
+    import render_cache
+
+    render_cache.ENABLED = False
+    generate_shot.LOG_GENERATIONS = False
+    shots = list(generate_shot.get_shots())
+    reqs = {key: (f"model_{i % models}.safetensors", None, ()) for i, key in enumerate(shots)}
+    rows = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Job order: switch whenever the next shot needs a different checkpoint
+        server, url, state = fake_webui.serve(render_time=render_time, switch_time=switch_time)
+        client = get_client(url)
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for key in shots:
+                client.set_model(reqs[key][0])
+                generate_shot.render_shot(key, generate_shot.build_payload(key), tmp, url)
+        rows.append(("job order", state.switches, time.monotonic() - start))
+        server.shutdown()
+
+        server, url, state = fake_webui.serve(render_time=render_time, switch_time=switch_time)
+        scheduler = ShotScheduler([url], requirement=reqs.get)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run(shots, output_dir=tmp)
+        rows.append(("grouped", state.switches, scheduler.elapsed))
+        server.shutdown()
+
+    print(f"\n{len(shots)} shots alternating {models} checkpoints, {switch_time}s per checkpoint load")
+    print("-" * 50)
+    for mode, switches, elapsed in rows:
+        print(f"  {mode:<10} {switches:>3} switches  {elapsed:6.2f}s")
+    model_batching.print_report(rows[1][1], rows[0][1])
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python shot_scheduler.py bench [endpoints] [render_time]  - Measure throughput on fake WebUIs")
+        print("  python shot_scheduler.py bench-models [models] [switch_time] - Checkpoint switches, job order vs grouped")
+        sys.exit(0)
+
+    if sys.argv[1] == "bench":
+        endpoints = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        render_time = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+        benchmark(endpoints, render_time)
+    elif sys.argv[1] == "bench-models":
+        models = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        switch_time = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+        benchmark_models(models, switch_time)
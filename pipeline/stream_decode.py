@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Streaming Response Decoder
+Parses a WebUI txt2img/img2img response as it arrives and decodes each entry
+of the top-level "images" array straight to disk, so a batch never sits in
+memory as one JSON document plus a second decoded copy.
+"""
+
+import binascii
+import json
+import re
+
+import tracing
+
+CHUNK_SIZE = 256 * 1024
+
+_STRING_END = re.compile(rb'["\\]')
+_STRUCTURAL = re.compile(rb'["{}\[\]:,]')
+
+
+class _Base64Writer:
+    """Decode base64 text incrementally into an open file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.pending = b""
+        self.size = 0
+
+    def write(self, data):
+        if self.pending:
+            data = self.pending + bytes(data)
+        usable = len(data) - len(data) % 4
+        if usable:
+            decoded = binascii.a2b_base64(data[:usable])
+            self.f.write(decoded)
+            self.size += len(decoded)
+        self.pending = bytes(data[usable:])
+
+    def close(self):
+        if self.pending:
+            # Tolerate unpadded input
+            decoded = binascii.a2b_base64(self.pending + b"=" * (-len(self.pending) % 4))
+            self.f.write(decoded)
+            self.size += len(decoded)
+        self.f.close()
+
+
+class ImageStreamParser:
+    """Incremental JSON scanner that diverts the top-level "images" array to files.
+
+    Everything outside that array is kept (with "images" replaced by an empty
+    list) so the remaining fields such as "info" can be parsed normally.
+    """
+
+    def __init__(self, make_path):
+        self.make_path = make_path
+        self.paths = []
+        self.rest = bytearray()
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.last_string = None
+        self.expect_images = False
+        self.in_images = False
+        self.writer = None
+
+    def feed(self, chunk):
+        data = memoryview(chunk)
+        pos = 0
+        n = len(data)
+
+        while pos < n:
+            if self.writer is not None:
+                # Inside an image string: everything up to the closing quote is base64
+                end = chunk.find(b'"', pos)
+                if end == -1:
+                    self.writer.write(bytes(data[pos:]).replace(b"\\", b""))
+                    return
+                self.writer.write(bytes(data[pos:end]).replace(b"\\", b""))
+                self.writer.close()
+                self.writer = None
+                pos = end + 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    # Previous chunk ended on a backslash
+                    self.escape = False
+                    self._keep(data[pos:pos + 1])
+                    self._string_part(data[pos:pos + 1])
+                    pos += 1
+                    continue
+                m = _STRING_END.search(chunk, pos)
+                if m is None:
+                    self._keep(data[pos:])
+                    self._string_part(data[pos:])
+                    return
+                end = m.start()
+                self._keep(data[pos:end + 1])
+                if chunk[end:end + 1] == b"\\":
+                    self._string_part(data[pos:end + 1])
+                    if end + 1 < n:
+                        self._keep(data[end + 1:end + 2])
+                        self._string_part(data[end + 1:end + 2])
+                        pos = end + 2
+                    else:
+                        self.escape = True
+                        pos = end + 1
+                    continue
+                self._string_part(data[pos:end])
+                self.in_string = False
+                self.last_string = bytes(self._string)
+                pos = end + 1
+                continue
+
+            m = _STRUCTURAL.search(chunk, pos)
+            if m is None:
+                if not self.in_images:
+                    self._keep(data[pos:])
+                return
+            i = m.start()
+            char = chunk[i:i + 1]
+
+            if self.in_images:
+                if char == b'"':
+                    path = self.make_path(len(self.paths))
+                    self.paths.append(path)
+                    self.writer = _Base64Writer(open(path, "wb"))
+                elif char == b"]":
+                    self.in_images = False
+                    self._keep(b"[]")
+                pos = i + 1
+                continue
+
+            self._keep(data[pos:i + 1])
+            if char == b'"':
+                self.in_string = True
+                self._string = bytearray()
+            elif char == b":":
+                if self.depth == 1 and self.last_string == b"images":
+                    self.expect_images = True
+            elif char == b"[" and self.expect_images:
+                # Drop the "[" we just kept; "[]" is written when the array closes
+                del self.rest[-1:]
+                self.expect_images = False
+                self.in_images = True
+            elif char in (b"{", b"["):
+                self.depth += 1
+            elif char in (b"}", b"]"):
+                self.depth -= 1
+            if char != b":":
+                self.expect_images = False
+                if char != b'"':
+                    self.last_string = None
+            pos = i + 1
+
+    def _keep(self, data):
+        self.rest += data
+
+    def _string_part(self, data):
+        # Only short keys matter for detecting "images"; skip hoarding long values
+        if len(self._string) < 16:
+            self._string += data[:16]
+
+    def close(self):
+        """Finish parsing and return the non-image fields as a dict."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        return json.loads(bytes(self.rest) or b"{}")
+
+
+def stream_response_to_files(response, make_path, chunk_size=CHUNK_SIZE):
+    """Write every image in a streamed response to make_path(i).
+
+    Returns (paths, result) where result is the response JSON without images.
+    """
+    parser = ImageStreamParser(make_path)
+    # Time blocked on the socket vs. spent decoding base64 and writing files
+    wait, decode = tracing.Timer(), tracing.Timer()
+    for chunk in tracing.timed_iter(response.iter_content(chunk_size=chunk_size), wait):
+        if chunk:
+            with decode():
+                parser.feed(chunk)
+    with decode():
+        result = parser.close()
+    wait.add_span("http.body")
+    decode.add_span("decode_write", images=len(parser.paths))
+    return parser.paths, result
+
+
+def post_to_files(session, url, payload, make_path, timeout=600):
+    """POST a payload and stream the returned images to disk.
+
+    Returns (paths, info) where info is the raw "info" string from the WebUI.
+    """
+    with session.post(url, json=payload, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        paths, result = stream_response_to_files(r, make_path)
+    return paths, result.get("info", "{}")
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    # ru_maxrss carries over the parent's high-water mark on fork, so prefer VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    import sys
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024**2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def _bench_child(mode, url, output_dir, batch_size):
+    """Run one request in this process and print peak RSS in MB."""
+    import base64
+    from pathlib import Path
+
+    import requests
+
+    payload = {"prompt": "bench", "batch_size": batch_size, "seed": 1}
+    make_path = lambda i: Path(output_dir) / f"{mode}_{i:02d}.png"
+    baseline = _peak_rss_mb()
+
+    if mode == "buffered":
+        r = requests.post(f"{url}/sdapi/v1/txt2img", json=payload, timeout=600)
+        result = r.json()
+        for i, img_data in enumerate(result["images"]):
+            with open(make_path(i), "wb") as f:
+                f.write(base64.b64decode(img_data))
+    else:
+        post_to_files(requests.Session(), f"{url}/sdapi/v1/txt2img", payload, make_path)
+
+    print(json.dumps({"baseline_mb": baseline, "peak_mb": _peak_rss_mb()}))
+
+
+def benchmark(image_mb=40, batch_size=4):
+    """Compare peak RSS of r.json()+b64decode against the streaming path."""
+    import filecmp
+    import subprocess
+    import sys
+    import tempfile
+    from pathlib import Path
+
+    import fake_webui
+
+    server, url, _ = fake_webui.serve(render_time=0, image_bytes=image_mb * 1024 * 1024)
+    rows = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("buffered", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "_child", mode, url, tmp, str(batch_size)],
+                capture_output=True, text=True, check=True,
+            )
+            rows[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+        identical = all(
+            filecmp.cmp(Path(tmp) / f"buffered_{i:02d}.png", Path(tmp) / f"stream_{i:02d}.png", shallow=False)
+            for i in range(batch_size)
+        )
+
+    server.shutdown()
+
+    print(f"\nResponse: {batch_size} images x {image_mb} MB "
+          f"(~{batch_size * image_mb * 4 / 3:.0f} MB of base64 JSON)")
+    print("-" * 50)
+    for mode, row in rows.items():
+        print(f"  {mode:<9} peak RSS {row['peak_mb']:7.1f} MB "
+              f"(+{row['peak_mb'] - row['baseline_mb']:.1f} MB over baseline)")
+    saved = rows["buffered"]["peak_mb"] - rows["stream"]["peak_mb"]
+    print(f"  Reduction: {saved:.1f} MB")
+    print(f"  Output files identical: {identical}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python stream_decode.py bench [image_mb] [batch_size]  - Peak RSS: buffered vs streaming")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "bench":
+        image_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+        batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+        benchmark(image_mb, batch_size)
+    elif cmd == "_child":
+        _bench_child(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Streaming TTS Writer
+Writes TTS audio chunks to disk as they arrive and times the request:
+time to first chunk, total synthesis time and bytes/sec. Chunks can also be
+piped to a local player (ffplay, mpv or mpg123) so a line can be auditioned
+while it is still downloading. Metrics are appended to tts_metrics.jsonl
+next to the audio. Used by generate_audio.py and test_voices.py.
+"""
+
+import contextlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import tracing
+
+METRICS_NAME = "tts_metrics.jsonl"
+AUDIO_BITRATE = 128000  # ElevenLabs default output_format mp3_44100_128
+
+# First one found on PATH is used; set TTS_PLAYER to override ("ffplay -nodisp -autoexit -")
+PLAYERS = [
+    ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "-"],
+    ["mpv", "--no-video", "--really-quiet", "-"],
+    ["mpg123", "-q", "-"],
+]
+
+_log_lock = threading.Lock()
+
+
+# =============================================================================
+# PLAYER
+# =============================================================================
+
+class Player:
+    """A local player reading MP3 from stdin. A player that exits early never breaks the download."""
+
+    def __init__(self, command):
+        self.command = command
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def feed(self, chunk):
+        if self.proc.stdin is None:
+            return
+        try:
+            self.proc.stdin.write(chunk)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.proc.stdin = None
+
+    def close(self, wait=True):
+        """End of stream; wait=True blocks until playback finishes."""
+        if self.proc.stdin is not None:
+            try:
+                self.proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+        if wait:
+            self.proc.wait()
+
+
+def open_player(command=None):
+    """Start a player (TTS_PLAYER or the first of PLAYERS found). None if there isn't one."""
+    command = command or os.environ.get("TTS_PLAYER")
+    if isinstance(command, str):
+        command = shlex.split(command)
+    if command is None:
+        command = next((p for p in PLAYERS if shutil.which(p[0])), None)
+    if command is None:
+        print("  (no player found: install ffmpeg/mpv/mpg123 or set TTS_PLAYER)")
+        return None
+    return Player(command)
+
+
+# =============================================================================
+# WRITERS
+# =============================================================================
+
+def _metrics(path, start, first, end, size, chunks):
+    total = end - start
+    ttfb = (first - start) if first is not None else None
+    audio = size * 8 / AUDIO_BITRATE
+    return {
+        "file": Path(path).name,
+        "ttfb_s": round(ttfb, 3) if ttfb is not None else None,
+        "total_s": round(total, 3),
+        "bytes": size,
+        "chunks": chunks,
+        "bytes_per_s": round(size / total) if total > 0 else None,
+        "audio_s": round(audio, 2),
+        # > 1 means playback that starts at the first chunk never runs dry
+        "x_realtime": round(audio / (end - first), 2) if first is not None and end > first else None,
+    }
+
+
+class _StreamFile:
+    """Shared body of write_stream()/write_stream_async(): the .part file, timers, metrics and rename.
+
+    On a clean exit the file is moved into place and .metrics is set; on an
+    exception the .part file is removed.
+    """
+
+    def __init__(self, path, player=None, start=None):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".part")
+        self.player = player
+        self.start = start or time.perf_counter()
+        self.first, self.size, self.count = None, 0, 0
+        # Time blocked waiting on the TTS server vs. writing/playing chunks
+        self.wait, self.write_timer = tracing.Timer(), tracing.Timer()
+        self.metrics = None
+
+    def __enter__(self):
+        self.stack = contextlib.ExitStack()
+        try:
+            self.stack.enter_context(tracing.span("tts_stream", file=self.path.name))
+            self.f = self.stack.enter_context(open(self.tmp, "wb"))
+        except BaseException:
+            self.stack.close()
+            raise
+        return self
+
+    def write(self, chunk):
+        if self.first is None:
+            self.first = time.perf_counter()
+        with self.write_timer():
+            self.f.write(chunk)
+            if self.player:
+                self.player.feed(chunk)
+        self.size += len(chunk)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.wait.add_span("http.tts")
+                self.write_timer.add_span("disk_write", bytes=self.size)
+            self.stack.__exit__(exc_type, exc, tb)
+        except BaseException:
+            self.tmp.unlink(missing_ok=True)
+            raise
+        if exc_type is not None:
+            self.tmp.unlink(missing_ok=True)
+            return False
+        end = time.perf_counter()
+        os.replace(self.tmp, self.path)
+        self.metrics = _metrics(self.path, self.start, self.first, end, self.size, self.count)
+        return False
+
+
+def write_stream(chunks, path, player=None, start=None):
+    """Write an iterable of byte chunks to path (via path.part), feeding player as they arrive.
+
+    start is when the request was made (default: now; the SDKs only send the
+    request once iteration begins). Returns the metrics dict.
+    """
+    with _StreamFile(path, player, start) as out:
+        for chunk in tracing.timed_iter(chunks, out.wait):
+            out.write(chunk)
+    return out.metrics
+
+
+async def write_stream_async(chunks, path, player=None, start=None):
+    """write_stream() for an async iterable of chunks."""
+    with _StreamFile(path, player, start) as out:
+        async for chunk in tracing.timed_aiter(chunks, out.wait):
+            out.write(chunk)
+    return out.metrics
+
+
+def log(output_dir, metrics, **fields):
+    """Append one request's metrics to output_dir/tts_metrics.jsonl."""
+    entry = {"time": datetime.now().isoformat(timespec="seconds"), **fields, **metrics}
+    with _log_lock, open(Path(output_dir) / METRICS_NAME, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def describe(metrics):
+    """One-line summary for console output."""
+    ttfb = f"{metrics['ttfb_s']:.2f}s" if metrics["ttfb_s"] is not None else "-"
+    rate = f"{metrics['bytes_per_s'] / 1024:.0f} KB/s" if metrics["bytes_per_s"] else "-"
+    return f"first chunk {ttfb}, total {metrics['total_s']:.2f}s, {metrics['bytes'] / 1024:.0f} KB, {rate}"
+
+
+# =============================================================================
+# REPORTS
+# =============================================================================
+
+def load(output_dir):
+    path = Path(output_dir) / METRICS_NAME
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summary(output_dir, key="voice"):
+    """Print median/max time to first chunk and throughput grouped by key."""
+    import statistics
+
+    groups = {}
+    for entry in load(output_dir):
+        groups.setdefault(entry.get(key, "?"), []).append(entry)
+    if not groups:
+        print(f"No {METRICS_NAME} in {output_dir}")
+        return
+
+    print(f"\n{key.capitalize():<24} {'Requests':>8} {'TTFB med':>9} {'TTFB max':>9} {'Total med':>10} {'KB/s med':>9}")
+    print("-" * 75)
+    for name, entries in sorted(groups.items()):
+        ttfb = [e["ttfb_s"] for e in entries if e.get("ttfb_s") is not None]
+        total = [e["total_s"] for e in entries]
+        rate = [e["bytes_per_s"] / 1024 for e in entries if e.get("bytes_per_s")]
+        print(f"{str(name):<24} {len(entries):>8} {statistics.median(ttfb) if ttfb else 0:9.2f} "
+              f"{max(ttfb) if ttfb else 0:9.2f} {statistics.median(total):10.2f} "
+              f"{statistics.median(rate) if rate else 0:9.0f}")
+
+
+def benchmark(lines=6, latency=0.5, seconds_per_char=0.02):
+    """Time to first audio (streamed playback) vs. time to a complete file, on fake_tts.py."""
+    import sys
+    import tempfile
+
+    import requests
+
+    import fake_tts
+
+    server, url, _ = fake_tts.serve(latency=latency, seconds_per_char=seconds_per_char)
+    text = "I mumbled my name at a coffee shop. The barista heard Kevin. I panicked and just nodded."
+    sink = [sys.executable, "-c", "import sys\nwhile sys.stdin.buffer.read(4096): pass"]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(lines):
+            player = Player(sink)
+            start = time.perf_counter()
+            r = requests.post(f"{url}/v1/text-to-speech/voice{i}", json={"text": text}, stream=True)
+            metrics = write_stream(r.iter_content(chunk_size=None), Path(tmp) / f"line{i}.mp3", player, start)
+            player.close()
+            log(tmp, metrics, voice=f"voice{i}")
+            rows.append(metrics)
+        summary(tmp)
+    server.shutdown()
+
+    first = sum(m["ttfb_s"] for m in rows) / len(rows)
+    total = sum(m["total_s"] for m in rows) / len(rows)
+    print(f"\n{lines} lines of {len(text)} chars, {latency}s latency: audio starts after {first:.2f}s "
+          f"streamed vs {total:.2f}s for the full file ({total - first:.2f}s sooner per line)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python stream_writer.py summary <audio_dir> [key]  - TTFB/throughput per voice (or per key)")
+        print("  python stream_writer.py bench                      - Streamed first audio vs full file on fake TTS")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "summary":
+        summary(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "voice")
+    elif cmd == "bench":
+        benchmark()
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 """Quick test: Generate 2 Casey images"""
 
-import requests
 import base64
 import json
 from pathlib import Path
 from datetime import datetime
 
+from webui_client import get_client
+
 API_URL = "http://127.0.0.1:7860"
 OUTPUT_DIR = Path(__file__).resolve().parent.parent / "characters" / "casey" / "test_outputs"
 
@@ -29,16 +30,11 @@ negative = casey["negative_prompt_default"]
 
 settings = casey["recommended_settings"]
 
-def check_api():
-    try:
-        r = requests.get(f"{API_URL}/sdapi/v1/sd-models", timeout=5)
-        return r.status_code == 200
-    except:
-        return False
-
 def generate():
+    client = get_client(API_URL)
+
     print("Checking API...")
-    if not check_api():
+    if not client.check_api():
         print("ERROR: SD WebUI API not running!")
         print("Start it with: webui-user.bat")
         return
@@ -46,17 +42,16 @@ def generate():
     print("API connected!")
 
     # Check current model
-    r = requests.get(f"{API_URL}/sdapi/v1/options")
-    current_model = r.json().get("sd_model_checkpoint", "Unknown")
+    current_model = client.get_current_model()
     print(f"Current model: {current_model}")
 
     # Switch to Juggernaut if needed
     if "juggernaut" not in current_model.lower():
         print("Switching to JuggernautXL...")
-        requests.post(f"{API_URL}/sdapi/v1/options", json={
-            "sd_model_checkpoint": settings["model"]
-        })
-        print("Model switched!")
+        if client.set_model(settings["model"]):
+            print("Model switched!")
+        else:
+            print("Failed to switch model.")
 
     print(f"\nGenerating 2 Casey images...")
     print(f"Prompt: {prompt[:80]}...")
@@ -74,33 +69,32 @@ def generate():
     }
 
     print("\nSending request to API...")
-    r = requests.post(f"{API_URL}/sdapi/v1/txt2img", json=payload)
+    try:
+        result = client.render("txt2img", payload)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        return
 
-    if r.status_code == 200:
-        result = r.json()
-        images = result["images"]
-        info = json.loads(result.get("info", "{}"))
-        seed = info.get("seed", "unknown")
+    images = result["images"]
+    info = json.loads(result.get("info", "{}"))
+    seed = info.get("seed", "unknown")
 
-        # Save images
-        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Save images
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        for i, img_data in enumerate(images):
-            filename = f"casey_test_{timestamp}_{i:02d}.png"
-            filepath = OUTPUT_DIR / filename
+    for i, img_data in enumerate(images):
+        filename = f"casey_test_{timestamp}_{i:02d}.png"
+        filepath = OUTPUT_DIR / filename
 
-            img_bytes = base64.b64decode(img_data)
-            with open(filepath, 'wb') as f:
-                f.write(img_bytes)
+        img_bytes = base64.b64decode(img_data)
+        with open(filepath, 'wb') as f:
+            f.write(img_bytes)
 
-            print(f"Saved: {filepath}")
+        print(f"Saved: {filepath}")
 
-        print(f"\nDone! Seed used: {seed}")
-        print(f"Images saved to: {OUTPUT_DIR}")
-    else:
-        print(f"ERROR: {r.status_code}")
-        print(r.text)
+    print(f"\nDone! Seed used: {seed}")
+    print(f"Images saved to: {OUTPUT_DIR}")
 
 if __name__ == "__main__":
     generate()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Checks for concurrent audio generation against fake_tts.py (no API key needed).
+Run with `python -m pytest test_generate_audio.py`.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+
+import audio_cache
+import fake_tts
+import generate_audio
+import stream_writer
+
+
+def generate_all(url, output_dir):
+    client = generate_audio.make_client("fake", url, use_async=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(generate_audio.generate_all_async(output_dir=output_dir, client=client))
+
+
+def test_all_lines_written(fake_tts_server, tmp_path):
+    script = generate_audio.get_script()
+    url, state = fake_tts_server()
+    saved = generate_all(url, tmp_path / "audio")
+
+    assert sorted(saved) == sorted(script)
+    for shot_key, path in saved.items():
+        request = generate_audio.tts_request(shot_key)
+        assert path.read_bytes() == fake_tts.fake_audio(request["voice_id"], request["text"])
+    assert state.requests == len(script)
+    assert state.peak <= generate_audio.CONCURRENCY
+
+
+def test_rate_limit_retried(fake_tts_server, tmp_path):
+    script = generate_audio.get_script()
+    limit = generate_audio.CONCURRENCY - 1
+    url, state = fake_tts_server(max_concurrent=limit)
+    saved = generate_all(url, tmp_path / "audio")
+
+    assert sorted(saved) == sorted(script)
+    assert state.rejected > 0
+    assert state.peak <= limit
+
+
+def test_rerun_hits_cache(fake_tts_server, tmp_path):
+    script = generate_audio.get_script()
+    url, state = fake_tts_server()
+    first = generate_all(url, tmp_path / "audio")
+    requests = state.requests
+    rerun = generate_all(url, tmp_path / "audio")
+
+    assert state.requests == requests
+    assert {k: p.read_bytes() for k, p in rerun.items()} == {k: p.read_bytes() for k, p in first.items()}
+    with open(tmp_path / "audio" / audio_cache.MANIFEST_NAME) as f:
+        manifest = json.load(f)
+    assert all(manifest[f"{key}.mp3"]["cache_hit"] for key in script)
+
+
+def test_stream_metrics_logged(fake_tts_server, tmp_path):
+    script = generate_audio.get_script()
+    url, state = fake_tts_server(max_concurrent=generate_audio.CONCURRENCY - 1)
+    output_dir = tmp_path / "audio"
+    generate_all(url, output_dir)
+
+    assert not list(output_dir.glob("*.part"))
+    with open(output_dir / stream_writer.METRICS_NAME) as f:
+        entries = [json.loads(line) for line in f]
+    assert sorted(e["file"] for e in entries) == sorted(f"{key}.mp3" for key in script)
+    assert 0 < sum(e["retries"] for e in entries) <= state.rejected
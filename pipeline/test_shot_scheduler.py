@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Checks for the shot scheduler against fake_webui.py (no GPU needed).
+Run with `python -m pytest test_shot_scheduler.py`.
+"""
+
+import contextlib
+import io
+from pathlib import Path
+
+import generate_shot
+from shot_scheduler import ShotScheduler
+
+
+def run(scheduler, shots, output_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scheduler.run(shots, output_dir=output_dir)
+
+
+def test_every_shot_rendered_once(fake_webuis, tmp_path):
+    shots = list(generate_shot.get_shots())
+    batch_size = generate_shot.RUNWAY_SETTINGS["batch_size"]
+    webuis = fake_webuis(2, render_time=0.02)
+    scheduler = ShotScheduler([url for url, _ in webuis])
+    results = run(scheduler, shots, tmp_path)
+
+    assert not scheduler.errors
+    assert sorted(results) == sorted(shots)
+    assert all(len(files) == batch_size and all(Path(f).exists() for f in files) for files in results.values())
+    assert len(list(tmp_path.glob("*.png"))) == len(shots) * batch_size
+    assert sum(state.requests for _, state in webuis) == len(shots)
+    assert sum(scheduler.per_endpoint.values()) == len(shots)
+    assert all(count > 0 for count in scheduler.per_endpoint.values())
+
+
+def test_shots_grouped_by_model(fake_webuis, tmp_path):
+    shots = list(generate_shot.get_shots())
+    reqs = {key: (f"model_{i % 2}.safetensors", None, ()) for i, key in enumerate(shots)}
+    prompts = {generate_shot.build_payload(key)["prompt"]: key for key in shots}
+    assert len(prompts) == len(shots)
+
+    [(url, state)] = fake_webuis(1, render_time=0.01)
+    scheduler = ShotScheduler([url], requirement=reqs.get)
+    results = run(scheduler, shots, tmp_path)
+
+    assert sorted(results) == sorted(shots)
+    # Each checkpoint is loaded once instead of once per alternating shot
+    assert state.switches == scheduler.switches == 2
+    assert scheduler.ungrouped_switches == len(shots)
+    for model, prompt in state.history:
+        assert model == reqs[prompts[prompt]][0]
+    models = [model for model, _ in state.history]
+    assert sum(a != b for a, b in zip(models, models[1:])) == 1
@@ -2,8 +2,12 @@
 """Test different voices for a character"""
 
 import os
+import sys
+import time
 from pathlib import Path
-from elevenlabs import ElevenLabs
+import audio_cache
+import generate_audio
+import stream_writer
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,30 +33,43 @@ TEST_VOICES = {
 }
 
 TEST_LINE = "internet improv presents"
+MODEL_ID = "eleven_multilingual_v2"
 
-def generate_samples():
-    output_dir = BASE_DIR / "episodes" / "001-kevin-identity" / "audio" / "voice_tests"
+def generate_samples(play=False, output_dir=None):
+    """Render TEST_LINE in every test voice; play=True auditions each one as it streams."""
+    output_dir = Path(output_dir or BASE_DIR / "episodes" / "001-kevin-identity" / "audio" / "voice_tests")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    client = ElevenLabs(api_key=API_KEY)
+    client = generate_audio.make_client(API_KEY)
 
     for name, voice_id in TEST_VOICES.items():
         print(f"Generating sample for: {name}")
 
+        filepath = output_dir / f"casey_test_{name}.mp3"
+        key = audio_cache.tts_key(voice_id, MODEL_ID, None, TEST_LINE)
+        if audio_cache.get(key, filepath):
+            print(f"  Cached: {filepath}")
+            continue
+
+        player = stream_writer.open_player() if play else None
+        start = time.perf_counter()
         audio = client.text_to_speech.convert(
             voice_id=voice_id,
             text=TEST_LINE,
-            model_id="eleven_multilingual_v2",
+            model_id=MODEL_ID,
         )
+        try:
+            metrics = stream_writer.write_stream(audio, filepath, player, start)
+        finally:
+            if player:
+                player.close()  # let the sample finish before the next voice starts
+        audio_cache.put(key, filepath)
+        stream_writer.log(output_dir, metrics, voice=name, voice_id=voice_id, chars=len(TEST_LINE))
 
-        filepath = output_dir / f"casey_test_{name}.mp3"
-        with open(filepath, "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
-
-        print(f"  Saved: {filepath}")
+        print(f"  Saved: {filepath} ({stream_writer.describe(metrics)})")
 
     print(f"\nAll samples saved to: {output_dir}")
+    stream_writer.summary(output_dir)
 
 if __name__ == "__main__":
-    generate_samples()
+    generate_samples(play="--play" in sys.argv)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Per-Stage Timing
+Lightweight spans for the pipeline scripts: prompt building, HTTP wait, JSON
+parse, base64 decode, disk writes and TTS streaming each get a named span with
+monotonic timing. Off unless PIPELINE_TRACE is set, in which case each run
+writes a JSON trace to logs/traces/ and prints a summary table on exit,
+including how much of the wall time was spent waiting on the servers
+(GPU/TTS-bound) versus in our own code (client-bound).
+
+    PIPELINE_TRACE=1                 spans only
+    PIPELINE_TRACE=profile           + cProfile (main thread), top functions in the trace
+    PIPELINE_TRACE=memory            + tracemalloc peak and top allocation sites
+    PIPELINE_TRACE=profile,memory    both
+"""
+
+import atexit
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+TRACE_DIR = PIPELINE_DIR / "logs" / "traces"
+TRACE_ENV = "PIPELINE_TRACE"
+
+# Spans whose name starts with this are time spent waiting on a server
+WAIT_PREFIX = "http."
+PROFILE_TOP = 25
+MEMORY_TOP = 10
+
+ENABLED = False
+OPTIONS = set()
+
+_spans = []
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("tracing_span", default=None)
+_t0 = time.perf_counter()
+_started = datetime.now()
+_profiler = None
+
+
+# =============================================================================
+# SPANS
+# =============================================================================
+
+def _record(name, start, end, parent, span_id, attrs):
+    entry = {
+        "id": span_id,
+        "parent": parent,
+        "name": name,
+        "start": round(start - _t0, 6),
+        "duration": round(end - start, 6),
+        "thread": threading.current_thread().name,
+    }
+    if attrs:
+        entry["attrs"] = attrs
+    with _lock:
+        _spans.append(entry)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as one span. Yields the attrs dict so callers can add to it."""
+    if not ENABLED:
+        yield attrs
+        return
+    span_id = next(_ids)
+    parent = _current.get()
+    token = _current.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        _current.reset(token)
+        _record(name, start, end, parent, span_id, attrs)
+
+
+def add(name, seconds, **attrs):
+    """Record time measured elsewhere (e.g. summed over chunks) as a span ending now."""
+    if not ENABLED:
+        return
+    end = time.perf_counter()
+    _record(name, end - seconds, end, _current.get(), next(_ids), attrs)
+
+
+def traced(name=None):
+    """Decorator: run every call of a function (sync or async) inside a span."""
+    def decorate(fn):
+        label = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Timer:
+    """Accumulates time over many short sections (per chunk) without a span each."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+
+    @contextmanager
+    def __call__(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+    def add_span(self, name, **attrs):
+        if self.count:
+            add(name, self.seconds, calls=self.count, **attrs)
+
+
+def timed_iter(iterable, timer):
+    """Yield from iterable, charging the time spent waiting for each item to timer."""
+    it = iter(iterable)
+    while True:
+        with timer():
+            item = next(it, None)
+        if item is None:
+            return
+        yield item
+
+
+async def timed_aiter(iterable, timer):
+    """timed_iter() for an async iterable."""
+    it = aiter(iterable)
+    while True:
+        with timer():
+            item = await anext(it, None)
+        if item is None:
+            return
+        yield item
+
+
+# =============================================================================
+# RUN LIFECYCLE
+# =============================================================================
+
+def enable(options=("spans",), write_on_exit=True):
+    """Turn tracing on (PIPELINE_TRACE does this at import), starting any profilers."""
+    global ENABLED, _profiler
+    if ENABLED:
+        return
+    ENABLED = True
+    OPTIONS.update(options)
+    if "profile" in OPTIONS:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if "memory" in OPTIONS:
+        import tracemalloc
+        tracemalloc.start()
+    if write_on_exit:
+        atexit.register(finish)
+
+
+def reset():
+    """Drop recorded spans and restart the wall clock."""
+    global _t0, _started
+    with _lock:
+        _spans.clear()
+    _t0 = time.perf_counter()
+    _started = datetime.now()
+
+
+def _profile_top():
+    import pstats
+
+    _profiler.disable()
+    stats = pstats.Stats(_profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return [
+        {
+            "function": f"{Path(filename).name}:{line}({func})",
+            "calls": calls,
+            "self_s": round(self_time, 4),
+            "cumulative_s": round(cumulative, 4),
+        }
+        for (filename, line, func), (_, calls, self_time, cumulative, _) in rows
+    ]
+
+
+def _memory_top():
+    import tracemalloc
+
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    top = snapshot.statistics("lineno")[:MEMORY_TOP]
+    return {
+        "peak_mb": round(peak / 1024**2, 2),
+        "top": [{"site": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in top],
+    }
+
+
+def snapshot():
+    """The trace so far as a dict: spans, per-name summary and the server-wait share."""
+    wall = time.perf_counter() - _t0
+    with _lock:
+        spans = list(_spans)
+    return {
+        "script": Path(sys.argv[0]).name if sys.argv and sys.argv[0] else "python",
+        "argv": sys.argv[1:],
+        "started": _started.isoformat(timespec="seconds"),
+        "wall_s": round(wall, 4),
+        "wait_s": round(wait_time(spans), 4),
+        "summary": summarize(spans),
+        "spans": spans,
+    }
+
+
+def write_trace(trace, trace_dir=None):
+    trace_dir = Path(trace_dir or TRACE_DIR)
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(trace["script"]).stem
+    path = trace_dir / f"{stem}_{_started.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json"
+    with open(path, "w") as f:
+        json.dump(trace, f, indent=1)
+    return path
+
+
+def finish():
+    """Stop profilers, write the run's trace and print the summary (registered with atexit)."""
+    if not ENABLED:
+        return None
+    trace = snapshot()
+    if _profiler is not None:
+        trace["profile"] = _profile_top()
+    if "memory" in OPTIONS:
+        trace["memory"] = _memory_top()
+    if not trace["spans"]:
+        return None
+    path = write_trace(trace)
+    print_summary(trace)
+    print(f"\nTrace: {path}")
+    return path
+
+
+# =============================================================================
+# SUMMARY
+# =============================================================================
+
+def summarize(spans):
+    """Per span name: calls, total, self (minus child spans), mean and max seconds."""
+    children = {}
+    for s in spans:
+        if s["parent"] is not None:
+            children[s["parent"]] = children.get(s["parent"], 0.0) + s["duration"]
+
+    rows = {}
+    for s in spans:
+        row = rows.setdefault(s["name"], {"calls": 0, "total_s": 0.0, "self_s": 0.0, "max_s": 0.0})
+        row["calls"] += 1
+        row["total_s"] += s["duration"]
+        # Concurrent children (asyncio.gather, thread pools) can outlast their parent
+        row["self_s"] += max(0.0, s["duration"] - children.get(s["id"], 0.0))
+        row["max_s"] = max(row["max_s"], s["duration"])
+    for row in rows.values():
+        row["mean_s"] = row["total_s"] / row["calls"]
+        for key in ("total_s", "self_s", "max_s", "mean_s"):
+            row[key] = round(row[key], 4)
+    return dict(sorted(rows.items(), key=lambda item: item[1]["total_s"], reverse=True))
+
+
+def wait_time(spans):
+    """Wall seconds during which at least one server request was outstanding."""
+    intervals = sorted((s["start"], s["start"] + s["duration"])
+                       for s in spans if s["name"].startswith(WAIT_PREFIX))
+    total, end = 0.0, None
+    for lo, hi in intervals:
+        if end is None or lo > end:
+            total += hi - lo
+            end = hi
+        elif hi > end:
+            total += hi - end
+            end = hi
+    return total
+
+
+def print_summary(trace):
+    wall = trace["wall_s"]
+    print(f"\n{'Span':<28} {'Calls':>6} {'Total':>9} {'Self':>9} {'Mean':>9} {'Max':>9} {'% wall':>7}")
+    print("-" * 83)
+    for name, row in trace["summary"].items():
+        share = row["total_s"] / wall if wall else 0
+        print(f"{name:<28} {row['calls']:>6} {row['total_s']:8.3f}s {row['self_s']:8.3f}s "
+              f"{row['mean_s']:8.3f}s {row['max_s']:8.3f}s {share:7.0%}")
+
+    wait = trace["wait_s"]
+    share = wait / wall if wall else 0
+    verdict = "server/GPU-bound" if share >= 0.5 else "client-bound"
+    print(f"\nWall {wall:.2f}s: waiting on servers {wait:.2f}s ({share:.0%}), "
+          f"client {wall - wait:.2f}s ({1 - share:.0%}) -> {verdict}")
+
+    if trace.get("profile"):
+        print(f"\nTop functions by cumulative time (main thread):")
+        for row in trace["profile"][:10]:
+            print(f"  {row['cumulative_s']:8.3f}s {row['self_s']:8.3f}s {row['calls']:>8}  {row['function']}")
+    if trace.get("memory"):
+        print(f"\nPeak traced memory: {trace['memory']['peak_mb']:.1f} MB")
+        for row in trace["memory"]["top"][:5]:
+            print(f"  {row['size_kb']:>10.1f} KB  {row['site']}")
+
+
+def latest_trace(trace_dir=None):
+    traces = sorted(Path(trace_dir or TRACE_DIR).glob("*.json"), key=lambda p: p.stat().st_mtime)
+    return traces[-1] if traces else None
+
+
+def show(path=None):
+    path = Path(path) if path else latest_trace()
+    if path is None or not path.exists():
+        print(f"No traces in {TRACE_DIR} (run a script with {TRACE_ENV}=1)")
+        return
+    with open(path) as f:
+        trace = json.load(f)
+    print(f"{path.name}: {trace['script']} {' '.join(trace['argv'])} ({trace['started']})")
+    print_summary(trace)
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def benchmark(shots=4, render_time=0.5, calls=100000):
+    """Span overhead (off and on), then a traced generate_shot run on fake_webui.py."""
+    import contextlib
+    import io
+    import tempfile
+
+    # The instance the pipeline modules import (this file may be running as __main__)
+    import tracing
+
+    was_enabled = tracing.ENABLED
+    print(f"Span overhead over {calls} calls:")
+    for state in (False, True):
+        tracing.ENABLED = state
+        start = time.perf_counter()
+        for _ in range(calls):
+            with tracing.span("bench"):
+                pass
+        per_call = (time.perf_counter() - start) / calls
+        print(f"  tracing {'on ' if state else 'off'}: {per_call * 1e6:6.2f} us per span")
+    tracing.ENABLED = was_enabled
+    tracing.reset()
+
+    import episode_manifest
+    import fake_webui
+    import generate_shot
+    import render_cache
+
+    render_cache.ENABLED = False
+    generate_shot.LOG_GENERATIONS = False
+    server, url, _ = fake_webui.serve(render_time=render_time)
+    generate_shot.API_URL = url
+    tracing.enable(write_on_exit=False)
+
+    shot_keys = list(generate_shot.get_shots(episode_manifest.DEFAULT_EPISODE))[:shots]
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        for shot_key in shot_keys:
+            generate_shot.generate_shot(shot_key, output_dir=tmp, seed=1000)
+    server.shutdown()
+
+    print(f"\n{len(shot_keys)} shots on a fake WebUI at {render_time}s per image:")
+    tracing.print_summary(tracing.snapshot())
+
+
+if os.environ.get(TRACE_ENV, "").strip().lower() not in ("", "0", "off"):
+    enable({o.strip() for o in os.environ[TRACE_ENV].lower().split(",")})
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python tracing.py show [trace.json]  - Summary table for a trace (default: the latest)")
+        print("  python tracing.py list               - List recorded traces")
+        print("  python tracing.py bench              - Span overhead, and a traced run on the fake WebUI")
+        print(f"\nTrace any script by setting {TRACE_ENV}:")
+        print(f"  {TRACE_ENV}=1 python generate_shot.py all")
+        print(f"  {TRACE_ENV}=profile,memory python generate_audio.py all")
+        sys.exit(0)
+
+    cmd = sys.argv[1]
+
+    if cmd == "show":
+        show(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif cmd == "list":
+        for path in sorted(TRACE_DIR.glob("*.json")):
+            print(f"  {path.name}")
+    elif cmd == "bench":
+        benchmark()
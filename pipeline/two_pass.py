@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - Two-Pass Shot Rendering
+Drafts many seeds cheaply (512px, few steps), ranks them against the
+character's reference sheet (or takes hand-picked seeds), then re-renders only
+the keepers at full size with the same seed: hires-fix by default, or img2img
+from the upscaled draft. Reports GPU-seconds against the single-pass path
+(one RUNWAY_SETTINGS batch per shot), and separately against rendering every
+drafted seed at full size.
+"""
+
+import base64
+import io
+import json
+import math
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image
+
+import episode_manifest
+import generate_shot
+import render_cache
+import shot_ranker
+# Same pixels x steps cost model the fake WebUI's scale_work timings use
+from fake_webui import work as render_work
+from webui_client import get_client
+
+DRAFTS_DIR = "drafts"              # episodes/<id>/shots/drafts/
+REPORT_NAME = "two_pass.json"      # per-shot GPU-seconds, next to the drafts
+DRAFT_COUNT = 12                   # seeds drafted per shot
+KEEP = 1                           # drafts re-rendered at full size per shot
+MAX_BATCH = 4                      # images per draft request (batch_size x n_iter covers the rest)
+
+DRAFT_SETTINGS = {"width": 512, "height": 512, "steps": 12}
+
+# Hires-fix: the first pass is the draft itself (same seed, size, steps), the
+# latent is upscaled to RUNWAY_SETTINGS size and refined for
+# hr_second_pass_steps x denoising_strength steps
+HIRES_SETTINGS = {
+    "enable_hr": True,
+    "hr_upscaler": "Latent",
+    "hr_second_pass_steps": generate_shot.RUNWAY_SETTINGS["steps"],
+    "denoising_strength": 0.55,
+}
+
+# img2img: the saved draft is upscaled on the CPU and refined at full size
+IMG2IMG_SETTINGS = {"denoising_strength": 0.45}
+
+
+def drafts_path(shots_dir):
+    path = Path(shots_dir) / DRAFTS_DIR
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _render(client, endpoint, shot_key, payload, make_path):
+    """Render (or copy from the render cache) and log. Returns (paths, info, gpu_seconds)."""
+    model = client.get_current_model()
+    cached = render_cache.copy_to(payload, model, make_path)
+    if cached:
+        paths, info = cached
+        seconds = 0.0
+    else:
+        start = time.perf_counter()
+        paths, info = client.render_to_files(endpoint, payload, make_path)
+        seconds = time.perf_counter() - start
+        render_cache.put_files(payload, model, paths, info)
+    generate_shot.log_shot(shot_key, payload, info, paths, model)
+    return paths, info, seconds
+
+
+# =============================================================================
+# PAYLOADS
+# =============================================================================
+
+def draft_payload(shot_key, seed, count=1, episode_id=None):
+    """Draft txt2img payload covering seeds seed .. seed+count-1.
+
+    count is rounded up to fill the last batch evenly (10 -> 3 x 4).
+    """
+    n_iter = math.ceil(count / MAX_BATCH)
+    return {
+        **generate_shot.build_payload(shot_key, seed, episode_id),
+        **DRAFT_SETTINGS,
+        "batch_size": math.ceil(count / n_iter),
+        "n_iter": n_iter,
+    }
+
+
+def full_payload(shot_key, seed, episode_id=None):
+    """The single-pass payload for one seed (what generate_shot.py renders)."""
+    return {**generate_shot.build_payload(shot_key, seed, episode_id), "batch_size": 1}
+
+
+def hires_payload(shot_key, seed, episode_id=None):
+    """Draft settings for one seed plus a hires-fix pass up to full size."""
+    full = generate_shot.RUNWAY_SETTINGS
+    return {
+        **draft_payload(shot_key, seed, 1, episode_id),
+        **HIRES_SETTINGS,
+        "hr_scale": full["width"] / DRAFT_SETTINGS["width"],
+    }
+
+
+def img2img_payload(shot_key, seed, draft_file, episode_id=None):
+    """Full-size img2img payload refining an upscaled draft with the same seed."""
+    full = generate_shot.RUNWAY_SETTINGS
+    img = Image.open(draft_file).convert("RGB").resize((full["width"], full["height"]), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return {
+        **full_payload(shot_key, seed, episode_id),
+        **IMG2IMG_SETTINGS,
+        "init_images": [base64.b64encode(buf.getvalue()).decode("ascii")],
+    }
+
+
+# =============================================================================
+# PASSES
+# =============================================================================
+
+def render_drafts(shot_key, seed=-1, count=DRAFT_COUNT, episode_id=None, output_dir=None, api_url=None):
+    """Draft count seeds. Returns ({seed: path}, gpu_seconds, work)."""
+    client = get_client(api_url or generate_shot.API_URL)
+    out = drafts_path(generate_shot.shot_output_path(output_dir, episode_id))
+    if seed == -1:
+        seed = random.randrange(2**31)  # chosen here so every draft's seed is known
+    payload = draft_payload(shot_key, seed, count, episode_id)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # A1111 gives image i of a batch/iteration seed + i
+    paths, _, seconds = _render(client, "txt2img", shot_key, payload,
+                                lambda i: out / f"{shot_key}_{timestamp}_s{seed + i}.png")
+    drafts = {seed + i: path for i, path in enumerate(paths)}
+    return drafts, seconds, render_work(payload) * len(paths)
+
+
+def pick(drafts, character, keep=KEEP):
+    """Top `keep` draft seeds by shot_ranker score (draft order without a reference sheet)."""
+    by_name = {path.name: seed for seed, path in drafts.items()}
+    ranked = shot_ranker.rank(list(drafts.values()), character)
+    return [by_name[r["file"]] for r in ranked[:keep]]
+
+
+def find_draft(shots_dir, shot_key, seed):
+    """Most recent draft of a seed in shots/drafts/ (None if it was never drafted)."""
+    found = sorted((Path(shots_dir) / DRAFTS_DIR).glob(f"{shot_key}_*_s{seed}.png"))
+    return found[-1] if found else None
+
+
+def render_finals(shot_key, seeds, img2img=False, episode_id=None, output_dir=None, api_url=None):
+    """Re-render seeds at full size as normal shot candidates.
+
+    Returns (paths, gpu_seconds, work).
+    """
+    client = get_client(api_url or generate_shot.API_URL)
+    shots_dir = generate_shot.shot_output_path(output_dir, episode_id)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    saved, seconds, work = [], 0.0, 0
+    for seed in seeds:
+        if img2img:
+            draft = find_draft(shots_dir, shot_key, seed)
+            if draft is None:
+                raise FileNotFoundError(f"No draft for {shot_key} seed {seed} in {shots_dir / DRAFTS_DIR}")
+            endpoint, payload = "img2img", img2img_payload(shot_key, seed, draft, episode_id)
+        else:
+            endpoint, payload = "txt2img", hires_payload(shot_key, seed, episode_id)
+
+        n = len(saved)
+        paths, _, elapsed = _render(client, endpoint, shot_key, payload,
+                                    lambda i: shots_dir / f"{shot_key}_{timestamp}_{n + i:02d}.png")
+        for path in paths:
+            print(f"  Saved: {path.name} (seed {seed})")
+        saved += paths
+        seconds += elapsed
+        work += render_work(payload) * len(paths)
+    return saved, seconds, work
+
+
+def two_pass_shot(shot_key, count=DRAFT_COUNT, keep=KEEP, seed=-1, img2img=False, episode_id=None,
+                  output_dir=None, api_url=None):
+    """Draft, rank, and finish one shot. Returns its cost record."""
+    shot = generate_shot.get_shots(episode_id)[shot_key]
+    generate_shot.ensure_shot_model(shot_key, api_url, episode_id)
+
+    print(f"\n{shot_key}: drafting {count} seeds at {DRAFT_SETTINGS['width']}px / {DRAFT_SETTINGS['steps']} steps")
+    drafts, draft_seconds, draft_work = render_drafts(shot_key, seed, count, episode_id, output_dir, api_url)
+    keepers = pick(drafts, shot["character"], keep)
+    print(f"  keeping seed{'s' if len(keepers) > 1 else ''} {', '.join(map(str, keepers))} "
+          f"({draft_seconds:.1f}s for {len(drafts)} drafts)")
+
+    finals, final_seconds, final_work = render_finals(shot_key, keepers, img2img, episode_id, output_dir, api_url)
+    full_work = render_work(full_payload(shot_key, -1, episode_id))
+    return {
+        "shot": shot_key,
+        "mode": "img2img" if img2img else "hires",
+        "drafts": len(drafts),
+        "kept": keepers,
+        "finals": [p.name for p in finals],
+        "draft_seconds": round(draft_seconds, 3),
+        "final_seconds": round(final_seconds, 3),
+        "draft_work": draft_work,
+        "final_work": final_work,
+        # What generate_shot.py renders for the shot: one batch at full size
+        "single_pass_work": full_work * generate_shot.RUNWAY_SETTINGS["batch_size"],
+        # Every drafted seed at full size, for an equal-seed-count comparison
+        "same_seeds_work": full_work * len(drafts),
+    }
+
+
+# =============================================================================
+# COST REPORT
+# =============================================================================
+
+def seconds_per_work(records):
+    """Measured GPU-seconds per unit of render_work, calibrated on the full-size passes."""
+    seconds = sum(r["final_seconds"] for r in records)
+    work = sum(r["final_work"] for r in records)
+    return seconds / work if seconds and work else None
+
+
+def report(records):
+    """Print GPU-seconds per shot and per episode: two-pass vs. the single-pass path.
+
+    Single-pass seconds (one RUNWAY_SETTINGS batch per shot) are estimated from
+    the measured full-size rate; cost grows faster than pixels x steps at 1024px
+    (attention), so the estimate and the savings are on the low side. "Seeds"
+    compares against rendering every drafted seed at full size instead.
+    """
+    rate = seconds_per_work(records)
+    print(f"\n{'Shot':<32} {'Drafts':>6} {'Kept':>4} {'Draft s':>8} {'Final s':>8} {'Single s':>9} {'Saved':>6} "
+          f"{'Seeds':>6}")
+    print("-" * 87)
+    totals = {"two_pass": 0.0, "single": 0.0, "same_seeds": 0.0}
+    for r in records:
+        two_pass = r["draft_seconds"] + r["final_seconds"]
+        if rate:
+            single, same_seeds = r["single_pass_work"] * rate, r["same_seeds_work"] * rate
+            single_text = f"{single:9.1f}"
+        else:
+            single, same_seeds, single_text = 0.0, 0.0, f"{'?':>9}"
+        work = r["draft_work"] + r["final_work"]
+        print(f"{r['shot']:<32} {r['drafts']:>6} {len(r['kept']):>4} {r['draft_seconds']:8.1f} "
+              f"{r['final_seconds']:8.1f} {single_text} {1 - work / r['single_pass_work']:6.0%} "
+              f"{1 - work / r['same_seeds_work']:6.0%}")
+        totals["two_pass"] += two_pass
+        totals["single"] += single
+        totals["same_seeds"] += same_seeds
+
+    print("-" * 87)
+    if rate:
+        saved = totals["single"] - totals["two_pass"]
+        print(f"Episode: two-pass {totals['two_pass']:.1f} GPU-s, single pass ~{totals['single']:.1f} GPU-s, "
+              f"saved ~{saved:.1f} GPU-s ({saved / totals['single']:.0%})")
+        print(f"Same seed count at full size: ~{totals['same_seeds']:.1f} GPU-s "
+              f"({1 - totals['two_pass'] / totals['same_seeds']:.0%} saved)")
+    else:
+        print("Episode: every render was a cache hit, so there is no measured rate; Saved is by work only")
+    return totals
+
+
+def write_report(records, episode_id=None, output_dir=None):
+    """Merge records into shots/drafts/two_pass.json (keyed by shot)."""
+    path = drafts_path(generate_shot.shot_output_path(output_dir, episode_id)) / REPORT_NAME
+    data = json.loads(path.read_text()) if path.exists() else {}
+    for r in records:
+        data[r["shot"]] = r
+    path.write_text(json.dumps(data, indent=2) + "\n")
+    return path
+
+
+def run_episode(count=DRAFT_COUNT, keep=KEEP, img2img=False, episode_id=None, output_dir=None, api_url=None):
+    records = [two_pass_shot(shot_key, count, keep, img2img=img2img, episode_id=episode_id,
+                             output_dir=output_dir, api_url=api_url)
+               for shot_key in generate_shot.get_shots(episode_id)]
+    report(records)
+    print(f"\nReport: {write_report(records, episode_id, output_dir)}")
+    return records
+
+
+def benchmark(render_time=0.25, count=DRAFT_COUNT):
+    """Single pass vs. two-pass for every shot on a fake WebUI whose render time scales with pixels x steps."""
+    import contextlib
+    import tempfile
+
+    import fake_webui
+
+    render_cache.ENABLED = False
+    generate_shot.LOG_GENERATIONS = False
+    episode_id = episode_manifest.DEFAULT_EPISODE
+    shot_keys = list(generate_shot.get_shots(episode_id))
+    batch = generate_shot.RUNWAY_SETTINGS["batch_size"]
+
+    server, url, state = fake_webui.serve(render_time=render_time, scale_work=True)
+    client = get_client(url)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Single pass: what generate_shot.py renders, one batch per shot
+        for shot_key in shot_keys:
+            client.render("txt2img", generate_shot.build_payload(shot_key, 1000, episode_id))
+        single = state.gpu_seconds
+
+        # The same number of seeds as the drafts, all at full size
+        state.gpu_seconds = 0.0
+        for shot_key in shot_keys:
+            payload = {**generate_shot.build_payload(shot_key, 1000, episode_id), "n_iter": math.ceil(count / batch)}
+            client.render("txt2img", payload)
+        same_seeds = state.gpu_seconds
+
+        state.gpu_seconds = 0.0
+        with contextlib.redirect_stdout(io.StringIO()):
+            records = [two_pass_shot(k, count, seed=1000, episode_id=episode_id, output_dir=tmp, api_url=url)
+                       for k in shot_keys]
+        two_pass = state.gpu_seconds
+    server.shutdown()
+
+    width = generate_shot.RUNWAY_SETTINGS["width"]
+    print(f"\n{len(shot_keys)} shots, {count} drafted seeds each, "
+          f"fake WebUI at {render_time}s per 1024px/25 step image")
+    print("-" * 72)
+    rows = [
+        (f"single pass ({batch} images at {width}px)", single, ""),
+        (f"two-pass ({KEEP} keeper via hires-fix)", two_pass, f"  ({1 - two_pass / single:.0%} saved)"),
+        (f"{count} seeds at {width}px (same seed count)", same_seeds,
+         f"  (two-pass {1 - two_pass / same_seeds:.0%} less)"),
+    ]
+    for label, seconds, note in rows:
+        print(f"  {label:<38} {seconds:7.1f} GPU-s{note}")
+    report(records)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cheap drafts for many seeds, full-size renders for the keepers")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("shot", help="draft, rank and finish one shot")
+    p.add_argument("shot_key")
+    p = sub.add_parser("episode", help="draft, rank and finish every shot, then report GPU-seconds")
+    p = sub.add_parser("drafts", help="draft one shot and print the ranking (pick seeds by hand)")
+    p.add_argument("shot_key")
+    p = sub.add_parser("final", help="re-render hand-picked draft seeds at full size")
+    p.add_argument("shot_key")
+    p.add_argument("seeds", nargs="+", type=int)
+    sub.add_parser("bench", help="single pass vs. two-pass on a fake WebUI")
+
+    for p in sub.choices.values():
+        p.add_argument("--drafts", type=int, default=DRAFT_COUNT, help="seeds drafted per shot")
+        p.add_argument("--keep", type=int, default=KEEP, help="drafts finished per shot")
+        p.add_argument("--seed", type=int, default=-1, help="first draft seed")
+        p.add_argument("--img2img", action="store_true", help="finish via img2img instead of hires-fix")
+        p.add_argument("--episode", default=None)
+        p.add_argument("--url", default=None, help="WebUI URL")
+    args = parser.parse_args()
+    episode_id = args.episode or episode_manifest.DEFAULT_EPISODE
+
+    if args.cmd == "shot":
+        record = two_pass_shot(args.shot_key, args.drafts, args.keep, args.seed, args.img2img, episode_id,
+                               api_url=args.url)
+        report([record])
+        print(f"\nReport: {write_report([record], episode_id)}")
+    elif args.cmd == "episode":
+        run_episode(args.drafts, args.keep, args.img2img, episode_id, api_url=args.url)
+    elif args.cmd == "drafts":
+        generate_shot.ensure_shot_model(args.shot_key, args.url, episode_id)
+        drafts, seconds, _ = render_drafts(args.shot_key, args.seed, args.drafts, episode_id, api_url=args.url)
+        character = generate_shot.get_shots(episode_id)[args.shot_key]["character"]
+        by_name = {path.name: seed for seed, path in drafts.items()}
+        print(f"\n{len(drafts)} drafts in {seconds:.1f}s, best first:")
+        for r in shot_ranker.rank(list(drafts.values()), character):
+            score = "" if r["score"] is None else f"{r['score']:.3f}  "
+            print(f"  seed {by_name[r['file']]:<12} {score}{r['file']}")
+        print(f"\nFinish with: python two_pass.py final {args.shot_key} <seed> [seed ...]")
+    elif args.cmd == "final":
+        generate_shot.ensure_shot_model(args.shot_key, args.url, episode_id)
+        _, seconds, _ = render_finals(args.shot_key, args.seeds, args.img2img, episode_id, api_url=args.url)
+        print(f"\n{len(args.seeds)} full-size renders in {seconds:.1f}s")
+    elif args.cmd == "bench":
+        benchmark(count=args.drafts)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Internet Improv - WebUI Client
+Shared Stable Diffusion WebUI API client: one pooled keep-alive session per
+instance, per-endpoint timeouts, retry with backoff on 5xx / dropped
+connections, and latency metrics per endpoint.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import model_batching
+import stream_decode
+import tracing
+
+API_URL = "http://127.0.0.1:7860"
+
+# Seconds, keyed on the last path segment of /sdapi/v1/<endpoint>
+TIMEOUTS = {
+    "sd-models": 5,
+    "options": 120,  # Posting sd_model_checkpoint blocks until the model loads
+    "progress": 5,
+    "txt2img": 600,
+    "img2img": 600,
+}
+DEFAULT_TIMEOUT = 60
+
+RETRIES = 3
+BACKOFF = 1.0  # seconds, doubled after each attempt
+RETRY_STATUS = {500, 502, 503, 504}
+POOL_SIZE = 8
+
+# /options reports checkpoints by title: "name.safetensors [0123abcd]"
+_TITLE_HASH = re.compile(r"\s*\[[0-9a-fA-F]+\]$")
+
+
+def checkpoint_name(title):
+    """A checkpoint/VAE title without the " [hash]" suffix, for comparing against manifest names."""
+    return _TITLE_HASH.sub("", title) if title else title
+
+
+class WebUIClient:
+    """Client for one WebUI instance."""
+
+    def __init__(self, api_url=API_URL, timeouts=None, retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+        self.api_url = api_url.rstrip("/")
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+        # Loaded checkpoint/VAE as last seen or set by this client, so
+        # redundant /options round trips can be skipped
+        self.loaded = {}
+        self.switches = 0
+        self.switches_skipped = 0
+
+        # Renders in flight on this instance; a checkpoint switch waits for 0
+        self._gate = threading.Condition()
+        self._inflight = 0
+
+    # -------------------------------------------------------------------------
+    # Transport
+    # -------------------------------------------------------------------------
+
+    def _record(self, endpoint, elapsed, ok, retried):
+        with self._lock:
+            m = self.metrics.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "latencies": []})
+            m["calls"] += 1
+            m["retries"] += retried
+            m["latencies"].append(elapsed)
+            if not ok:
+                m["errors"] += 1
+        tracing.add(f"http.{endpoint}", elapsed, retries=retried, ok=ok)
+
+    def request(self, method, endpoint, **kwargs):
+        """Send a request to /sdapi/v1/<endpoint>, retrying transient failures.
+
+        Raises requests.HTTPError for non-2xx responses after retries.
+        """
+        url = f"{self.api_url}/sdapi/v1/{endpoint}"
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+        start = time.monotonic()
+        attempt = 0
+
+        while True:
+            try:
+                r = self.session.request(method, url, **kwargs)
+                if r.status_code in RETRY_STATUS and attempt < self.retries:
+                    r.close()
+                    raise requests.exceptions.HTTPError(f"{r.status_code} from {endpoint}", response=r)
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError):
+                if attempt >= self.retries:
+                    self._record(endpoint, time.monotonic() - start, False, attempt)
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                attempt += 1
+
+        self._record(endpoint, time.monotonic() - start, r.ok, attempt)
+        r.raise_for_status()
+        return r
+
+    def get(self, endpoint, **kwargs):
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint, payload, **kwargs):
+        return self.request("POST", endpoint, json=payload, **kwargs)
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def check_api(self):
+        """Check if WebUI API is running."""
+        try:
+            self.request("GET", "sd-models")
+            return True
+        except requests.exceptions.RequestException:
+            return False
+
+    def get_current_model(self, refresh=False):
+        """Get currently loaded model (remembered until refreshed, a switch or a failed request).
+
+        Pass refresh=True at the start of a run: the model may have been changed
+        from the WebUI tab or another process since it was last read.
+        """
+        if "sd_model_checkpoint" in self.loaded and not refresh:
+            return self.loaded["sd_model_checkpoint"]
+        try:
+            options = self.get("options").json()
+        except (requests.exceptions.RequestException, ValueError):
+            return "Unknown"
+        for key in ("sd_model_checkpoint", "sd_vae"):
+            if key in options:
+                self.loaded[key] = options[key]
+        return self.loaded.get("sd_model_checkpoint", "Unknown")
+
+    def loaded_model(self):
+        """(checkpoint, vae) as last seen, names normalized with checkpoint_name()."""
+        return (checkpoint_name(self.loaded.get("sd_model_checkpoint")), checkpoint_name(self.loaded.get("sd_vae")))
+
+    def set_model(self, model_name, vae=None):
+        """Switch to specified model (and VAE), skipping what's already loaded."""
+        wanted = {"sd_model_checkpoint": model_name}
+        if vae:
+            wanted["sd_vae"] = vae
+        if not self.loaded:
+            self.get_current_model()
+
+        changes = {k: v for k, v in wanted.items() if checkpoint_name(self.loaded.get(k)) != checkpoint_name(v)}
+        if not changes:
+            self.switches_skipped += 1
+            return True
+        try:
+            self.post("options", changes)
+        except requests.exceptions.RequestException:
+            self.loaded.clear()
+            return False
+        self.loaded.update(changes)
+        self.switches += 1
+        # Re-read so render-cache keys and logs use the WebUI's own title
+        self.get_current_model(refresh=True)
+        return True
+
+    def _needs_switch(self, model, vae):
+        req = (checkpoint_name(model), checkpoint_name(vae), ())
+        return model_batching.needs_switch(req, self.loaded_model())
+
+    def acquire(self, model=None, vae=None):
+        """Reserve the instance for one render on (model, vae), loading it first if needed.
+
+        A switch only happens once nothing is in flight, and renders wait for a
+        switch to finish, so no render runs on the wrong checkpoint. Pair with
+        release(). Returns True if a checkpoint/VAE was loaded.
+        """
+        with self._gate:
+            while self._inflight and self._needs_switch(model, vae):
+                self._gate.wait()
+            switched = False
+            if self._needs_switch(model, vae):
+                before = self.switches
+                if not self.set_model(model, vae):
+                    raise RuntimeError(f"Could not load {model}")
+                switched = self.switches > before
+            self._inflight += 1
+        return switched
+
+    def release(self):
+        with self._gate:
+            self._inflight -= 1
+            self._gate.notify_all()
+
+    @contextmanager
+    def using_model(self, model=None, vae=None):
+        """acquire() / release() around a block."""
+        self.acquire(model, vae)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def render(self, endpoint, payload):
+        """POST a txt2img/img2img payload and return the decoded JSON."""
+        try:
+            r = self.post(endpoint, payload)
+        except requests.exceptions.RequestException:
+            # A crash or restart may have changed the checkpoint; re-read it next time
+            self.loaded.clear()
+            raise
+        with tracing.span("json_parse", bytes=len(r.content)):
+            return r.json()
+
+    def render_to_files(self, endpoint, payload, make_path):
+        """POST a render payload and stream the images to make_path(i).
+
+        Returns (paths, info).
+        """
+        try:
+            with self.post(endpoint, payload, stream=True) as r:
+                paths, result = stream_decode.stream_response_to_files(r, make_path)
+        except requests.exceptions.RequestException:
+            self.loaded.clear()
+            raise
+        return paths, result.get("info", "{}")
+
+    # -------------------------------------------------------------------------
+    # Metrics
+    # -------------------------------------------------------------------------
+
+    def print_metrics(self):
+        """Print per-endpoint latency statistics."""
+        if not self.metrics:
+            return
+        if self.switches or self.switches_skipped:
+            print(f"\nModel switches ({self.api_url}): {self.switches} loaded, "
+                  f"{self.switches_skipped} skipped (already loaded)")
+        print(f"\nWebUI latency ({self.api_url}):")
+        print(f"  {'endpoint':<12} {'calls':>5} {'mean':>8} {'p50':>8} {'max':>8} {'retries':>7} {'errors':>6}")
+        with self._lock:
+            for endpoint, m in sorted(self.metrics.items()):
+                lat = sorted(m["latencies"])
+                mean = sum(lat) / len(lat)
+                p50 = lat[len(lat) // 2]
+                print(f"  {endpoint:<12} {m['calls']:>5} {mean:>7.2f}s {p50:>7.2f}s {lat[-1]:>7.2f}s "
+                      f"{m['retries']:>7} {m['errors']:>6}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_url=API_URL):
+    """Return the shared client for a WebUI URL (one pooled session per instance)."""
+    api_url = api_url.rstrip("/")
+    with _clients_lock:
+        if api_url not in _clients:
+            _clients[api_url] = WebUIClient(api_url)
+        return _clients[api_url]
+
+
+def print_all_metrics():
+    """Print latency metrics for every client used in this process."""
+    for client in list(_clients.values()):
+        client.print_metrics()